@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module archives the stage directories of doggo_fetch.py, doggo_herd.py, and doggo_sniff.py runs (<stem>_<stage>/ to <stem>_<stage>.tar.gz or .tar.zst) and removes them.
+#Directories are archived in the background, several at a time and with multi-threaded compression (pigz or zstd), so the wrappers can hand over each stage directory as soon as no later step reads it and carry on with the next steps.
+#ORFs directories are written as indexed archives: a .tar.gz made of one gzip member per genome (which together are a normal .tar.gz), and an index (<archive>.index) with the offset and length of each genome, so the files of a few genomes can be read without decompressing the rest (see orfarchive.py).
+#Run on its own, it archives the directories given, in parallel.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: gzip archives are compressed with pigz if it is installed and with tar -z (single-threaded) otherwise. They can be read with tar -xzf either way. zstd archives can be read with tar --zstd -xf or zstd -dc | tar -xf -.
+#NOTE 3: A directory is only removed if its archive was written without errors.
+#NOTE 4: Indexed archives are only written with gzip compression. The gzip members are compressed in parallel by Python, so they don't need pigz.
+
+#Dependencies
+#1) pigz (https://anaconda.org/conda-forge/pigz) (optional, for multi-threaded gzip compression)
+#2) zstd (https://anaconda.org/conda-forge/zstd) (only for zstd compression)
+
+import contextlib
+import gzip
+import io
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+#The archive extension of each compression. Contig files are already gzip-compressed, so their directory is only packaged (none).
+extensions = {'gzip': '.tar.gz', 'zstd': '.tar.zst', 'none': '.tar'}
+
+def archive_name(directory, compression):
+    return directory.rstrip('/') + extensions[compression]
+
+#The shell command that packages <directory> (as <directory>/ in the archive, like tar -czf <directory>.tar.gz <directory>/) into <output> with <threads> compression threads.
+def archive_command(directory, output, compression, threads):
+    directory = shlex.quote(directory.rstrip('/') + '/')
+    output = shlex.quote(output)
+    if compression == 'zstd':
+        return 'tar -cf - ' + directory + ' | zstd -q -f -T' + str(threads) + ' -o ' + output
+    if compression == 'gzip' and shutil.which('pigz') is not None:
+        return 'tar -cf - ' + directory + ' | pigz -p ' + str(threads) + ' > ' + output
+    if compression == 'gzip':
+        return 'tar -czf ' + output + ' ' + directory
+    return 'tar -cf ' + output + ' ' + directory
+
+#Archive <directory> and remove it. Returns the archive, or None if it could not be written. pipefail makes the pipes fail if tar does.
+def archive_dir(directory, compression='gzip', threads=1, output=None):
+    if output is None:
+        output = archive_name(directory, compression)
+    status = subprocess.run(['bash', '-o', 'pipefail', '-c', archive_command(directory, output, compression, threads)], stderr=subprocess.DEVNULL).returncode
+    if status != 0:
+        with contextlib.suppress(OSError):
+            os.remove(output)
+        return None
+    shutil.rmtree(directory, ignore_errors=True)
+    return output
+
+#The group of an archive member, i.e., the genome it belongs to: the name of a file in the archived directory without its extension, or the name of a directory in a subdirectory (e.g., <stem>_orfs/GCA_011362025.faa and <stem>_orfs/pyrodigal_runs/GCA_011362025/... are both GCA_011362025). None for the archived directory itself and its subdirectories.
+def member_group(name):
+    parts = name.rstrip('/').split('/')
+    if len(parts) == 2 and '.' in parts[1]:
+        return parts[1].rsplit('.', 1)[0]
+    if len(parts) >= 3:
+        return parts[2]
+    return None
+
+#The files of <directory> as (group, [(path, name in the archive)]) tuples, in the order tar would add them. Their names start with <archive_dir>.
+def directory_groups(directory, archive_dir):
+    archive_dir = archive_dir.rstrip('/')
+    groups = dict()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        relative = os.path.relpath(root, directory).replace(os.sep, '/')
+        name = archive_dir if relative == '.' else archive_dir + '/' + relative
+        groups.setdefault(member_group(name + '/'), list()).append((root, name))
+        for filename in sorted(files):
+            groups.setdefault(member_group(name + '/' + filename), list()).append((os.path.join(root, filename), name + '/' + filename))
+    return list(groups.items())
+
+#The tar data of files or of (TarInfo, data) members, without the end-of-archive blocks, so the data of several groups can follow each other.
+def tar_files(files):
+    buffer = io.BytesIO()
+    archive = tarfile.open(fileobj=buffer, mode='w')
+    for path, name in files:
+        archive.add(path, arcname=name, recursive=False)
+    return buffer.getvalue()
+
+def tar_members(members):
+    buffer = io.BytesIO()
+    archive = tarfile.open(fileobj=buffer, mode='w')
+    for member, data in members:
+        archive.addfile(member, io.BytesIO(data) if data is not None else None)
+    return buffer.getvalue()
+
+#The members of the tar data of a group, as (TarInfo, data) tuples (data is None for directories).
+def group_members(data):
+    members = list()
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:') as archive:
+        for member in archive:
+            members.append((member, archive.extractfile(member).read() if member.isfile() else None))
+    return members
+
+#Writes an indexed archive. Groups are compressed by <threads> threads, and written in the order they are added.
+class IndexedArchive:
+    def __init__(self, path, threads=1):
+        self.path = path
+        self.threads = max(1, threads)
+        self.pending = deque()
+
+    def __enter__(self):
+        self.output = open(self.path, 'wb')
+        self.index = open(self.path + '.index', 'w')
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        return self
+
+    #Add the tar data of a group.
+    def add(self, group, data):
+        self.pending.append((group, self.executor.submit(gzip.compress, data, 6, mtime=0)))
+        while len(self.pending) > self.threads * 4:
+            self.write_next()
+
+    #Add a group that is already compressed (e.g., taken from another indexed archive).
+    def add_compressed(self, group, data):
+        self.pending.append((group, data))
+        while len(self.pending) > self.threads * 4:
+            self.write_next()
+
+    def write_next(self):
+        group, data = self.pending.popleft()
+        if not isinstance(data, bytes):
+            data = data.result()
+        self.index.write((group if group is not None else '.') + '\t' + str(self.output.tell()) + '\t' + str(len(data)) + '\n')
+        self.output.write(data)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                while len(self.pending) > 0:
+                    self.write_next()
+                self.output.write(gzip.compress(b'\0' * 1024, 6, mtime=0))
+        finally:
+            self.executor.shutdown(wait=True)
+            self.output.close()
+            self.index.close()
+            if exc_type is not None:
+                for path in (self.path, self.path + '.index'):
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+
+#Archive <directory> as an indexed archive and remove it. Returns the archive, or None if it could not be written.
+def archive_dir_indexed(directory, output=None, threads=1):
+    if output is None:
+        output = archive_name(directory, 'gzip')
+    try:
+        with IndexedArchive(output, threads) as archive:
+            for group, files in directory_groups(directory, directory):
+                archive.add(group, tar_files(files))
+    except OSError:
+        return None
+    shutil.rmtree(directory, ignore_errors=True)
+    return output
+
+#The index of an indexed archive, as a dictionary of group to a list of (offset, length) tuples, in the order of the archive. Returns None if the archive has no index.
+def read_index(path):
+    if not os.path.isfile(path + '.index'):
+        return None
+    index = dict()
+    with open(path + '.index', 'r') as f:
+        for line in f:
+            x = line.rstrip('\n').split('\t')
+            index.setdefault(None if x[0] == '.' else x[0], list()).append((int(x[1]), int(x[2])))
+    return index
+
+#The compressed groups of an indexed archive, as (group, data) tuples.
+def compressed_groups(path):
+    with open(path, 'rb') as archive:
+        for group, entries in read_index(path).items():
+            for offset, length in entries:
+                archive.seek(offset)
+                yield group, archive.read(length)
+
+#The groups of an archive, as (group, members) tuples (see group_members), only for <groups> if given. Indexed archives are read by seeking to the groups. Other archives (from older runs, or zstd) are read from start to end, with consecutive members of the same group together.
+def archive_groups(path, groups=None):
+    index = read_index(path)
+    if index is not None:
+        with open(path, 'rb') as archive:
+            for group, entries in index.items():
+                if groups is not None and group not in groups:
+                    continue
+                for offset, length in entries:
+                    archive.seek(offset)
+                    yield group, group_members(gzip.decompress(archive.read(length)))
+        return
+    group = None
+    members = list()
+    with open_archive(path) as archive:
+        for member in archive:
+            member_name_group = member_group(member.name)
+            if member_name_group != group and len(members) > 0:
+                if groups is None or group in groups:
+                    yield group, members
+                members = list()
+            group = member_name_group
+            if groups is None or group in groups:
+                members.append((member, archive.extractfile(member).read() if member.isfile() else None))
+    if len(members) > 0:
+        yield group, members
+
+#Archives stage directories in the background while the wrapper carries on. <threads> compression threads are shared by up to <workers> directories archived at the same time.
+class Archiver:
+    def __init__(self, compression='gzip', threads=None, workers=2):
+        self.compression = compression
+        self.workers = max(1, workers)
+        self.threads = max(1, (threads or os.cpu_count() or 1) // self.workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.jobs = list()
+        self.submitted = set()
+
+    #Start archiving <directory> (if it exists and is not being archived already). <compression> overrides the compression of the archiver, e.g., none for contigs. With <indexed>, gzip archives are indexed archives.
+    def archive(self, directory, compression=None, output=None, indexed=False):
+        directory = directory.rstrip('/')
+        if directory in self.submitted or not os.path.isdir(directory):
+            return
+        self.submitted.add(directory)
+        compression = compression or self.compression
+        if output is None:
+            output = archive_name(directory, compression)
+        if indexed and compression == 'gzip':
+            self.jobs.append((directory, self.executor.submit(archive_dir_indexed, directory, output, self.threads)))
+        else:
+            self.jobs.append((directory, self.executor.submit(archive_dir, directory, compression, self.threads, output)))
+
+    #Wait for all archives. Returns the archives written and the directories that could not be archived.
+    def wait(self):
+        archives = list()
+        failed = list()
+        for directory, job in self.jobs:
+            output = job.result()
+            if output is None:
+                failed.append(directory)
+            else:
+                archives.append(output)
+        self.jobs = list()
+        return archives, failed
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+#Find the archive of <directory> in any of the compressions (e.g., the ORFs archive of an older run). Returns None if there is none.
+def find_archive(directory):
+    for extension in ('.tar.gz', '.tar.zst', '.tar'):
+        if os.path.isfile(directory.rstrip('/') + extension):
+            return directory.rstrip('/') + extension
+    return None
+
+#Open an archive of any compression for reading, member by member. zstd archives are decompressed by zstd, as the tarfile module can't read them.
+@contextlib.contextmanager
+def open_archive(path):
+    if not path.endswith('.tar.zst'):
+        with tarfile.open(path, 'r:*') as archive:
+            yield archive
+        return
+    process = subprocess.Popen(['zstd', '-dcq', path], stdout=subprocess.PIPE)
+    try:
+        with tarfile.open(fileobj=process.stdout, mode='r|') as archive:
+            yield archive
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise OSError('zstd could not decompress ' + path)
+
+#Open an archive of <compression> for writing, with <threads> compression threads if pigz or zstd is used.
+@contextlib.contextmanager
+def write_archive(path, compression, threads=1):
+    if compression == 'none':
+        with tarfile.open(path, 'w') as archive:
+            yield archive
+        return
+    if compression == 'gzip' and shutil.which('pigz') is None:
+        with tarfile.open(path, 'w:gz', compresslevel=6) as archive:
+            yield archive
+        return
+    if compression == 'zstd':
+        command = ['zstd', '-q', '-f', '-T' + str(threads), '-o', path]
+    else:
+        command = ['pigz', '-p', str(threads), '-6']
+    with open(path, 'wb') as output:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=output if compression == 'gzip' else None)
+        try:
+            with tarfile.open(fileobj=process.stdin, mode='w|') as archive:
+                yield archive
+        finally:
+            process.stdin.close()
+            if process.wait() != 0:
+                raise OSError(command[0] + ' could not compress ' + path)
+
+if __name__ == '__main__':
+    print('#Script: archivedirs.py')
+    print('#Version: v20241212')
+    print('#Usage: python archivedirs.py <compression> <threads> <directory> ...')
+    print('#<compression> must be "gzip", "zstd", or "none". (case-sensitive) (required)')
+    print('#<threads> must be the number of threads used for compressing, shared by the directories archived at the same time. (required)')
+    print('#<directory> must be one or more directories. Each one is archived (<directory>.tar.gz, .tar.zst, or .tar) and removed. (required)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    if len(sys.argv) >= 4:
+        print(str((len(sys.argv)-1)) + ' argument(s) found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    if sys.argv[1] in extensions:
+        print('Compression is valid. Proceeding.')
+    else:
+        print('Compression must be "gzip", "zstd", or "none". Exiting.')
+        sys.exit(1)
+    if sys.argv[1] == 'zstd' and shutil.which('zstd') is None:
+        print('External program zstd not installed. Download it from: https://anaconda.org/conda-forge/zstd. Exiting.')
+        sys.exit(1)
+
+    if sys.argv[2].isdigit() and int(sys.argv[2]) > 0:
+        print('Number of threads is valid. Proceeding.')
+    else:
+        print('Number of threads must be a positive integer. Exiting.')
+        sys.exit(1)
+
+    for directory in sys.argv[3:]:
+        if os.path.isdir(directory) == False:
+            print('Directory ' + directory + ' not found. Exiting.')
+            sys.exit(1)
+    print('All directories found. Proceeding.')
+
+    archiver = Archiver(sys.argv[1], int(sys.argv[2]), min(len(sys.argv) - 3, 4))
+    for directory in sys.argv[3:]:
+        archiver.archive(directory)
+    archives, failed = archiver.wait()
+    archiver.shutdown()
+    for archive in archives:
+        print('Archived ' + archive + '.')
+    if len(failed) > 0:
+        print('Error when archiving ' + ' '.join(failed) + '. Exiting.')
+        sys.exit(1)
+
+    print('All done!')
@@ -98,6 +98,6 @@ print('bmge ' + bmge_check)
 iqtree2_check = (subprocess.check_output("iqtree2 --version | grep \"IQ-TREE \" | perl -p -e \'s/^IQ-TREE .*? version (.*?) .*/$1/\'", shell=True, universal_newlines=True).strip())
 print('iqtree2 ' + iqtree2_check)
 
-print ('WhereDoGGo? modules each use the following dependencies: fetch (datasets, pyrodigal), herd (pyrodigal), sniff (biopython, hmmsearch, seqtk, einsi, bmge), zoomies (biopython, ete3, numpy, pandas, iqtree2).')
+print ('WhereDoGGo? modules each use the following dependencies: fetch (datasets, pyrodigal), herd (pyrodigal), sniff (biopython, hmmsearch, einsi, bmge), zoomies (biopython, ete3, numpy, pandas, iqtree2).')
 
 print('All done!')
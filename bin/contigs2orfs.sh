@@ -15,7 +15,7 @@
 #TODO: Have the script run off a list of assemblies instead?
 
 #Dependencies
-#1) Pyrodigal (https://github.com/althonos/pyrodigal)
+#1) Pyrodigal Python library (https://github.com/althonos/pyrodigal), used by predictorfs.py. The pyrodigal command-line tool is not needed.
 
 assemblies="$1"
 contigs="$2"
@@ -23,10 +23,10 @@ filext="$3"
 whatwematch="$4"
 code25="$5"
 
-#Check if all dependencies are installed.
-if ! command -v pyrodigal &> /dev/null
+#Check if internal scripts are in the PATH.
+if ! command -v predictorfs.py &> /dev/null
 then
-    echo "Program pyrodigal not installed. Download it from https://github.com/althonos/pyrodigal. Exiting."
+    echo "Script predictorfs.py not found in PATH. Exiting."
     exit 1
 fi
 
@@ -129,68 +129,22 @@ fi
 echo "Removing files and directories with names identical to the output."
 rm -r "$baseassemblies"_orfs/ "$baseassemblies".pyrodigallog 2> /dev/null
 
-#Predict ORFs with Pyrodigal.
+#Predict ORFs with Pyrodigal, through its Python library, for several genomes at the same time (as many as there are cores).
+#predictorfs.py loads the assembliesnames file once, keeps each genome's Pyrodigal output (faa, gbk, and ffn files) in the pyrodigal_runs directory, and writes the faa files with the doggo format headers (>accession assembly [species]) and without asterisks (stop codons).
+#For the Pyrodigal runs, if the genome is from SR1 or Gracilibacteria (c__JAEDAM01) or code25 is given, use Code 25.
 echo "Predicting ORFs with Pyrodigal."
-#Create the orfs directory. Pyrodigal requires all directory structures to already be in place.
-mkdir "$baseassemblies"_orfs
-#Create a directory to retain the pyrodigal output files.
-mkdir "$baseassemblies"_orfs/pyrodigal_runs
-#We run Pyrodigal on all genomes in the contigs directory indiscriminately.
-for i in "${contigs}"*"${filext}" ; do
-	#Create the assemblyacc variable for filenames and logging. This is the assembly or name corresponding to each genome file, as determined by the whatwematch variable.
-	filestem="$(basename "$i" "${filext}")"
-	if [ "$whatwematch" = "assemblies" ] ; then
-		assemblyacc="$(perl -n -e 'BEGIN { $matcher = pop } print if m/^$matcher\t.*/' "$baseassemblies".assembliesnames "$filestem" | perl -p -e 's/^(.*?)\t.*/$1/g')"
-	elif [ "$whatwematch" = "names" ] ; then
-		assemblyacc="$(perl -n -e 'BEGIN { $matcher = pop } print if m/^.*?\t$matcher\n/' "$baseassemblies".assembliesnames "$filestem" | perl -p -e 's/^.*?\t(.*)/$1/g')"
-	fi
-	#Pyrodigal requires all directory structures to be already in place, so create individual directories for the output of each genome.
-	mkdir "$baseassemblies"_orfs/"$assemblyacc"
-	#Echo the assembly into the log to be able to distinguish outputs.
-	echo "$assemblyacc" >> "$baseassemblies".pyrodigallog
-  #echo "$assemblyacc"
-	#Run Pyrodigal on each contig file, and output its faa (aa ORFs), gbk (old Genbank format), and ffn (nucleotide ORFs) files. Redirect both output and errors to the log.
-	#At NCBI, gbk has been substituted by gbff but it's not an option, plus some programs take gbk as input. Alternatively, change the output to gff.
-	#Unlike Prodigal, which iirc freaks out if you -o to a gbk file, since it does this by default and will only take gff output, Pyrodigal needs this argument otherwise it outputs the gbk contents to stdout (or pyrodigallog here, since we redirect).
-	#For the Pyrodigal run, if the genome is from SR1 or Gracilibacteria (c__JAEDAM01), use Code 25.
-	if grep "$filestem" "$baseassemblies".assembliesnames | grep -q "c__JAEDAM01"
-	then
-		(pyrodigal -m -i "$i" -a "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".faa -o "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".gbk -d "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".ffn -g 25 ) >> "$baseassemblies".pyrodigallog 2>&1
-	elif [ "$#" -eq 5 ]
-	then
-		(pyrodigal -m -i "$i" -a "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".faa -o "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".gbk -d "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".ffn -g 25 ) >> "$baseassemblies".pyrodigallog 2>&1
-	else
-		(pyrodigal -m -i "$i" -a "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".faa -o "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".gbk -d "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".ffn ) >> "$baseassemblies".pyrodigallog 2>&1
-	fi
-	#Echo a line with two slashes in the log after each output. This is a commmon entry delimiter e.g., for Uniprot files.
-	echo "//"  >> "$baseassemblies".pyrodigallog
-	#Create a copy of the faa file to be used for header modification and asterisk removal.
-	cp "$baseassemblies"_orfs/"$assemblyacc"/"$assemblyacc".faa "$baseassemblies"_orfs/
-	#Move the pyrodigal run output with all the runs.
-	mv "$baseassemblies"_orfs/"$assemblyacc" "$baseassemblies"_orfs/pyrodigal_runs/
-	done
-
-#Edit the fasta headers.
-echo "Editing faa headers and removing asterisks corresponding to stop codons at the end of sequences."
-for i in "$baseassemblies"_orfs/*.faa ; do
-	#Redefine the filestem variable for faa files (that now corresponds to the assembly, like assemblyacc did previously). This makes it easier to define the modder variable.
-	filestem="$(basename "$i" .faa)"
-	#Define the modder variable, the line from assembliesnames containing the genome's assembly (and species name), depending on the whatwematch variable (we're trying to prevent substring matches).
-	if [ "$whatwematch" = "assemblies" ] ; then
-		modder="$(perl -n -e 'BEGIN { $matcher = pop } print if m/^$matcher\t.*/' "$baseassemblies".assembliesnames "$filestem")"
-	elif [ "$whatwematch" = "names" ] ; then
-		modder="$(perl -n -e 'BEGIN { $matcher = pop } print if m/^.*?\t$matcher\n/' "$baseassemblies".assembliesnames "$filestem")"
-	fi
-	#Remove all asterisks from the faa files. These (as far as we've encountered) correspond to stop codons.
-	#TODO: At some point we need to check how often stop codons can occur mid-sequence by checking all Bacteria and Archaea. We don't really care about them in headers (and in WhereDoGGo? they shouldn't occur anyway).
-	perl -p -i -e 's/\*//g' "$i"
-	#Modify the pyrodigal output faa headers by keeping only the first element (accession kinda), and adding the modder separated by a tab.
-	#We get rid of the rest of the header as it's not particularly informative for WhereDoGGo?.
-	perl -p -i -e 'BEGIN { $matcher = pop } s/^>(.*?) .*/>$1\t$matcher/g' "$i" "$modder"
-	#Rearrange the fasta headers to a pseudo-NCBI format aka the doggo format (>accession assembly [species]). The assembly is tagged on as part of the accesions to ensure their uniqueness.
-	#TODO: Reconsider these header edits? Perhaps don't get rid of the pyrodigal orf info entirely.
-	perl -p -i -e 's/>(.*?)\t(.*?)\t(.*)/>$2_$1 $2 \[$3\]/g' "$i"
-done
+cores="$(getconf _NPROCESSORS_ONLN 2> /dev/null || echo 1)"
+if [ "$#" -eq 5 ]
+then
+	python -u "$(command -v predictorfs.py)" "$baseassemblies".assembliesnames "$contigs" "$filext" "$whatwematch" "$baseassemblies"_orfs "$baseassemblies".pyrodigallog "$cores" code25 | grep -v '^#'
+else
+	python -u "$(command -v predictorfs.py)" "$baseassemblies".assembliesnames "$contigs" "$filext" "$whatwematch" "$baseassemblies"_orfs "$baseassemblies".pyrodigallog "$cores" | grep -v '^#'
+fi
+if [ "${PIPESTATUS[0]}" -ne 0 ]
+then
+	echo "Error during ORF prediction. Exiting."
+	exit 1
+fi
 
 #Congrats, you're done!
 echo "All done!"
@@ -7,6 +7,7 @@
 
 #Function
 #This script will cat orfs produced by contigs2orfs into a single database against which we can then run homology searches.
+#It also normalizes the FASTA headers of the database once (see dbformat.py, the format is recorded in <database>.format), so doggo_sniff does not have to fix the headers of every marker, and writes the offset index of the database (<database>.index, see dbindex.py), through which doggo_sniff pulls the sequences of the marker hits.
 
 #NOTE 1: All code was written and tested on or ARM Intel macOS and Ubuntu. Please report any issues.
 #All files in the orfs directory with a given extension are included in the db indiscriminately.
@@ -15,6 +16,18 @@
 #Dependencies
 #NONE
 
+#Check if internal scripts are in the PATH.
+if ! command -v dbformat.py &> /dev/null
+then
+    echo "Script dbformat.py not found in PATH. Exiting."
+    exit 1
+fi
+if ! command -v dbindex.py &> /dev/null
+then
+    echo "Script dbindex.py not found in PATH. Exiting."
+    exit 1
+fi
+
 assemblies="$1"
 orfs="$2"
 filext="$3"
@@ -83,11 +96,29 @@ fi
 
 #Remove the output from any previous runs to avoid appending.
 echo "Removing files with names identical to the output."
-rm -r "$baseassemblies".database 2> /dev/null
+rm -r "$baseassemblies".database "$baseassemblies".database.format "$baseassemblies".database.index 2> /dev/null
 
 #Cat all the orf files together.
 echo "Creating local database."
 for i in "${orfs}"*"${filext}" ; do cat "$i" >> "$baseassemblies".database ; done
 
+#Normalize the FASTA headers. This changes the offsets of the records, so it has to be done before indexing.
+echo "Normalizing FASTA headers of local database."
+python -u "$(command -v dbformat.py)" "$baseassemblies".database | grep -v '^#'
+if [ "${PIPESTATUS[0]}" -ne 0 ]
+then
+	echo "Error when normalizing the FASTA headers of the local database. Exiting."
+	exit 1
+fi
+
+#Index the database (accession, byte offset, and length of every record).
+echo "Indexing local database."
+python -u "$(command -v dbindex.py)" "$baseassemblies".database | grep -v '^#'
+if [ "${PIPESTATUS[0]}" -ne 0 ]
+then
+	echo "Error when indexing the local database. Exiting."
+	exit 1
+fi
+
 #Congrats, you're done!
 echo "All done!"
@@ -8,6 +8,7 @@
 #Function
 #This script checks which assemblies from GTDB metadata are not found among all NCBI assemblies for a given domain. These become the ignore list. They are also looked up against NCBI for their organism names.
 #The process is repeated for atypical assemblies in NCBI and local asssemblies neither in the non-atypical list, nor in the ignore list. For those their names and atypical warnings are also fetched.
+#The lists are compared and the names looked up by ignorelists.py, in one process and with one datasets call per batch of assemblies.
 
 #NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
 #TODO: In its current version, the script misses some edge cases e.g., ones that have been removed/suppressed from the Assembly database but a genome is available in the Nucleotide database. Should update with double-checking through full domain downloads.
@@ -26,6 +27,18 @@ then
     exit 1
 fi
 
+#Check if internal scripts are in the PATH.
+if ! command -v gtdbmetadata.py &> /dev/null
+then
+    echo "Script gtdbmetadata.py not found in PATH. Exiting."
+    exit 1
+fi
+if ! command -v ignorelists.py &> /dev/null
+then
+    echo "Script ignorelists.py not found in PATH. Exiting."
+    exit 1
+fi
+
 cat << EndOfMessage
 #Script: createignore.sh
 #Version: v20241212
@@ -67,10 +80,15 @@ else
 fi
 
 #Create the list of assemblies. If it's empty (taxon doesn't exist), remove it and exit.
-#The conversion to versionless Genbank is included.
+#The metadata is read through its columnar cache (created by gtdbmetadata.py the first time a metadata file is used). The conversion to versionless Genbank is included.
 echo "Removing any existing assemblies files for the taxon given and creating a new one."
 rm -r "$taxon".assemblies 2> /dev/null
-perl -p -e 's/^\w*?_(.*?)\.\d+\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t.*?\t(.*?)\t.*/$1\t$2/g' "$input_file" | grep "$taxon" | perl -p -e 's/^(.*?)\t.*/$1/g' | perl -p -e 's/^GCF_/GCA_/g' >> "$taxon".assemblies
+if ! python -u "$(command -v gtdbmetadata.py)" "$input_file" "$taxon" "$taxon".assemblies
+then
+	echo "Error when reading the input metadata file. Exiting."
+	rm -r "$taxon".assemblies 2> /dev/null
+	exit 1
+fi
 if [ $(wc -l < "$taxon".assemblies | sed 's/ //g') -gt 0 ] ; then
   echo "Assemblies found for the taxon given in the input metadata file. Proceeding."
 else
@@ -92,45 +110,20 @@ echo "This script was run at $creationtime UTC."
 echo "Creating a file with all assemblies in NCBI for $domain."
 datasets summary genome taxon $domaintxid --as-json-lines --assembly-source genbank --assembly-version latest | dataformat tsv genome --fields accession --elide-header | perl -p -e 's/^(.*?)\.\d+/$1/g' >> "$domain"_"$creationtime"_NCBI.all
 
-#Check which of the assemblies in the assemblies files are found among the NCBI assemblies for the domain. Anything not found is added to the ignorelist.
-echo "Writing all assemblies not among the NCBI assemblies to the .ignore file."
-touch "$domain"_"$creationtime".ignore
-awk 'NR==FNR{set[$0]=$0}NR!=FNR{if($0 in set==0){print $0}}' "$domain"_"$creationtime"_NCBI.all "$taxon".assemblies >> "$domain"_"$creationtime".ignore
-#while IFS= read -r line ; do if LC_ALL=C fgrep -q -- "$line" "$domain"_"$creationtime"_NCBI.all ; then : ; else echo "$line" >> "$domain"_"$creationtime".ignore ; fi ; done < "$taxon".assemblies
-
-#For all assemblies in the ignorelist, look up their organism name on NCBI and write it together with a versionless assembly. This is to confirm the most common reason for not finding an assembly (especially for Archaea), reassignment to a different domain.
-echo "Writing ignore assemblies and the NCBI organism names to the .ignorenames file."
-while IFS= read -r line ; do datasets summary genome accession "$line" --as-json-lines --assembly-source GenBank --assembly-version latest | dataformat tsv genome --fields accession,organism-name --elide-header | perl -p -e 's/^(.*?)\.\d+/$1/g' >> "$domain"_"$creationtime".ignorenames ; done < "$domain"_"$creationtime".ignore
-
-#Check for discrepancies between the assemblies in the ignore and the ignorenames files. Output any in the ignorediff file.
-echo "Checking for discrepancies between the assemblies in the .ignore and .ignorenames files. If there are any, writing them to the .ignorediff file. These are usually suppressed GenBank assemblies."
-touch "$domain"_"$creationtime".ignorediff
-#TODO: Fix the awk one-liner.
-#awk 'NR==FNR{set[$0]=$0}NR!=FNR{if($0 in set==0){print $0}}' "$domain"_"$creationtime".ignorenames "$domain"_"$creationtime".ignore >> "$domain"_"$creationtime".ignorediff
-while IFS= read -r line ; do if LC_ALL=C fgrep -q -- "$line" "$domain"_"$creationtime".ignorenames ; then : ; else echo "$line" >> "$domain"_"$creationtime".ignorediff ; fi ; done < "$domain"_"$creationtime".ignore
-
 #Create a file with all the assemblies in NCBI for the selected domain excluding atypical.
 #TODO: It looks like Refseq suppressed (at least some of them) fall under atypical (in Genbank and/or Refseq). Need to confirm to what extent this happens and if the assminfo-suppression-reason field needs to be included.
 echo "Creating a file with all assemblies in NCBI for $domain, excluding atypical."
 datasets summary genome taxon $domaintxid --as-json-lines --assembly-source genbank --assembly-version latest --exclude-atypical | dataformat tsv genome --fields accession --elide-header | perl -p -e 's/^(.*?)\.\d+/$1/g' >> "$domain"_"$creationtime"_NCBI.noatypical
 
-#Check which of the assemblies in the assemblies file are found neither in the ignorelist nor among the non-atypical NCBI assemblies.
-echo "Writing all assemblies not among the non-atypical NCBI assemblies and not in the .ignore file to the .atypical file."
-touch "$domain"_"$creationtime".atypical
-awk 'NR==FNR{set[$0]=$0}NR!=FNR{if($0 in set==0){print $0}}' "$domain"_"$creationtime"_NCBI.noatypical "$taxon".assemblies >> "$domain"_"$creationtime".atypical
-while IFS= read -r line ; do if LC_ALL=C fgrep -q -- "$line" "$domain"_"$creationtime".ignore ; then perl -p -i -e 'BEGIN { $matcher = pop } s/^$matcher\n//g' "$domain"_"$creationtime".atypical "$line" ; fi ; done < "$domain"_"$creationtime".atypical
-#while IFS= read -r line ; do if LC_ALL=C fgrep -q -- "$line" "$domain"_"$creationtime"_NCBI.noatypical "$domain"_"$creationtime".ignore ; then : ; else echo "$line" >> "$domain"_"$creationtime".atypical ; fi ; done < "$taxon".assemblies
-
-#For all atypical assemblies, look up their assminfo-atypicalwarnings and write it in a new file after the assembly (tab-delimited). assminfo-suppression-reason doesn't work here, it's probably a Refseq-only field
-echo "Writing atypical assemblies, organism names, and atypical warnings to the .atypicalnameswarnings file."
-while IFS= read -r line ; do datasets summary genome accession "$line" --as-json-lines --assembly-source GenBank --assembly-version latest | dataformat tsv genome --fields accession,organism-name,assminfo-atypicalwarnings --elide-header | perl -p -e 's/^(.*?)\.\d+/$1/g' >> "$domain"_"$creationtime".atypicalnameswarnings ; done < "$domain"_"$creationtime".atypical
-
-#Check for discrepancies between the assemblies in the ignore and the ignorenames files. Output any in the ignorediff file.
-echo "Checking for discrepancies between the assemblies in the .atypical and .atypicalnameswarnings files. If there are any, writing them to the .atypicaldiff file."
-touch "$domain"_"$creationtime".atypicaldiff
-#TODO: Fix the awk one-liner.
-#awk 'NR==FNR{set[$0]=$0}NR!=FNR{if($0 in set==0){print $0}}' "$domain"_"$creationtime".atypicalnameswarnings "$domain"_"$creationtime".atypical >> "$domain"_"$creationtime".atypicaldiff
-while IFS= read -r line ; do if LC_ALL=C fgrep -q -- "$line" "$domain"_"$creationtime".atypicalnameswarnings ; then : ; else echo "$line" >> "$domain"_"$creationtime".atypicaldiff ; fi ; done < "$domain"_"$creationtime".atypical
+#Assemblies not found among the NCBI assemblies for the domain go to the .ignore file, and assemblies found neither among the non-atypical NCBI assemblies nor in the .ignore file go to the .atypical file.
+#Their organism names (and atypical warnings) are looked up on NCBI (.ignorenames, .atypicalnameswarnings), and any assemblies not found by the lookups are written to the .ignorediff and .atypicaldiff files. These are usually suppressed GenBank assemblies.
+echo "Writing the ignore and atypical lists, and looking up their assemblies on NCBI."
+python -u "$(command -v ignorelists.py)" "$taxon".assemblies "$domain"_"$creationtime"_NCBI.all "$domain"_"$creationtime"_NCBI.noatypical "$domain"_"$creationtime" | grep -v '^#'
+if [ "${PIPESTATUS[0]}" -ne 0 ]
+then
+	echo "Error when writing the ignore and atypical lists. Exiting."
+	exit 1
+fi
 
 #Congrats, you're done!
 echo "All done!"
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script will create assemblies (list of assemblies) and assembliesnames (assemblies and species names, tab-delimited) files for a local set of genome files (as contigs), in one pass over the genome files.
+#Since these genomes did not originate from NCBI, we have to create dummy assemblies and species names.
+#The genome files are checksummed by several processes at a time, and genomes that are duplicates of an earlier one (identical files, or identical sequences in another file) get no records, so their ORFs are not predicted, searched, and aligned twice.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The sequence checksum of a genome only depends on its sequences (case-insensitive), not on the headers, line lengths, contig order, or gzip compression, so the same genome in differently formatted files is found as well. gzip-compressed genome files are decompressed in memory.
+#NOTE 3: Besides the .assemblies and .assembliesnames files, the script writes a .duplicates file (duplicate genome file, assembly and genome file it duplicates, and whether the files or only the sequences are identical) and a .checksums file (genome file, file and sequence SHA-256 checksums, contigs, and bases) that doggo_herd.py keeps in the run directory.
+
+#Dependencies
+#NONE
+
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import hashlib
+import os
+import random
+import re
+import string
+import sys
+
+#Dummy assemblies are the project code followed by a counter starting here.
+first_counter = 100001
+
+#Checksums of a genome file: SHA-256 of the file, SHA-256 of its sequences (see NOTE 2), and the numbers of contigs and bases.
+def genome_checksums(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    file_checksum = hashlib.sha256(data).hexdigest()
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    contig_checksums = list()
+    bases = 0
+    for record in data.split(b'>')[1:]:
+        sequence = record.partition(b'\n')[2].translate(None, b' \t\r\n').upper()
+        contig_checksums.append(hashlib.sha256(sequence).digest())
+        bases += len(sequence)
+    sequence_checksum = hashlib.sha256(b''.join(sorted(contig_checksums))).hexdigest()
+    return file_checksum, sequence_checksum, len(contig_checksums), bases
+
+#Checksums of all genome files, with <threads> processes (in this process if only one), in the order of the files.
+def checksum_genomes(paths, threads):
+    if threads == 1 or len(paths) <= 1:
+        return [genome_checksums(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(threads, len(paths))) as executor:
+        return list(executor.map(genome_checksums, paths, chunksize=4))
+
+#Read a .checksums file into a dictionary of genome file to checksums (empty if there is no file).
+def read_checksums(path):
+    checksums = dict()
+    if not os.path.isfile(path):
+        return checksums
+    with open(path, 'r') as f:
+        for line in f:
+            x = line.rstrip('\n').split('\t')
+            if len(x) == 5:
+                checksums[x[0]] = (x[1], x[2], int(x[3]), int(x[4]))
+    return checksums
+
+def write_checksums(checksums, path):
+    with open(path, 'w') as f:
+        for genome_file, (file_checksum, sequence_checksum, contig_count, bases) in checksums.items():
+            f.write(genome_file + '\t' + file_checksum + '\t' + sequence_checksum + '\t' + str(contig_count) + '\t' + str(bases) + '\n')
+
+#Records of the genome files (in order): the dummy assemblies and the duplicates, as (genome file, assembly or None, (kind, assembly, genome file it duplicates) or None).
+def create_records(genome_files, checksums, code, keep_duplicates=False):
+    records = list()
+    by_file = dict()
+    by_sequence = dict()
+    counter = first_counter
+    for genome_file, (file_checksum, sequence_checksum, contigs, bases) in zip(genome_files, checksums):
+        if not keep_duplicates and file_checksum in by_file:
+            records.append((genome_file, None, ('identical file',) + by_file[file_checksum]))
+            continue
+        if not keep_duplicates and sequence_checksum in by_sequence:
+            records.append((genome_file, None, ('identical sequences',) + by_sequence[sequence_checksum]))
+            continue
+        assembly = code + str(counter)
+        counter += 1
+        by_file.setdefault(file_checksum, (assembly, genome_file))
+        by_sequence.setdefault(sequence_checksum, (assembly, genome_file))
+        records.append((genome_file, assembly, None))
+    return records
+
+if __name__ == '__main__':
+    print('#Script: createrecords.py')
+    print('#Version: v20241212')
+    print('#Usage: python createrecords.py <contigs> <filext> <code> [--threads <threads>] [--keep-duplicates]')
+    print('#<contigs> must be the path to the directory containing the genome files (as contigs, plain or gzip-compressed). (trailing slash optional) (required)')
+    print('#<filext> must be the file extension of the genome files. (leading dot optional) (required)')
+    print('#<code> must be a project code (alphanumeric and/or underscores only) that will be used as a filename stem and in assemblies. If one is not given, it will be randomly generated. (optional)')
+    print('#--threads <threads> must be the number of processes checksumming the genome files (default: all cores). (optional)')
+    print('#--keep-duplicates can be added to create records for duplicate genomes as well. (optional)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    #Take out the options before checking the positional arguments.
+    keep_duplicates = False
+    if '--keep-duplicates' in sys.argv:
+        keep_duplicates = True
+        sys.argv.remove('--keep-duplicates')
+    threads = os.cpu_count() or 1
+    if '--threads' in sys.argv and sys.argv.index('--threads') + 1 < len(sys.argv):
+        option_position = sys.argv.index('--threads')
+        try:
+            threads = int(sys.argv[option_position + 1])
+        except ValueError:
+            threads = 0
+        del sys.argv[option_position:option_position + 2]
+        if threads <= 0:
+            print('Number of threads must be a positive integer. Exiting.')
+            sys.exit(1)
+
+    #Check if the number of arguments is correct, otherwise exit.
+    if len(sys.argv) == 3 or len(sys.argv) == 4:
+        print(str((len(sys.argv)-1)) + ' arguments found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    #Check if the directory containing the genomes exists, otherwise exit.
+    contigs = sys.argv[1]
+    if os.path.isdir(contigs):
+        print('Contig directory found. Proceeding.')
+    else:
+        print('Contig directory not found. Exiting.')
+        sys.exit(1)
+
+    #Check if the extension provided starts with a dot, otherwise add it.
+    filext = sys.argv[2] if sys.argv[2].startswith('.') else '.' + sys.argv[2]
+
+    #Check if there exists at least one file with the chosen extension in the genome directory, otherwise exit. Files are numbered in name order, as the shell glob of createrecords.sh did.
+    genome_files = sorted(fname for fname in os.listdir(contigs) if fname.endswith(filext) and os.path.isfile(os.path.join(contigs, fname)))
+    if len(genome_files) > 0:
+        print('File(s) with the given extension found in the contig directory. Proceeding.')
+    else:
+        print('No files with given extension found in the contig directory. Exiting.')
+        sys.exit(1)
+
+    #Check if the project code is valid, otherwise exit. If one is not given, generate a random one.
+    if len(sys.argv) == 4:
+        code = sys.argv[3]
+        if re.match(r'^[A-Za-z0-9_]+$', code):
+            print('Project code is valid. Proceeding.')
+        else:
+            print('Project code is invalid. Exiting.')
+            sys.exit(1)
+    else:
+        code = ''.join(random.choice(string.ascii_uppercase) for _ in range(5))
+        print('Generated random project code ' + code + '. Proceeding.')
+
+    print('Removing files with names identical to the output.')
+    os.system('rm -r ' + code + '.assemblies ' + code + '.assembliesnames ' + code + '.duplicates ' + code + '.checksums 2> /dev/null')
+
+    print('Checksumming ' + str(len(genome_files)) + ' genome file(s) with ' + str(threads) + ' process(es).')
+    try:
+        checksums = checksum_genomes([os.path.join(contigs, genome_file) for genome_file in genome_files], threads)
+    except (OSError, EOFError) as error:
+        print('Error when reading the genome files (' + str(error) + '). Exiting.')
+        sys.exit(1)
+    records = create_records(genome_files, checksums, code, keep_duplicates)
+
+    print('Creating the .assemblies, .assembliesnames, .duplicates, and .checksums files.')
+    duplicates = 0
+    with open(code + '.assemblies', 'w') as assemblies, open(code + '.assembliesnames', 'w') as assembliesnames, open(code + '.duplicates', 'w') as duplicates_file:
+        for genome_file, assembly, duplicate in records:
+            if assembly is not None:
+                assemblies.write(assembly + '\n')
+                assembliesnames.write(assembly + '\t' + genome_file[:-len(filext)] + '\n')
+            else:
+                duplicates_file.write(genome_file + '\t' + duplicate[1] + '\t' + duplicate[2] + '\t' + duplicate[0] + '\n')
+                duplicates += 1
+    write_checksums(dict(zip(genome_files, checksums)), code + '.checksums')
+    if duplicates > 0:
+        print(str(duplicates) + ' duplicate genome file(s) found and left out (see the .duplicates file).')
+
+    print('All done!')
@@ -8,12 +8,20 @@
 #Function
 #This script will create assemblies (list of assemblies) and assmebliesnames (assemblies and species names, tab-delimited) files for a local set of genome files (as contigs).
 #Since these genomes did not originate from NCBI, we have to create dummy assemblies and species names.
+#The records are created by createrecords.py (see there for duplicate genomes), and this script is kept for running it with the same arguments as before.
 
 #NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
 
 #Dependencies
 #NONE
 
+#Check if internal scripts are in the PATH.
+if ! command -v createrecords.py &> /dev/null
+then
+    echo "Script createrecords.py not found in PATH. Exiting."
+    exit 1
+fi
+
 contigs="$1"
 filext="$2"
 code="$3"
@@ -82,21 +90,16 @@ then
 	echo "Generated random project code ${code}. Proceeding."
 fi
 
-#Remove the output from any previous runs to avoid appending.
-echo "Removing files with names identical to the output."
-rm -r "$code".assemblies "$code".assembliesnames 2> /dev/null
-
-#Create a six digit counter for the genome dummy assemblies.
-counter=100001
-
-#Create the assemblies files, where each assembly is a fusion of the project code with the iterating counter.
+#Create the assemblies files, where each assembly is a fusion of the project code with a six digit counter (from 100001).
 #Also create the tab-delimited assembliesnames file where the species name is the stem of each genome filename.
+#The records are created by createrecords.py, which also checksums the genome files with all cores and leaves out duplicate genomes (see the .duplicates file).
 echo "Creating the .assemblies and .assembliesnames files."
-for i in "${contigs}"*"${filext}" ; do
-	echo -e "${code}${counter}\t$(basename "$i" "${filext}")" >> "$code".assembliesnames
-	echo  "${code}${counter}" >> "$code".assemblies
-	counter=$((counter+1))
-done
+python -u "$(command -v createrecords.py)" "$contigs" "$filext" "$code" | grep -v '^#'
+if [ "${PIPESTATUS[0]}" -ne 0 ]
+then
+	echo "Error when creating the records. Exiting."
+	exit 1
+fi
 
 #Congrats, you're done!
 echo "All done!"
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script normalizes the FASTA headers of a local database once, when the database is created: parentheses, semicolons, colons, and commas after the protein accession, which often make alignment or tree-building programs crash, are replaced by spaces, as doggo_sniff did for the sequences of every marker. The format of the database is recorded in a sidecar file (<database>.format).
+#doggo_sniff skips fixing the headers of the marker sequences for databases in the normalized format, and only fixes the protein accession and swaps the protein and assembly accessions while pulling the sequences (see pullsequences.py).
+#Run on its own, it normalizes the headers of a database (e.g., of an older run) in place.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The sidecar records the format version and the size and modification time of the database it was written for. Databases without a sidecar, or changed since it was written, are taken as unnormalized (doggo_database_v1), and doggo_sniff fixes their headers as before.
+#NOTE 3: The protein accession (the first word of the headers) is left as it is, since hmmsearch and pullsequences.py identify the sequences by it and replacing e.g. a colon in it could make two accessions the same, so it is fixed and swapped with the assembly accession when the sequences are pulled instead.
+
+#Dependencies
+#NONE
+
+import os
+import sys
+
+from dbindex import database_stamp
+
+format_extension = '.format'
+legacy_format = 'doggo_database_v1'
+normalized_format = 'doggo_database_v2'
+
+#The characters replaced by spaces in the headers (see doggo_sniff.py).
+header_table = bytes.maketrans(b'();:,', b'     ')
+
+def format_path(database):
+    return database + format_extension
+
+#The sidecar is written under a temporary name and renamed when complete.
+def write_format(database):
+    size, mtime_ns = database_stamp(database)
+    partial_path = format_path(database) + '.' + str(os.getpid()) + '.part'
+    with open(partial_path, 'w') as f:
+        f.write(normalized_format + '\t' + size + '\t' + mtime_ns + '\n')
+    os.replace(partial_path, format_path(database))
+
+#The format of a database: normalized_format if its sidecar was written for it as it is now, otherwise legacy_format.
+def database_format(database):
+    try:
+        with open(format_path(database), 'r') as f:
+            x = f.readline().rstrip('\n').split('\t')
+    except OSError:
+        return legacy_format
+    if len(x) == 3 and x[0] == normalized_format and tuple(x[1:]) == database_stamp(database):
+        return normalized_format
+    return legacy_format
+
+#A header line with the characters of header_table replaced by spaces after the first word (the protein accession).
+def normalize_header(line):
+    words = line.split(b' ', 1)
+    if len(words) == 1:
+        return line
+    return words[0] + b' ' + words[1].translate(header_table)
+
+#Normalize the headers of a database in place and write its sidecar. The database is only rewritten if any header has to change. Returns whether it was rewritten.
+def normalize_database(database):
+    with open(database, 'rb') as f:
+        rewrite = any(line.startswith(b'>') and normalize_header(line) != line for line in f)
+    if rewrite:
+        partial_path = database + '.' + str(os.getpid()) + '.part'
+        with open(database, 'rb') as f, open(partial_path, 'wb') as output:
+            for line in f:
+                output.write(normalize_header(line) if line.startswith(b'>') else line)
+        os.replace(partial_path, database)
+    write_format(database)
+    return rewrite
+
+#Fix the headers of FASTA records pulled from a normalized database as doggo_sniff does for other databases: the characters of header_table are replaced by spaces in the protein accession too, and the first two words (protein and assembly accessions) are swapped as with perl (s/>(.*?) (.*?) (.*)/>$2 $1 $3/), so that all sequences of a genome have the same accession across markers. Headers with fewer than three words are not swapped.
+def fix_headers(records):
+    lines = records.split(b'\n')
+    for i, line in enumerate(lines):
+        if line.startswith(b'>'):
+            line = line.translate(header_table)
+            lines[i] = line
+            words = line[1:].split(b' ', 2)
+            if len(words) == 3:
+                lines[i] = b'>' + words[1] + b' ' + words[0] + b' ' + words[2]
+    return b'\n'.join(lines)
+
+if __name__ == '__main__':
+    print('#Script: dbformat.py')
+    print('#Version: v20241212')
+    print('#Usage: python dbformat.py <database>')
+    print('#<database> must be a local database in FASTA format (e.g., the .database file of a doggo_fetch or doggo_herd run). Its headers are normalized in place. (required)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    if len(sys.argv) == 2:
+        print('One argument found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    if os.path.isfile(sys.argv[1]) == True:
+        print('Database file found. Proceeding.')
+    else:
+        print('Database file not found. Exiting.')
+        sys.exit(1)
+
+    print('Normalizing the FASTA headers of the database.')
+    try:
+        rewritten = normalize_database(sys.argv[1])
+    except OSError as error:
+        print('Error when normalizing the database (' + str(error) + '). Exiting.')
+        sys.exit(1)
+    if rewritten:
+        print('Headers normalized. Format recorded in ' + format_path(sys.argv[1]) + '.')
+    else:
+        print('Headers already normalized. Format recorded in ' + format_path(sys.argv[1]) + '.')
+
+    print('All done!')
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script writes the offset index of a local database (<database>.index): the byte offset and length of every sequence record, by accession, as samtools faidx does for its .fai files. createdb.sh writes it with every database, and doggo_sniff reads the sequences of the marker hits through it (see pullsequences.py), so pulling sequences only reads the records needed instead of the whole database once per marker.
+#Several databases can be read through their indexes as one (IndexedDatabases), so doggo_sniff does not need to combine them into a single file.
+#Run on its own, it (re)writes the index of a database.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The first line of the index records the size and modification time of the database it was written for. Indexes of databases changed since (or missing indexes) are written again when the database is opened (IndexedDatabase).
+#NOTE 3: The accession of a record is its header up to the first whitespace, as for seqtk subseq. Records are indexed as a whole (header and sequence lines), so databases with any line length can be indexed.
+#NOTE 4: If the index of a database cannot be written (e.g., the database is in a read-only directory), it is kept in memory only.
+
+#Dependencies
+#NONE
+
+import mmap
+import os
+import re
+import sys
+
+index_extension = '.index'
+index_version = 'doggo_database_index_v1'
+
+def index_path(database):
+    return database + index_extension
+
+def database_stamp(database):
+    stat = os.stat(database)
+    return str(stat.st_size), str(stat.st_mtime_ns)
+
+#The records of a database: accession, byte offset of the header, and byte length of the record (header and sequence lines), in database order.
+def index_records(database):
+    with open(database, 'rb') as f:
+        accession = None
+        start = 0
+        offset = 0
+        for line in f:
+            if line.startswith(b'>'):
+                if accession is not None:
+                    yield accession, start, offset - start
+                fields = line[1:].split(maxsplit=1)
+                accession = fields[0].decode() if fields else ''
+                start = offset
+            offset += len(line)
+        if accession is not None:
+            yield accession, start, offset - start
+
+#Write the index of a database, tab-delimited (see index_records).
+#The index is written under a temporary name and renamed when complete, so an index is never read half-written.
+def write_index(database):
+    size, mtime_ns = database_stamp(database)
+    partial_path = index_path(database) + '.' + str(os.getpid()) + '.part'
+    records = 0
+    try:
+        with open(partial_path, 'w') as index:
+            index.write(index_version + '\t' + size + '\t' + mtime_ns + '\n')
+            for accession, offset, length in index_records(database):
+                index.write(accession + '\t' + str(offset) + '\t' + str(length) + '\n')
+                records += 1
+        os.replace(partial_path, index_path(database))
+    except OSError:
+        if os.path.isfile(partial_path):
+            os.remove(partial_path)
+        raise
+    return records
+
+#True if the database has an index written for its current size and modification time.
+def index_is_current(database):
+    try:
+        with open(index_path(database), 'r') as index:
+            x = index.readline().rstrip('\n').split('\t')
+    except OSError:
+        return False
+    return len(x) == 3 and x[0] == index_version and tuple(x[1:]) == database_stamp(database)
+
+#Read the index of a database into a dictionary of accession to a list of (offset, length) tuples (a list, as accessions can be repeated in a database).
+def read_index(database):
+    records = dict()
+    with open(index_path(database), 'r') as index:
+        index.readline()
+        for line in index:
+            x = line.rstrip('\n').split('\t')
+            if len(x) == 3:
+                records.setdefault(x[0], list()).append((int(x[1]), int(x[2])))
+    return records
+
+#A header as seqtk writes it: the name (up to the first whitespace character) and, if there is any, the comment (the rest of the line) separated by a space, so e.g. a tab after the name becomes a space.
+def seqtk_header(header):
+    header = header.rstrip(b'\r')
+    fields = re.match(rb'>(\S*)\s?(.*)', header, re.DOTALL)
+    if fields.group(2):
+        return b'>' + fields.group(1) + b' ' + fields.group(2)
+    return b'>' + fields.group(1)
+
+#A database with its index, whose records are read through mmap. The index is written first if it is missing or out of date (see NOTE 4).
+class IndexedDatabase:
+    def __init__(self, database):
+        self.database = database
+        self.records = None
+        if not index_is_current(database):
+            try:
+                write_index(database)
+            except OSError:
+                self.records = dict()
+                for accession, offset, length in index_records(database):
+                    self.records.setdefault(accession, list()).append((offset, length))
+        if self.records is None:
+            self.records = read_index(database)
+        self.file = open(database, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(database) > 0 else b''
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #The (offset, length) of the records of <accessions> found in the database, in database order. As with seqtk subseq, accessions given more than once are returned once, and all records of accessions repeated in the database are returned.
+    def locate(self, accessions):
+        return sorted(location for accession in set(accessions) for location in self.records.get(accession, []))
+
+    #The records of <accessions>, in database order, written as by seqtk subseq: the header as its name and comment separated by a space (see seqtk_header), and each sequence on one line.
+    def subseq(self, accessions):
+        output = list()
+        for offset, length in self.locate(accessions):
+            record = bytes(self.data[offset:offset + length])
+            header, _, sequence = record.partition(b'\n')
+            output.append(seqtk_header(header) + b'\n' + b''.join(sequence.split()) + b'\n')
+        return b''.join(output)
+
+#Several databases read as one, as if they were combined in the order given, without combining them.
+class IndexedDatabases:
+    def __init__(self, databases):
+        self.members = list()
+        try:
+            for database in databases:
+                self.members.append(IndexedDatabase(database))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        for member in self.members:
+            member.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #The number of records of <accessions> found in the databases.
+    def count(self, accessions):
+        accessions = set(accessions)
+        return sum(len(member.locate(accessions)) for member in self.members)
+
+    #The records of <accessions>, in the order of the databases and then of their records.
+    def subseq(self, accessions):
+        accessions = set(accessions)
+        return b''.join(member.subseq(accessions) for member in self.members)
+
+if __name__ == '__main__':
+    print('#Script: dbindex.py')
+    print('#Version: v20241212')
+    print('#Usage: python dbindex.py <database>')
+    print('#<database> must be a local database in FASTA format (e.g., the .database file of a doggo_fetch or doggo_herd run). (required)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    if len(sys.argv) == 2:
+        print('One argument found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    if os.path.isfile(sys.argv[1]) == True:
+        print('Database file found. Proceeding.')
+    else:
+        print('Database file not found. Exiting.')
+        sys.exit(1)
+
+    print('Writing the offset index of the database.')
+    try:
+        records = write_index(sys.argv[1])
+    except OSError as error:
+        print('Error when writing the index (' + str(error) + '). Exiting.')
+        sys.exit(1)
+    print(str(records) + ' record(s) indexed in ' + index_path(sys.argv[1]) + '.')
+
+    print('All done!')
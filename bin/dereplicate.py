@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script dereplicates the database of a doggo_fetch or doggo_herd run before doggo_sniff: genomes that are nearly identical (at least <identity> % AAI, or ANI with --contigs) are clustered, and only the best genome of each cluster is kept.
+#Genomes are compared by MinHash sketches of their proteomes (from the database) or contigs (see minhash.py). The output is a reduced database and assembliesnames file, and a clusters file with the representative of every genome.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: Genomes are ranked by the genome quality score of pickgenomes.py if GTDB metadata is given (--metadata, and --score as in pickgenomes.py), and by their size otherwise (or if they are not in the metadata, e.g., doggo_herd genomes). Going down the ranking, each genome joins the most similar representative above <identity>, or becomes a representative itself, so representatives are always the best genomes of their clusters.
+#NOTE 3: Sketches are cached per genome (by a checksum of its sequences, in .doggosketches next to the database unless --cache is given), so a rerun, e.g., with another <identity> or after adding genomes, only sketches new genomes.
+
+#Dependencies
+#1) NumPy (https://numpy.org/install/)
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import os
+import sys
+
+#Check if required non-standard libraries are installed.
+import importlib.util
+nonstandardlibraries = {"numpy" : "https://numpy.org/install/"}
+for nstlobject,link in nonstandardlibraries.items():
+    if importlib.util.find_spec(nstlobject) is not None:
+        pass
+    else:
+        print('Library ' + nstlobject + ' not installed. Download it from: ' + link + '. Exiting.')
+        sys.exit(1)
+
+from dbformat import database_format, normalized_format, write_format
+from genomescore import compute_scores, default_score, named_scores, parse_score
+from gtdbmetadata import load_metadata, versionless_genbank
+from minhash import cached_sketch, candidate_pairs, default_sketch_size, jaccard, jaccard_identity
+from refreshrun import database_blocks
+
+#The sequences of FASTA lines as bytes, one sequence per line, without headers.
+def fasta_sequences(lines):
+    sequences = list()
+    for line in lines:
+        if line.startswith(b'>'):
+            sequences.append(b'\n')
+        else:
+            sequences.append(line.strip())
+    return b''.join(sequences)
+
+#The contig file of a genome: the first file in <contigs_dir> named after the genome with any extension (e.g., <genome>.fna.gz), or None.
+#Genomes are given as their assembliesnames line; files named after the assembly (doggo_fetch) are taken before files named after the name (doggo_herd).
+def contigs_file(contigs_dir, names_line, contig_files):
+    for genome in names_line.rstrip('\n').split('\t')[:2]:
+        genome = genome.strip()
+        if genome == '':
+            continue
+        for contig_file in contig_files:
+            if contig_file.startswith(genome + '.'):
+                return os.path.join(contigs_dir, contig_file)
+    return None
+
+#Sketch a genome, given as its sequences (bytes) or the path of its contig file (plain or gzip-compressed).
+def sketch_genome(cache_dir, kind, sketch_size, source):
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            gzipped = f.read(2) == b'\x1f\x8b'
+        with (gzip.open(source, 'rb') if gzipped else open(source, 'rb')) as f:
+            source = fasta_sequences(f)
+    return cached_sketch(cache_dir, kind, sketch_size, source)
+
+#Sketch all genomes with <threads> processes (in this process if only one), in the order given. Only a few genomes are sketched or waiting at a time, so memory stays flat.
+def sketch_genomes(sources, cache_dir, kind, sketch_size, threads):
+    if threads == 1:
+        for source in sources:
+            yield sketch_genome(cache_dir, kind, sketch_size, source)
+        return
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        pending = deque()
+        for source in sources:
+            pending.append(executor.submit(sketch_genome, cache_dir, kind, sketch_size, source))
+            while len(pending) > 2 * threads or (pending and pending[0].done()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+#Cluster genomes going down their ranking (see NOTE 2). Returns the representative and the identity to it of every genome (by index).
+def cluster_genomes(ranking, neighbors):
+    representative = dict()
+    identity_to = dict()
+    for genome in ranking:
+        best = None
+        for other, identity in neighbors.get(genome, []):
+            if representative.get(other) == other and (best is None or identity > best[1]):
+                best = (other, identity)
+        if best is None:
+            representative[genome] = genome
+            identity_to[genome] = 1.0
+        else:
+            representative[genome], identity_to[genome] = best
+    return representative, identity_to
+
+if __name__ == '__main__':
+    print('#Script: dereplicate.py')
+    print('#Version: v20241212')
+    print('#Usage: python dereplicate.py <database> <assembliesnames> <identity>')
+    print('#<database> must be the database of a doggo_fetch or doggo_herd run. (required)')
+    print('#<assembliesnames> must be the assembliesnames file of the same run. (required)')
+    print('#<identity> must be the minimum identity (AAI, or ANI with --contigs) in % for two genomes to be clustered, e.g. 99. (required)')
+    print('#--contigs <contigs_dir> can be added to compare genomes by their contigs (<contigs_dir>/<assembly or name>.<extension>, plain or gzip-compressed) instead of their proteomes. (optional)')
+    print('#--metadata <input_tsv> must be the GTDB metadata used for the run. If given, genomes are ranked by their genome quality score, otherwise by their size. (optional)')
+    print('#--score <score> must be the genome quality score used with --metadata: one of ' + ', '.join(named_scores) + ' (default: ' + default_score + '), or an expression as in pickgenomes.py. (optional)')
+    print('#--sketch <sketch_size> must be the number of hashes per sketch (default: ' + str(default_sketch_size) + '). (optional)')
+    print('#--cache <cache_dir> must be the directory of the sketch cache (default: .doggosketches next to <database>). (optional)')
+    print('#--threads <threads> must be the number of processes sketching genomes (default: all cores). (optional)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    #Take out the options before checking the positional arguments.
+    options = {'--contigs': None, '--metadata': None, '--score': default_score, '--sketch': str(default_sketch_size), '--cache': None, '--threads': str(os.cpu_count() or 1)}
+    for option in options:
+        if option in sys.argv and sys.argv.index(option) + 1 < len(sys.argv):
+            option_position = sys.argv.index(option)
+            options[option] = sys.argv[option_position + 1]
+            del sys.argv[option_position:option_position + 2]
+
+    if len(sys.argv) == 4:
+        print(str((len(sys.argv)-1)) + ' arguments found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    if os.path.isfile(sys.argv[1]) == True:
+        print('Database found. Proceeding.')
+    else:
+        print('Database not found. Exiting.')
+        sys.exit(1)
+
+    if os.path.isfile(sys.argv[2]) == True:
+        print('Assembliesnames file found. Proceeding.')
+    else:
+        print('Assembliesnames file not found. Exiting.')
+        sys.exit(1)
+
+    try:
+        min_identity = float(sys.argv[3])
+    except ValueError:
+        min_identity = 0
+    if 0 < min_identity <= 100:
+        print('Identity is valid. Proceeding.')
+    else:
+        print('Identity must be a number higher than 0 and up to 100. Exiting.')
+        sys.exit(1)
+
+    if options['--contigs'] is not None:
+        if os.path.isdir(options['--contigs']) == True:
+            print('Contigs directory found. Genomes will be compared by ANI. Proceeding.')
+        else:
+            print('Contigs directory not found. Exiting.')
+            sys.exit(1)
+        kind = 'nucleotide'
+    else:
+        print('Genomes will be compared by AAI. Proceeding.')
+        kind = 'protein'
+
+    for option in ('--sketch', '--threads'):
+        try:
+            options[option] = int(options[option])
+        except ValueError:
+            options[option] = 0
+        if options[option] <= 0:
+            print('Sketch size and number of threads must be positive integers. Exiting.')
+            sys.exit(1)
+    sketch_size = options['--sketch']
+    threads = options['--threads']
+
+    #Genome quality scores from the metadata, if given (see genomescore.py).
+    genome_scores = dict()
+    if options['--metadata'] is not None:
+        if os.path.isfile(options['--metadata']) == True:
+            print('Metadata file found. Proceeding.')
+        else:
+            print('Metadata file not found. Exiting.')
+            sys.exit(1)
+        try:
+            parse_score(options['--score'])
+        except ValueError as error:
+            print(str(error) + ' Exiting.')
+            sys.exit(1)
+        metadata = load_metadata(options['--metadata'])
+        scores = compute_scores(metadata, options['--score'])
+        for row, accession in enumerate(metadata.strings('accession')):
+            genome_scores[versionless_genbank(accession)] = float(scores[row])
+
+    cache_dir = options['--cache'] if options['--cache'] is not None else os.path.join(os.path.dirname(os.path.abspath(sys.argv[1])), '.doggosketches')
+    output_stem = os.path.basename(sys.argv[1]).split('.', 1)[0] + '_derep' + sys.argv[3]
+
+    print('Removing files with names identical to the output.')
+    for extension in ('.database', '.database.format', '.assembliesnames', '.clusters'):
+        if os.path.isfile(output_stem + extension):
+            os.remove(output_stem + extension)
+
+    #The genomes of the database, in database order.
+    with open(sys.argv[2], 'r') as f:
+        names_lines = [line for line in f if line.strip()]
+    if kind == 'protein':
+        genomes = list()
+        def sources():
+            for genome, lines in database_blocks(sys.argv[1]):
+                genomes.append(genome)
+                yield fasta_sequences(line.encode() for line in lines)
+    else:
+        genomes = [line.split('\t', 1)[0].strip() for line in names_lines]
+        contig_files = sorted(os.listdir(options['--contigs']))
+        genome_files = [contigs_file(options['--contigs'], names_line, contig_files) for names_line in names_lines]
+        missing = [genome for genome, genome_file in zip(genomes, genome_files) if genome_file is None]
+        if len(missing) > 0:
+            print(str(len(missing)) + ' genome(s) without a contig file in the contigs directory, e.g., ' + missing[0] + '. Exiting.')
+            sys.exit(1)
+        def sources():
+            for genome_file in genome_files:
+                yield genome_file
+
+    print('Sketching genomes with ' + str(threads) + ' process(es).')
+    sketches = list()
+    sizes = list()
+    sketched = 0
+    for hashes, size, new in sketch_genomes(sources(), cache_dir, kind, sketch_size, threads):
+        sketches.append(hashes)
+        sizes.append(size)
+        sketched += new
+    print(str(len(sketches)) + ' genome(s), ' + str(sketched) + ' sketched and ' + str(len(sketches) - sketched) + ' taken from the sketch cache in ' + cache_dir + '.')
+
+    print('Comparing genomes.')
+    neighbors = dict()
+    for (first, second), shared in candidate_pairs(sketches, min_identity / 100, kind, sketch_size).items():
+        identity = jaccard_identity(jaccard(sketches[first], sketches[second], sketch_size), kind)
+        if identity >= min_identity / 100:
+            neighbors.setdefault(first, list()).append((second, identity))
+            neighbors.setdefault(second, list()).append((first, identity))
+
+    print('Clustering genomes.')
+    ranking = sorted(range(len(genomes)), key=lambda genome: (-genome_scores.get(genomes[genome], float('-inf')), -sizes[genome], genome))
+    representative, identity_to = cluster_genomes(ranking, neighbors)
+    kept = set(genomes[genome] for genome in range(len(genomes)) if representative[genome] == genome)
+
+    print('Writing dereplicated database.')
+    with open(output_stem + '.database', 'w') as database:
+        for genome, lines in database_blocks(sys.argv[1]):
+            if genome in kept:
+                database.writelines(lines)
+    #The records are copied as they are, so the dereplicated database has the format of the database (see dbformat.py).
+    if database_format(sys.argv[1]) == normalized_format:
+        write_format(output_stem + '.database')
+    with open(output_stem + '.assembliesnames', 'w') as assembliesnames:
+        for line in names_lines:
+            if line.split('\t', 1)[0].strip() in kept:
+                assembliesnames.write(line)
+    with open(output_stem + '.clusters', 'w') as clusters:
+        clusters.write('representative\tgenome\tidentity\n')
+        for genome in sorted(range(len(genomes)), key=lambda genome: (representative[genome], genome)):
+            clusters.write(genomes[representative[genome]] + '\t' + genomes[genome] + '\t' + str(round(100 * identity_to[genome], 2)) + '\n')
+
+    print(str(len(kept)) + ' of ' + str(len(genomes)) + ' genome(s) kept as representatives.')
+    print('All done!')
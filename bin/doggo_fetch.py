@@ -17,7 +17,18 @@
 import argparse
 import math
 import os
+import shlex
+import shutil
 import sys
+import time
+
+from archivedirs import Archiver, archive_name, find_archive
+from dbformat import normalize_database
+from dbindex import write_index
+from fetchcosts import directory_bytes, read_prediction_summary, write_costs
+from genomestore import GenomeStore, parse_size
+from gtdbmetadata import load_metadata, validate_metadata, versioned_genbank, versionless_genbank, write_validation
+from refreshrun import diff_runs, merge_archive, merge_database, merge_orf_archive, merge_pyrodigallog, read_pairs
 
 #Check if required external programs are installed.
 import subprocess
@@ -41,6 +52,16 @@ try:
 except subprocess.CalledProcessError:
     print('Script downloadcontigs.sh not found in PATH. Exiting.')
     sys.exit(1)
+try:
+    extractcontigs_py = (subprocess.check_output("which extractcontigs.py", shell=True, universal_newlines=True).strip())
+except subprocess.CalledProcessError:
+    print('Script extractcontigs.py not found in PATH. Exiting.')
+    sys.exit(1)
+try:
+    predictorfs_py = (subprocess.check_output("which predictorfs.py", shell=True, universal_newlines=True).strip())
+except subprocess.CalledProcessError:
+    print('Script predictorfs.py not found in PATH. Exiting.')
+    sys.exit(1)
 try:
     contigs2orfs_sh = (subprocess.check_output("which contigs2orfs.sh", shell=True, universal_newlines=True).strip())
 except subprocess.CalledProcessError:
@@ -86,6 +107,16 @@ parser.add_argument("-res", "--resolution", required=True, help="RESOLUTION must
 parser.add_argument("-n", "--number", required=True, help="NUMBER must be the number of genomes to be picked per RESOLUTION. Must be a positive integer or all. If RESOLUTION is all, NUMBER must also be all. (required)")
 parser.add_argument("-min", "--minimum", required=True, help="MINIMUM must be the minimum number of genomes for a RESOLUTION to be included. Must be a positive integer and lower than or equal to NUMBER. If NUMBER is all, MINIMUM can be any positive integer but it will be overridden. (required)")
 parser.add_argument("-ig", "--ignore", required=False, help="IGNORE must be a text file containing genome assembly accessions (one per line, versionless e.g., GCA_011362025) that will not be picked. (optional)")
+parser.add_argument("-score", "--score", required=False, help="SCORE must be the genome quality score used to pick the best genomes: drep (default), checkm, completeness, contiguity, or an expression over the metadata columns completeness, contamination, strain_heterogeneity, contig_count, genome_size, and n50, e.g., \"completeness-5*contamination+log10(n50)\" (see genomescore.py). (optional)")
+parser.add_argument("-dlc", "--download_chunk", required=False, default="500", help="DOWNLOAD_CHUNK must be the number of genomes downloaded per datasets call. Must be a positive integer. (optional, default: 500)")
+parser.add_argument("-dlw", "--download_workers", required=False, default="4", help="DOWNLOAD_WORKERS must be the number of chunks of genomes downloaded concurrently (or rehydration workers with -dehydrated). Must be a positive integer. (optional, default: 4)")
+parser.add_argument("-dehydrated", "--dehydrated", required=False, action="store_true", help="If given, genomes are downloaded as dehydrated packages and rehydrated with datasets rehydrate. (optional)")
+parser.add_argument("-resume", "--resume", required=False, action="store_true", help="If given, an interrupted download of the same genomes is resumed instead of starting over. (optional)")
+parser.add_argument("-stream", "--stream", required=False, action="store_true", help="If given, ORFs are predicted for each genome as soon as it is downloaded and verified, and appended to the database, while the download is still running. The output files are the same. (optional)")
+parser.add_argument("-store", "--store", required=False, help="STORE must be the directory of a genome store shared between runs. Genomes (by the Genbank assembly version downloaded) and ORFs (also by Genetic Code) found there are not downloaded or predicted again, and new ones are added to it. It is created if it does not exist. (optional)")
+parser.add_argument("-storecap", "--store_cap", required=False, help="STORE_CAP must be the size cap of the genome store in GB. At the end of the run, the least recently used genomes and ORFs are removed until the store is smaller. Must be a positive number. Requires -store. (optional)")
+parser.add_argument("-comp", "--compression", required=False, default="gzip", choices=["gzip", "zstd"], help="COMPRESSION must be the compression of the ORFs archive: gzip (default, multi-threaded with pigz if installed) or zstd (requires zstd). (optional)")
+parser.add_argument("-refresh", "--refresh", required=False, help="REFRESH must be the run directory (_fetch) of a previous run with the same LEVEL, RESOLUTION, NUMBER, and MINIMUM, e.g., with the metadata of an older GTDB release. Only genomes that are new or have a new version are downloaded and predicted, genomes no longer picked are dropped, and the run directory is updated in place. (optional)")
 args=parser.parse_args()
 file_stem = (str(args.level)+'_'+str(args.resolution)+'_'+str(args.number)+'_min'+str(args.minimum))
 print('Henlo, am doggo v20241212. I fetch genomes nao. I speak info messages in hooman lingo.' + '\n')
@@ -98,25 +129,25 @@ else:
     print('Input file not found. Exiting.')
     sys.exit(1)
 
+#Load the metadata through its columnar cache (see gtdbmetadata.py). It is converted only the first time a metadata file is used, and pickgenomes.py reuses the same cache.
+metadata = load_metadata(args.input)
+
+#Validate the metadata in a single pass (parsed GTDB metadata, taxonomic level, domain of the taxonomic level). The validation record is passed on to pickgenomes.py, so it doesn't repeat the checks.
+validation = validate_metadata(metadata, args.level)
+
 #Check if input file is parsed GTDB metadata.
-with open(args.input, 'r') as parsedcheck:
-    for line in parsedcheck:
-        x = line.split('\t')
-        if x[18]=='t':
-            pass
-        else:
-            print('Input file does not contain parsed GTDB metadata. Exiting.')
-            sys.exit(1)
-print('Input file contains parsed GTDB metadata. Proceeding.')
+if validation['parsed']:
+    print('Input file contains parsed GTDB metadata. Proceeding.')
+else:
+    print('Input file does not contain parsed GTDB metadata. Exiting.')
+    sys.exit(1)
 
 # check for taxonomic level
-with open(args.input, 'r') as file:
-    content = file.read()
-    if str(args.level+';') in content:
-        print('Taxonomic level is valid. Proceeding.')
-    else:
-        print('Taxonomic level is invalid. Exiting.')
-        sys.exit(1)
+if validation['level_valid']:
+    print('Taxonomic level is valid. Proceeding.')
+else:
+    print('Taxonomic level is invalid. Exiting.')
+    sys.exit(1)
 
 # checkpoint for resolution and number of genomes both being "all"
 if args.resolution == 'all' and args.number != 'all':
@@ -170,6 +201,54 @@ else:
 args.number=str(args.number)
 args.minimum=str(args.minimum)
 
+# check for download chunk size and workers
+for download_option in (args.download_chunk, args.download_workers):
+    try:
+        download_option = int(download_option)
+    except:
+        print('Download chunk size and number of download workers must be positive integers. Exiting.')
+        sys.exit(1)
+    if download_option <= 0:
+        print('Download chunk size and number of download workers must be positive integers. Exiting.')
+        sys.exit(1)
+if args.dehydrated:
+    download_mode = 'dehydrated'
+else:
+    download_mode = 'direct'
+print('Downloads will be in chunks of ' + str(args.download_chunk) + ' genomes with ' + str(args.download_workers) + ' workers (' + download_mode + '). Proceeding.')
+
+# check for genome store and its size cap
+if args.store is not None:
+    try:
+        store = GenomeStore(args.store)
+    except OSError:
+        print('Genome store directory cannot be created. Exiting.')
+        sys.exit(1)
+    print('Genome store found. Proceeding.')
+if args.store_cap is not None:
+    if args.store is None:
+        print('Genome store size cap given without a genome store. Exiting.')
+        sys.exit(1)
+    store_cap = parse_size(args.store_cap)
+    if store_cap is None:
+        print('Genome store size cap must be a positive number. Exiting.')
+        sys.exit(1)
+    print('Genome store size cap is valid. Proceeding.')
+
+# check for the compression of the ORFs archive
+if args.compression == 'zstd' and shutil.which('zstd') is None:
+    print('External program zstd not installed. Download it from: https://anaconda.org/conda-forge/zstd. Exiting.')
+    sys.exit(1)
+print('ORFs archive will be ' + args.compression + '-compressed. Proceeding.')
+
+# check for the run directory to refresh
+if args.refresh is not None:
+    if all(os.path.isfile(os.path.join(args.refresh, file_stem + extension)) for extension in ('.assemblies', '.assembliesnames', '.database')):
+        print('Run directory to refresh found. Proceeding.')
+    else:
+        print('Run directory to refresh not found or not from a run with the same parameters. Exiting.')
+        sys.exit(1)
+
 # check for ignore_list argument
 if args.ignore is not None:
     #check_ignore = os.path.isfile(path+'/'+args.ignore)
@@ -183,67 +262,271 @@ else:
 
 #Remove any previous output files with the same name.
 print ('Removing files and directories with names identical to the output.')
-removal = str('rm -r ' + file_stem + '.assemblies ' + file_stem + '.assembliesnames '  + file_stem + '.belowmin ' + file_stem + '.belowminnames ' + file_stem + '.pickgenomeslog ' + file_stem + '.downloadcontigslog ' + file_stem + '.failed ' + file_stem + '.contigs2orfslog ' + file_stem + '.pyrodigallog ' + file_stem + '.createdblog ' + file_stem + '.database ' + file_stem + '_contigs.tar.gz ' + file_stem + '_orfs.tar.gz ' + file_stem + '_contigs/ ' + file_stem + '_orfs/ ' + file_stem + '_fetch/ 2> /dev/null')
+removal = str('rm -r ' + file_stem + '.assemblies ' + file_stem + '.assembliesnames '  + file_stem + '.belowmin ' + file_stem + '.belowminnames ' + file_stem + '.validation ' + file_stem + '.pickgenomeslog ' + file_stem + '.downloadcontigslog ' + file_stem + '.failed ' + file_stem + '.contigs2orfslog ' + file_stem + '.pyrodigallog ' + file_stem + '.createdblog ' + file_stem + '.database ' + file_stem + '.database.format ' + file_stem + '.database.index ' + file_stem + '_contigs.tar ' + file_stem + '_contigs.tar.gz ' + file_stem + '_orfs.tar.gz ' + file_stem + '_orfs.tar.gz.index ' + file_stem + '_orfs.tar.zst ' + file_stem + '_orfs/ ' + file_stem + '.downloaddone ' + file_stem + '.versions ' + file_stem + '.download ' + file_stem + '.costs ' + file_stem + '_stored/ 2> /dev/null')
 os.system(removal)
+#With -refresh, the run directory is updated instead of created.
+if args.refresh is None:
+    os.system('rm -r ' + file_stem + '_fetch/ 2> /dev/null')
+#Downloads are only started over if -resume is not given (see downloadcontigs.sh).
+if not args.resume:
+    os.system('rm -r ' + file_stem + '_contigs/ ' + file_stem + '.contigversions ' + file_stem + '.downloadstate ' + file_stem + '_download/ 2> /dev/null')
 
 # this is for defining the domain of the taxonomic level chosen by the user
-with open(args.input, 'r') as f:
-    for line in f:
-        x = line.split('\t')
-        z = x[19].split(';')
-        if args.level in x[19]:
-            if z[0] == 'd__Archaea':
-                domain = 'Archaea'
-                break
-            elif z[0] == 'd__Bacteria':
-                domain = 'Bacteria'
-                break
+domain = validation['domain']
+write_validation(validation, file_stem + '.validation')
+
+#The genome quality score is passed on to pickgenomes.py, which checks it.
+if args.score is not None:
+    score_option = ' --score ' + shlex.quote(args.score)
+else:
+    score_option = ''
 
 print ('Picking genomes.')
-if len(sys.argv) == 13:
-    pickgenomes = str('python -u ' + pickgenomes_py + ' ' + args.input + ' ' + args.level + ' ' + args.resolution + ' ' + args.number + ' ' + args.minimum + ' ' + args.ignore + ' >> ' + file_stem + '.pickgenomeslog')
+if args.ignore is not None:
+    pickgenomes = str('python -u ' + pickgenomes_py + ' ' + args.input + ' ' + args.level + ' ' + args.resolution + ' ' + args.number + ' ' + args.minimum + ' ' + args.ignore + ' --validation ' + file_stem + '.validation' + score_option + ' >> ' + file_stem + '.pickgenomeslog')
     #os.system(pickgenomes)
     if os.WEXITSTATUS(os.system(pickgenomes)) == 1:
         print('Error during pickgenomes.py script. Exiting.')
         sys.exit(1)
 else:
-    pickgenomes = str('python -u ' + pickgenomes_py + ' ' + args.input + ' ' + args.level + ' ' + args.resolution + ' ' + args.number + ' ' + args.minimum + ' >> ' + file_stem + '.pickgenomeslog')
+    pickgenomes = str('python -u ' + pickgenomes_py + ' ' + args.input + ' ' + args.level + ' ' + args.resolution + ' ' + args.number + ' ' + args.minimum + ' --validation ' + file_stem + '.validation' + score_option + ' >> ' + file_stem + '.pickgenomeslog')
     #os.system(pickgenomes)
     if os.WEXITSTATUS(os.system(pickgenomes)) == 1:
         print('Error during pickgenomes.py script. Exiting.')
         sys.exit(1)
 
-print ('Downloading contigs. Additional download rounds are retries for corrupted files.')
-download = str('bash ' + downloadcontigs_sh + ' ' + file_stem + '.assemblies >> ' + file_stem + '.downloadcontigslog')
-#os.system(download)
-if os.WEXITSTATUS(os.system(download)) in (1, 5):
-    print('Error or warning during downloadcontigs.sh script. Exiting.')
-    sys.exit(1)
+#The assembly versions of the picked genomes, taken from the metadata (the .versions file). They are compared by -refresh and used to look up genomes in the genome store.
+#The genomes are downloaded in their latest Genbank version, which can differ (e.g., for RefSeq accessions), so the versions of the contigs actually in the run are kept separately (the .contigversions file, see download_contigs). Those are the keys of the genome store (also used by predictorfs.py for the ORFs).
+with open(file_stem + '.assemblies', 'r') as assemblies:
+    picked = [line.strip() for line in assemblies if line.strip()]
+picked_set = set(picked)
+versions = dict()
+refseq = set() # assemblies with a RefSeq accession in the metadata, whose version is not a Genbank version
+genome_sizes = dict() # key = assembly, value = genome size in the metadata (for the cost record, see fetchcosts.py)
+genome_size_column = metadata.column('genome_size')
+for row, accession in enumerate(metadata.strings('accession')):
+    if versionless_genbank(accession) in picked_set:
+        versions[versionless_genbank(accession)] = versioned_genbank(accession)
+        if accession.startswith('RS_'):
+            refseq.add(versionless_genbank(accession))
+        genome_sizes[versionless_genbank(accession)] = 0 if math.isnan(genome_size_column[row]) else int(genome_size_column[row])
+with open(file_stem + '.versions', 'w') as versions_file:
+    for assembly in picked:
+        if assembly in versions:
+            versions_file.write(assembly + '\t' + versions[assembly] + '\n')
+to_download = picked
 
-print ('Predicting ORFs from contigs.')
-contigs2orfs = str('bash ' + contigs2orfs_sh + ' ' + file_stem + '.assemblies ' + file_stem + '_contigs/ ' + '.fna assemblies >> ' + file_stem + '.contigs2orfslog')
-#os.system(contigs2orfs)
-if os.WEXITSTATUS(os.system(contigs2orfs)) == 1:
-    print('Error during contigs2orfs.sh script. Exiting.')
-    sys.exit(1)
+#With -refresh, only the genomes that are not in the old run, or have a new version, are downloaded. Genomes no longer picked are dropped, and genomes with new names are renamed (see refreshrun.py).
+if args.refresh is not None:
+    print ('Comparing picked genomes with the run to refresh.')
+    old_versions = read_pairs(os.path.join(args.refresh, file_stem + '.versions'))
+    if old_versions is None:
+        print ('No .versions file in the run to refresh. Genomes are only compared by assembly.')
+    to_download, dropped, renamed = diff_runs(old_versions, read_pairs(os.path.join(args.refresh, file_stem + '.assembliesnames')), picked, versions, read_pairs(file_stem + '.assembliesnames'))
+    print (str(len(to_download)) + ' genome(s) new or with a new version, ' + str(len(dropped)) + ' genome(s) dropped, ' + str(len(renamed)) + ' genome(s) renamed.')
 
-print ('Creating local database.')
-createdb = str('bash ' + createdb_sh + ' ' + file_stem + '.assemblies '  + file_stem + '_orfs/ ' + '.faa >> ' + file_stem + '.createdblog')
-#os.system(createdb)
-if os.WEXITSTATUS(os.system(createdb)) == 1:
-    print('Error during createdb.sh script. Exiting.')
-    sys.exit(1)
+#With -store, the genomes already in the genome store are taken from there (into the _stored directory, so they are not removed when the download starts over) and only the rest are downloaded.
+if args.store is not None:
+    print ('Taking genomes from the genome store.')
+    os.environ['DOGGO_STORE'] = os.path.abspath(args.store)
+    os.makedirs(file_stem + '_stored', exist_ok=True)
+    #Genomes are looked up by their version in the metadata, or else by the newest version in the store, since downloads are always of the latest version (for Genbank accessions, only versions not older than the metadata's).
+    wanted = to_download
+    to_download = list()
+    stored_versions = dict() # key = assembly, value = version under which its contigs were found in the genome store
+    store_versions = store.contig_versions()
+    for assembly in wanted:
+        candidates = sorted(store_versions.get(assembly, []), reverse=True)
+        if assembly in versions and assembly not in refseq:
+            candidates = [version for version in candidates if version >= int(versions[assembly].rsplit('.', 1)[1])]
+        keys = [versions[assembly]] if assembly in versions else []
+        keys += [assembly + '.' + str(version) for version in candidates if assembly + '.' + str(version) not in keys]
+        for key in keys:
+            if store.get_contigs(key, os.path.join(file_stem + '_stored', assembly + '.fna.gz')):
+                stored_versions[assembly] = key
+                break
+        else:
+            to_download.append(assembly)
+    print (str(len(wanted) - len(to_download)) + ' genome(s) found in the genome store, ' + str(len(to_download)) + ' to download.')
 
-print ('Compressing contigs and ORFs directories.')
-compressdirs = str('tar -czf ' + file_stem + '_contigs.tar.gz ' + file_stem + '_contigs/ && rm -r ' + file_stem + '_contigs/ && tar -czf ' + file_stem + '_orfs.tar.gz ' + file_stem + '_orfs/ && rm -r ' + file_stem + '_orfs/ 2> /dev/null')
-if os.WEXITSTATUS(os.system(compressdirs)) == 1:
-    print('Error when compressing contigs and ORFs directories. Exiting.')
-    sys.exit(1)
+#With -store or -refresh, the genomes to download are in the .download file.
+if args.store is not None or args.refresh is not None:
+    with open(file_stem + '.download', 'w') as download_file:
+        for assembly in to_download:
+            download_file.write(assembly + '\n')
 
-print ('Creating run directory.')
-backup = str('mkdir ' + file_stem + '_fetch && mv -i ' + file_stem + '.assemblies ' + file_stem + '.assembliesnames ' + file_stem + '.belowmin ' + file_stem + '.belowminnames ' + file_stem + '.pickgenomeslog ' + file_stem + '.downloadcontigslog ' + file_stem + '.failed ' + file_stem + '.contigs2orfslog ' + file_stem + '.pyrodigallog ' + file_stem + '.createdblog ' + file_stem + '.database ' + file_stem + '_contigs.tar.gz ' + file_stem + '_orfs.tar.gz ' + file_stem + '_fetch/' )
-if os.WEXITSTATUS(os.system(backup)) == 1:
-    print('Error when creating run directory. Exiting.')
-    sys.exit(1)
+#Download the contigs and, with -store, add the new genomes to the genome store and put the stored ones in the contigs directory. Returns the exit status of downloadcontigs.sh.
+#downloadcontigs.sh records the versions of the genomes it downloads in the .contigversions file, and the versions of the stored genomes are added to it, before they are in the contigs directory (predictorfs.py reads it when a genome appears).
+def download_contigs():
+    if args.store is None and args.refresh is None:
+        download = str('bash ' + downloadcontigs_sh + ' ' + file_stem + '.assemblies ' + str(args.download_chunk) + ' ' + str(args.download_workers) + ' ' + download_mode + ' >> ' + file_stem + '.downloadcontigslog')
+        download_status = os.WEXITSTATUS(os.system(download))
+        open(file_stem + '.contigversions', 'a').close()
+        return download_status
+    if len(to_download) > 0:
+        #downloadcontigs.sh names its output after the stem of the file (everything until the first dot), so the .download file gives the same output files as the .assemblies file.
+        download = str('bash ' + downloadcontigs_sh + ' ' + file_stem + '.download ' + str(args.download_chunk) + ' ' + str(args.download_workers) + ' ' + download_mode + ' >> ' + file_stem + '.downloadcontigslog')
+        download_status = os.WEXITSTATUS(os.system(download))
+    else:
+        os.system('echo "Nothing to download." > ' + file_stem + '.downloadcontigslog && touch ' + file_stem + '.failed && mkdir -p ' + file_stem + '_contigs')
+        download_status = 0
+    contig_versions = read_pairs(file_stem + '.contigversions') or dict()
+    for assembly in to_download if args.store is not None else []:
+        if assembly in contig_versions and os.path.isfile(os.path.join(file_stem + '_contigs', assembly + '.fna.gz')):
+            store.add_contigs(contig_versions[assembly], os.path.join(file_stem + '_contigs', assembly + '.fna.gz'))
+    os.makedirs(file_stem + '_contigs', exist_ok=True)
+    with open(file_stem + '.contigversions', 'a') as contig_versions_file:
+        for assembly, version in stored_versions.items() if args.store is not None else []:
+            contig_versions_file.write(assembly + '\t' + version + '\n')
+    if args.store is not None:
+        for genome_file in os.listdir(file_stem + '_stored'):
+            os.replace(os.path.join(file_stem + '_stored', genome_file), os.path.join(file_stem + '_contigs', genome_file))
+        os.rmdir(file_stem + '_stored')
+    os.remove(file_stem + '.download')
+    return download_status
+
+#The cost record of the run (<stem>.costs, see fetchcosts.py) is used by pickgenomes_dry.py to estimate the costs of other runs. The contigs are measured right after the download, before they are archived.
+costs = dict()
+def measure_contigs(download_seconds):
+    downloaded = set(to_download)
+    genome_files = [genome_file for genome_file in os.listdir(file_stem + '_contigs') if genome_file.endswith('.fna.gz')]
+    costs['genomes'] = len(genome_files)
+    costs['bases'] = sum(genome_sizes.get(genome_file[:-len('.fna.gz')], 0) for genome_file in genome_files)
+    costs['contigs_bytes'] = sum(os.path.getsize(os.path.join(file_stem + '_contigs', genome_file)) for genome_file in genome_files)
+    downloaded_files = [genome_file for genome_file in genome_files if genome_file[:-len('.fna.gz')] in downloaded]
+    costs['downloaded_genomes'] = len(downloaded_files)
+    costs['downloaded_bases'] = sum(genome_sizes.get(genome_file[:-len('.fna.gz')], 0) for genome_file in downloaded_files)
+    costs['downloaded_bytes'] = sum(os.path.getsize(os.path.join(file_stem + '_contigs', genome_file)) for genome_file in downloaded_files)
+    costs['download_seconds'] = round(download_seconds, 2)
+
+#The contigs and ORFs directories are archived in the background (see archivedirs.py), each one as soon as no later step reads it. With -refresh, they are merged into the archives of the old run instead.
+archiver = Archiver(args.compression, os.cpu_count() or 1, 2)
+orfs_archive = archive_name(file_stem + '_orfs', args.compression)
+#gzip ORFs archives are indexed, so the ORFs of a few genomes can be taken from them without decompressing the rest (see orfarchive.py).
+if args.compression == 'gzip':
+    orfs_archive_files = orfs_archive + ' ' + orfs_archive + '.index'
+else:
+    orfs_archive_files = orfs_archive
+
+#With -stream, predictorfs.py follows the download: it predicts the ORFs of each genome once it is in the contigs directory (i.e., downloaded and verified) and appends them to the database in the order createdb.sh uses.
+#The download writes the .downloaddone file when it ends, so predictorfs.py knows that no more genomes are coming.
+if args.stream:
+    print ('Downloading contigs, and predicting ORFs and creating local database while genomes arrive. Additional download rounds are retries for corrupted files.')
+    os.system('echo "ORFs predicted by predictorfs.py while downloading (-stream)." > ' + file_stem + '.contigs2orfslog')
+    streamorfs = subprocess.Popen('exec python -u ' + predictorfs_py + ' ' + file_stem + '.assembliesnames ' + file_stem + '_contigs/ .fna.gz assemblies ' + file_stem + '_orfs ' + file_stem + '.pyrodigallog ' + str(os.cpu_count() or 1) + ' --follow ' + file_stem + '.downloaddone --database ' + file_stem + '.database >> ' + file_stem + '.contigs2orfslog', shell=True)
+    download_start = time.time()
+    download_status = download_contigs()
+    open(file_stem + '.downloaddone', 'w').close()
+    if download_status in (1, 5):
+        streamorfs.terminate()
+        streamorfs.wait()
+        os.remove(file_stem + '.downloaddone')
+        print('Error or warning during downloadcontigs.sh script. Exiting.')
+        sys.exit(1)
+    measure_contigs(time.time() - download_start)
+    streamorfs_status = streamorfs.wait()
+    os.remove(file_stem + '.downloaddone')
+    if streamorfs_status != 0:
+        print('Error during predictorfs.py script. Exiting.')
+        sys.exit(1)
+    if (not os.path.isfile(file_stem + '.database') or os.path.getsize(file_stem + '.database') == 0) and args.refresh is None:
+        print('No ORFs predicted. Exiting.')
+        sys.exit(1)
+    os.system('echo "Local database created by predictorfs.py while downloading (-stream)." > ' + file_stem + '.createdblog')
+    #createdb.sh normalizes the headers of the database (see dbformat.py) and writes its offset index (see dbindex.py), so it is done here for streamed databases. With -refresh, it is done for the merged database instead.
+    if args.refresh is None:
+        print ('Normalizing FASTA headers of and indexing local database.')
+        normalize_database(file_stem + '.database')
+        write_index(file_stem + '.database')
+else:
+    print ('Downloading contigs. Additional download rounds are retries for corrupted files.')
+    download_start = time.time()
+    if download_contigs() in (1, 5):
+        print('Error or warning during downloadcontigs.sh script. Exiting.')
+        sys.exit(1)
+    measure_contigs(time.time() - download_start)
+
+    #With -refresh, there may be no new genomes at all.
+    if args.refresh is not None and not any(genome_file.endswith('.fna.gz') for genome_file in os.listdir(file_stem + '_contigs')):
+        print ('No new genomes. Skipping ORF prediction.')
+        os.system('echo "No new genomes." > ' + file_stem + '.contigs2orfslog && echo "No new genomes." > ' + file_stem + '.createdblog')
+    else:
+        print ('Predicting ORFs from contigs.')
+        contigs2orfs = str('bash ' + contigs2orfs_sh + ' ' + file_stem + '.assemblies ' + file_stem + '_contigs/ ' + '.fna.gz assemblies >> ' + file_stem + '.contigs2orfslog')
+        #os.system(contigs2orfs)
+        if os.WEXITSTATUS(os.system(contigs2orfs)) == 1:
+            print('Error during contigs2orfs.sh script. Exiting.')
+            sys.exit(1)
+
+        #The contig files are already gzip-compressed, so they are only packaged, while the database is created.
+        if args.refresh is None:
+            print ('Archiving contigs directory in the background.')
+            archiver.archive(file_stem + '_contigs', 'none')
+
+        print ('Creating local database.')
+        createdb = str('bash ' + createdb_sh + ' ' + file_stem + '.assemblies '  + file_stem + '_orfs/ ' + '.faa >> ' + file_stem + '.createdblog')
+        #os.system(createdb)
+        if os.WEXITSTATUS(os.system(createdb)) == 1:
+            print('Error during createdb.sh script. Exiting.')
+            sys.exit(1)
+
+costs['orfs_bytes'] = directory_bytes(file_stem + '_orfs')
+costs['orf_cpu_seconds'], costs['predicted_genomes'], costs['predicted_bases'] = read_prediction_summary(file_stem + '.contigs2orfslog')
+write_costs(costs, file_stem + '.costs')
+
+if args.refresh is None:
+    print ('Compressing contigs and ORFs directories.')
+    archiver.archive(file_stem + '_contigs', 'none')
+    archiver.archive(file_stem + '_orfs', indexed=True)
+    archives, failed = archiver.wait()
+    archiver.shutdown()
+    if len(failed) > 0:
+        print('Error when compressing contigs and ORFs directories. Exiting.')
+        sys.exit(1)
+
+    print ('Creating run directory.')
+    backup = str('mkdir ' + file_stem + '_fetch && mv -i ' + file_stem + '.assemblies ' + file_stem + '.assembliesnames ' + file_stem + '.belowmin ' + file_stem + '.belowminnames ' + file_stem + '.validation ' + file_stem + '.versions ' + file_stem + '.contigversions ' + file_stem + '.pickgenomeslog ' + file_stem + '.downloadcontigslog ' + file_stem + '.failed ' + file_stem + '.contigs2orfslog ' + file_stem + '.pyrodigallog ' + file_stem + '.createdblog ' + file_stem + '.costs ' + file_stem + '.database ' + file_stem + '.database.format ' + file_stem + '.database.index ' + file_stem + '_contigs.tar ' + orfs_archive_files + ' ' + file_stem + '_fetch/' )
+    if os.WEXITSTATUS(os.system(backup)) == 1:
+        print('Error when creating run directory. Exiting.')
+        sys.exit(1)
+else:
+    #The new genomes are merged into the database, pyrodigal log, and archives of the old run, in the same order as for a new run. The other files are replaced by those of this run.
+    print ('Updating run directory.')
+    old_run = os.path.join(args.refresh, file_stem)
+    merge_database(old_run + '.database', file_stem + '.database', file_stem + '.database.refresh', dropped, renamed)
+    merge_pyrodigallog(old_run + '.pyrodigallog', file_stem + '.pyrodigallog', file_stem + '.pyrodigallog.refresh', dropped)
+    #Runs made before the contigs were kept compressed have a compressed contigs archive (_contigs.tar.gz) instead, and the ORFs archive of the old run can have either compression. They are replaced by archives named as for a new run.
+    old_archives = (find_archive(old_run + '_contigs'), find_archive(old_run + '_orfs'))
+    merge_archive(old_archives[0], file_stem + '_contigs', file_stem + '_contigs', file_stem + '_contigs.tar.refresh', dropped, renamed, 'none')
+    if args.compression == 'gzip':
+        merge_orf_archive(old_archives[1], file_stem + '_orfs', file_stem + '_orfs', orfs_archive + '.refresh', dropped, renamed, os.cpu_count() or 1)
+        shutil.move(orfs_archive + '.refresh.index', old_run + orfs_archive[len(file_stem):] + '.index')
+    else:
+        merge_archive(old_archives[1], file_stem + '_orfs', file_stem + '_orfs', orfs_archive + '.refresh', dropped, renamed, args.compression, os.cpu_count() or 1)
+    for extension in ('.database', '.pyrodigallog', '_contigs.tar', orfs_archive[len(file_stem):]):
+        shutil.move(file_stem + extension + '.refresh', old_run + extension)
+    #The headers of old runs made before databases were normalized are normalized as well.
+    normalize_database(old_run + '.database')
+    write_index(old_run + '.database')
+    for old_archive in old_archives:
+        if old_archive is not None and os.path.basename(old_archive) not in (file_stem + '_contigs.tar', orfs_archive):
+            os.remove(old_archive)
+            if os.path.isfile(old_archive + '.index'):
+                os.remove(old_archive + '.index')
+    #The versions of the contigs of the old run are kept for the genomes that were not downloaded again (runs made before they were recorded have none).
+    contig_versions = {assembly: version for assembly, version in (read_pairs(old_run + '.contigversions') or dict()).items() if assembly not in dropped}
+    contig_versions.update(read_pairs(file_stem + '.contigversions') or dict())
+    with open(old_run + '.contigversions', 'w') as contig_versions_file:
+        for assembly, version in contig_versions.items():
+            contig_versions_file.write(assembly + '\t' + version + '\n')
+    os.remove(file_stem + '.contigversions')
+    for extension in ('.assemblies', '.assembliesnames', '.belowmin', '.belowminnames', '.validation', '.versions', '.pickgenomeslog', '.downloadcontigslog', '.failed', '.contigs2orfslog', '.createdblog', '.costs'):
+        shutil.move(file_stem + extension, old_run + extension)
+    os.system('rm -r ' + file_stem + '.database ' + file_stem + '.database.format ' + file_stem + '.database.index ' + file_stem + '.pyrodigallog ' + file_stem + '_contigs/ ' + file_stem + '_orfs/ 2> /dev/null')
+
+if args.store_cap is not None:
+    print ('Reducing genome store to its size cap.')
+    removed, store_size = store.evict(store_cap)
+    print (str(removed) + ' least recently used genome(s) and ORF set(s) removed from the genome store (' + str(round(store_size / 1e9, 3)) + ' GB).')
 
 print('Bork bork! I finish. Gib chimken pls?')
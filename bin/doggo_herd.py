@@ -17,8 +17,18 @@ import argparse
 import os
 import random
 import re
+import shutil
 import string
 import sys
+import time
+
+from archivedirs import Archiver, archive_name, find_archive
+from createrecords import checksum_genomes, read_checksums, write_checksums
+from dbformat import normalize_database
+from dbindex import write_index
+from genomestore import GenomeStore, parse_size
+from herdupdate import append_blocks, initial_state, next_counter, read_state, scan, write_state
+from refreshrun import database_blocks, log_blocks, merge_archive, merge_orf_archive
 
 #Check if required external programs are installed.
 import subprocess
@@ -31,9 +41,9 @@ for extprg,link in externalprograms.items():
         sys.exit(1)
 
 try:
-    createrecords_sh = (subprocess.check_output("which createrecords.sh", shell=True, universal_newlines=True).strip())
+    createrecords_py = (subprocess.check_output("which createrecords.py", shell=True, universal_newlines=True).strip())
 except subprocess.CalledProcessError:
-    print('Script createrecords.sh not found in PATH. Exiting.')
+    print('Script createrecords.py not found in PATH. Exiting.')
     sys.exit(1)
 try:
     contigs2orfs_sh = (subprocess.check_output("which contigs2orfs.sh", shell=True, universal_newlines=True).strip())
@@ -75,9 +85,14 @@ __        ___                   ____         ____  ____      ___
 
 parser = argparse.ArgumentParser(description="Henlo, am doggo v20241212. Need halp for local genomes?")
 parser.add_argument("-loc", "--location", required=True, help='LOCATION must be a directory containing all genome files. The trailing slash will be added, if not included. (required)')
-parser.add_argument("-ext", "--extension", required=True, help='EXTENSION must be the file extension of the genome files. The leading dot will be added, if not included. (required)')
+parser.add_argument("-ext", "--extension", required=True, help='EXTENSION must be the file extension of the genome files. The leading dot will be added, if not included. Genome files can be gzip-compressed (EXTENSION.gz, used if there are no files with EXTENSION). (required)')
 parser.add_argument("-prj", "--project", required=False, help='PROJECT must be a project code consisting of alphanumeric characters and/or underscores only. This code will be used as the filename stem of the generated files. If not provided, it will default to five random alphanumeric characters. (optional)')
 parser.add_argument("-code25", "--code25", action='store_true', help="CODE25 must be provided if the local genomes are SR1 or Gracilibacteria (c__JAEDAM01). All ORF predictions will use Genetic Code 25. (optional)")
+parser.add_argument("-comp", "--compression", required=False, default="gzip", choices=["gzip", "zstd"], help="COMPRESSION must be the compression of the ORFs archive: gzip (default, multi-threaded with pigz if installed) or zstd (requires zstd). (optional)")
+parser.add_argument("-store", "--store", required=False, help="STORE must be the directory of a genome store shared between runs (see doggo_fetch -store). The ORFs of genome files with the same contigs, Genetic Code, and Pyrodigal version as in an earlier run (of any project) are taken from there instead of predicted again, and new ones are added to it. It is created if it does not exist. (optional)")
+parser.add_argument("-storecap", "--store_cap", required=False, help="STORE_CAP must be the size cap of the genome store in GB. At the end of the run (and of every update with WATCH), the least recently used genomes and ORFs are removed until the store is smaller. Must be a positive number. Requires -store. (optional)")
+parser.add_argument("-upd", "--update", action='store_true', help="UPDATE must be provided to update the run directory of a previous run with the same PROJECT (<project>_herd) instead of creating a new one. Only genome files that are new or whose contents changed since are processed, and their records and ORFs are appended to the run directory. If there is no run directory, a new run is made. (optional)")
+parser.add_argument("-watch", "--watch", required=False, type=int, help="WATCH must be a number of seconds. After creating or updating the run directory, the genome directory is checked every WATCH seconds and the run directory is updated with any new or changed genome files, until the script is interrupted (Ctrl+C). Implies UPDATE. (optional)")
 args=parser.parse_args()
 
 print('Henlo, am doggo v20241212. I prepare local genomes nao. I speak info messages in hooman lingo.' + '\n')
@@ -95,12 +110,54 @@ if args.extension.startswith('.') == False:
     args.extension = str('.' + args.extension)
 
 # checkpoint if files with given extension exist
+#Genome files can also be gzip-compressed (e.g., .fna.gz for -ext fna). They are decompressed on the fly during ORF prediction.
 for fname in os.listdir(args.location):
     if fname.endswith(args.extension):
         print ('File(s) with the given extension found in the genome directory. Proceeding.')
         break
 else:
-    print('No files with the given extension found in the genome directory. Exiting.')
+    for fname in os.listdir(args.location):
+        if fname.endswith(args.extension + '.gz'):
+            args.extension = args.extension + '.gz'
+            print ('Gzip-compressed file(s) with the given extension found in the genome directory. Proceeding.')
+            break
+    else:
+        print('No files with the given extension found in the genome directory. Exiting.')
+        sys.exit(1)
+
+# checkpoint for the compression of the ORFs archive
+if args.compression == 'zstd' and shutil.which('zstd') is None:
+    print('External program zstd not installed. Download it from: https://anaconda.org/conda-forge/zstd. Exiting.')
+    sys.exit(1)
+
+# check for genome store and its size cap
+#With a genome store, predictorfs.py takes the ORFs of genomes predicted before from there (see NOTE 4 of predictorfs.py).
+if args.store is not None:
+    try:
+        store = GenomeStore(args.store)
+    except OSError:
+        print('Genome store directory cannot be created. Exiting.')
+        sys.exit(1)
+    os.environ['DOGGO_STORE'] = os.path.abspath(args.store)
+    print('Genome store found. Proceeding.')
+if args.store_cap is not None:
+    if args.store is None:
+        print('Genome store size cap given without a genome store. Exiting.')
+        sys.exit(1)
+    store_cap = parse_size(args.store_cap)
+    if store_cap is None:
+        print('Genome store size cap must be a positive number. Exiting.')
+        sys.exit(1)
+    print('Genome store size cap is valid. Proceeding.')
+
+# checkpoint for the update and watch options
+if args.watch is not None:
+    if args.watch <= 0:
+        print('Watch interval must be a positive number of seconds. Exiting.')
+        sys.exit(1)
+    args.update = True
+if args.update and args.project is None:
+    print('A project code is required to update a run directory. Exiting.')
     sys.exit(1)
 
 # checkpoint project name
@@ -113,45 +170,199 @@ else:
     print('Project code is invalid. Exiting.')
     sys.exit(1)
 
-#Remove any previous output files with the same name.
-print ('Removing files and directories with names identical to the output.')
-removal = ('rm -r ' + args.project + '.assemblies ' + args.project + '.assembliesnames ' + args.project + '.createrecordslog ' + args.project + '.contigs2orfslog ' + args.project + '.pyrodigallog ' + args.project + '.createdblog ' + args.project + '.database ' + args.project + '_orfs.tar.gz' + args.project + '_orfs/ ' + args.project + '_herd/ 2> /dev/null')
-os.system(removal)
+run_dir = args.project + '_herd/'
+state_file = run_dir + args.project + '.herdstate'
 
-print ('Creating records for local genomes.')
-createrecords = str('bash ' + createrecords_sh + ' ' + args.location + ' ' + args.extension + ' ' + args.project + ' >> '  + args.project + '.createrecordslog')
-#os.system(createrecords)
-if os.WEXITSTATUS(os.system(createrecords)) == 1:
-    print('Error during createrecords.sh script. Exiting.')
-    sys.exit(1)
+#Update the run directory with the genome files that are new or changed since the last run or update (see herdupdate.py). Their ORFs are predicted in a separate set of files (<project>_update), which are then appended to those of the run directory.
+#With <settled> (when watching), only genome files that did not change since the previous check are taken, so files still being copied are left for the next check. Returns True if the run directory was updated.
+def update_run(settled=None):
+    state = read_state(state_file)
+    new, changed = scan(args.location, args.extension, state, settled)
+    if len(new) == 0 and len(changed) == 0:
+        write_state(state, state_file)
+        print ('No new or changed genome files found.')
+        return False
+    print (str(len(new)) + ' new and ' + str(len(changed)) + ' changed genome file(s) found. Updating run directory.')
+    run_stem = run_dir + args.project
+
+    #New genome files that duplicate a genome of the run or an earlier new one (identical files or sequences, see createrecords.py) get no records, as in a new run.
+    checksums = read_checksums(run_stem + '.checksums')
+    changed_files = set(genome_file for genome_file, record in changed)
+    known = dict()
+    for genome_file, record in state.items():
+        if record['assembly'] != '-' and genome_file in checksums and genome_file not in changed_files:
+            known.setdefault(checksums[genome_file][0], ('identical file', record['assembly'], genome_file))
+            known.setdefault(checksums[genome_file][1], ('identical sequences', record['assembly'], genome_file))
+    checksums.update(zip([genome_file for genome_file, record in changed + new], checksum_genomes([os.path.join(args.location, genome_file) for genome_file, record in changed + new], os.cpu_count() or 1)))
+    with open(run_stem + '.assemblies', 'r') as f:
+        counter = next_counter([line.strip() for line in f], args.project)
+    duplicates = list()
+    for genome_file, record in new:
+        duplicate = known.get(checksums[genome_file][0]) or known.get(checksums[genome_file][1])
+        if duplicate is not None:
+            record['assembly'] = '-'
+            duplicates.append((genome_file, duplicate))
+            continue
+        record['assembly'] = args.project + str(counter)
+        counter += 1
+        known.setdefault(checksums[genome_file][0], ('identical file', record['assembly'], genome_file))
+        known.setdefault(checksums[genome_file][1], ('identical sequences', record['assembly'], genome_file))
+    if len(duplicates) > 0:
+        print (str(len(duplicates)) + ' duplicate genome file(s) left out (see the .duplicates file).')
+        with open(run_stem + '.duplicates', 'a') as f:
+            for genome_file, (kind, assembly, original) in duplicates:
+                f.write(genome_file + '\t' + assembly + '\t' + original + '\t' + kind + '\n')
+        for genome_file, record in new:
+            if record['assembly'] == '-':
+                state[genome_file] = record
+        new = [(genome_file, record) for genome_file, record in new if record['assembly'] != '-']
+    write_checksums(checksums, run_stem + '.checksums')
+    if len(new) == 0 and len(changed) == 0:
+        write_state(state, state_file)
+        return False
+
+    update_stem = args.project + '_update'
+    update_removal = ('rm -r ' + update_stem + '.assemblies ' + update_stem + '.assembliesnames ' + update_stem + '.contigs2orfslog ' + update_stem + '.pyrodigallog ' + update_stem + '.createdblog ' + update_stem + '.database ' + update_stem + '.database.format ' + update_stem + '.database.index ' + update_stem + '.database.update ' + update_stem + '.pyrodigallog.update ' + update_stem + '_orfs.update ' + update_stem + '_orfs.update.index ' + update_stem + '_genomes/ ' + update_stem + '_orfs/ 2> /dev/null')
+    os.system(update_removal)
+
+    #New genomes get the dummy assemblies following the last one of the run, and changed genomes keep theirs. The genome files are linked into a directory of their own, so only they are predicted.
+    os.mkdir(update_stem + '_genomes')
+    with open(update_stem + '.assemblies', 'w') as assemblies, open(update_stem + '.assembliesnames', 'w') as assembliesnames:
+        for genome_file, record in changed + new:
+            assemblies.write(record['assembly'] + '\n')
+            assembliesnames.write(record['assembly'] + '\t' + genome_file[:-len(args.extension)] + '\n')
+            os.symlink(os.path.abspath(os.path.join(args.location, genome_file)), os.path.join(update_stem + '_genomes', genome_file))
+
+    print ('Predicting ORFs from contigs.')
+    contigs2orfs = str('bash ' + contigs2orfs_sh + ' ' + update_stem + '.assemblies ' + update_stem + '_genomes/ ' + args.extension + ' names' + (' code25' if args.code25 else '') + ' >> ' + update_stem + '.contigs2orfslog')
+    if os.WEXITSTATUS(os.system(contigs2orfs)) == 1:
+        print('Error during contigs2orfs.sh script. Exiting.')
+        sys.exit(1)
+
+    print ('Creating local database.')
+    createdb = str('bash ' + createdb_sh + ' ' + update_stem + '.assemblies '  + update_stem + '_orfs/ ' + '.faa >> ' + update_stem + '.createdblog')
+    if os.WEXITSTATUS(os.system(createdb)) == 1:
+        print('Error during createdb.sh script. Exiting.')
+        sys.exit(1)
+
+    #The records of changed genomes are dropped from the database (by dummy assembly), and from the pyrodigal log and ORFs archive (by genome name), and the new records are appended.
+    print ('Appending to run directory.')
+    dropped_assemblies = set(record['assembly'] for genome_file, record in changed)
+    dropped_names = set(genome_file[:-len(args.extension)] for genome_file, record in changed)
+    append_blocks(database_blocks(run_stem + '.database'), database_blocks(update_stem + '.database'), update_stem + '.database.update', dropped_assemblies)
+    append_blocks(log_blocks(run_stem + '.pyrodigallog') if os.path.isfile(run_stem + '.pyrodigallog') else [], log_blocks(update_stem + '.pyrodigallog'), update_stem + '.pyrodigallog.update', dropped_names)
+    old_archive = find_archive(run_stem + '_orfs')
+    orfs_archive = archive_name(args.project + '_orfs', args.compression)
+    if args.compression == 'gzip':
+        merge_orf_archive(old_archive, update_stem + '_orfs', args.project + '_orfs', update_stem + '_orfs.update', dropped_names, dict(), os.cpu_count() or 1)
+        shutil.move(update_stem + '_orfs.update.index', run_dir + orfs_archive + '.index')
+    else:
+        merge_archive(old_archive, update_stem + '_orfs', args.project + '_orfs', update_stem + '_orfs.update', dropped_names, dict(), args.compression, os.cpu_count() or 1)
+    shutil.move(update_stem + '.database.update', run_stem + '.database')
+    #The headers of old runs made before databases were normalized are normalized as well.
+    normalize_database(run_stem + '.database')
+    write_index(run_stem + '.database')
+    shutil.move(update_stem + '.pyrodigallog.update', run_stem + '.pyrodigallog')
+    shutil.move(update_stem + '_orfs.update', run_dir + orfs_archive)
+    #An ORFs archive with the other compression is replaced by the one written now.
+    if old_archive is not None and os.path.basename(old_archive) != orfs_archive:
+        os.remove(old_archive)
+        if os.path.isfile(old_archive + '.index'):
+            os.remove(old_archive + '.index')
+    with open(run_stem + '.assemblies', 'a') as assemblies, open(run_stem + '.assembliesnames', 'a') as assembliesnames:
+        for genome_file, record in new:
+            assemblies.write(record['assembly'] + '\n')
+            assembliesnames.write(record['assembly'] + '\t' + genome_file[:-len(args.extension)] + '\n')
+    with open(run_stem + '.createrecordslog', 'a') as log:
+        log.write('Update: ' + str(len(new)) + ' new genome file(s) (' + ', '.join(record['assembly'] + ' ' + genome_file for genome_file, record in new) + ') and ' + str(len(changed)) + ' changed genome file(s) (' + ', '.join(record['assembly'] + ' ' + genome_file for genome_file, record in changed) + ').\n')
+    for extension in ('.contigs2orfslog', '.createdblog'):
+        with open(update_stem + extension, 'r') as update_log, open(run_stem + extension, 'a') as log:
+            shutil.copyfileobj(update_log, log)
+    for genome_file, record in changed + new:
+        state[genome_file] = record
+    write_state(state, state_file)
+    os.system(update_removal)
+    return True
+
+def reduce_store():
+    print ('Reducing genome store to its size cap.')
+    removed, store_size = store.evict(store_cap)
+    print (str(removed) + ' least recently used genome(s) and ORF set(s) removed from the genome store (' + str(round(store_size / 1e9, 3)) + ' GB).')
 
-print ('Predicting ORFs from contigs.')
-if args.code25:
-    contigs2orfs = str('bash ' + contigs2orfs_sh + ' ' + args.project + '.assemblies ' + args.location + ' ' + args.extension + ' names code25 >> '  + args.project + '.contigs2orfslog')
+#With -update, an existing run directory is updated instead of created anew.
+if args.update and os.path.isdir(run_dir):
+    print ('Run directory found. Only new or changed genome files will be processed.')
+    if not os.path.isfile(state_file):
+        print ('No .herdstate file in the run directory (run made before -update). The genome files of the run are assumed to be unchanged.')
+        write_state(initial_state(args.location, args.extension, run_dir + args.project + '.assembliesnames', read_checksums(run_dir + args.project + '.checksums')), state_file)
+    update_run()
 else:
-    contigs2orfs = str('bash ' + contigs2orfs_sh + ' ' + args.project + '.assemblies ' + args.location + ' ' + args.extension + ' names >> '  + args.project + '.contigs2orfslog')
-#os.system(contigs2orfs)
-if os.WEXITSTATUS(os.system(contigs2orfs)) == 1:
-    print('Error during contigs2orfs.sh script. Exiting.')
-    sys.exit(1)
+    #Remove any previous output files with the same name.
+    print ('Removing files and directories with names identical to the output.')
+    removal = ('rm -r ' + args.project + '.assemblies ' + args.project + '.assembliesnames ' + args.project + '.createrecordslog ' + args.project + '.contigs2orfslog ' + args.project + '.pyrodigallog ' + args.project + '.createdblog ' + args.project + '.duplicates ' + args.project + '.checksums ' + args.project + '.herdstate ' + args.project + '.database ' + args.project + '.database.format ' + args.project + '.database.index ' + args.project + '_orfs.tar.gz ' + args.project + '_orfs.tar.gz.index ' + args.project + '_orfs.tar.zst ' + args.project + '_orfs/ ' + args.project + '_herd/ 2> /dev/null')
+    os.system(removal)
 
-print ('Creating local database.')
-createdb = str('bash ' + createdb_sh + ' ' + args.project + '.assemblies '  + args.project + '_orfs/ ' + '.faa >> ' + args.project + '.createdblog')
-#os.system(createdb)
-if os.WEXITSTATUS(os.system(createdb)) == 1:
-    print('Error during createdb.sh script. Exiting.')
-    sys.exit(1)
+    #Genome files are checksummed with all cores, and duplicate genomes (identical files or sequences) get no records, so their ORFs are not predicted (see createrecords.py and the .duplicates file).
+    print ('Creating records for local genomes.')
+    createrecords = str('python ' + createrecords_py + ' ' + args.location + ' ' + args.extension + ' ' + args.project + ' >> '  + args.project + '.createrecordslog')
+    #os.system(createrecords)
+    if os.WEXITSTATUS(os.system(createrecords)) == 1:
+        print('Error during createrecords.py script. Exiting.')
+        sys.exit(1)
+    with open(args.project + '.duplicates', 'r') as f:
+        duplicates = sum(1 for line in f)
+    if duplicates > 0:
+        print (str(duplicates) + ' duplicate genome file(s) left out (see the .duplicates file).')
 
-print ('Compressing ORFs directory.')
-compressdirs = str('tar -czf ' + args.project + '_orfs.tar.gz ' + args.project + '_orfs/ && rm -r ' + args.project + '_orfs/ 2> /dev/null')
-if os.WEXITSTATUS(os.system(compressdirs)) == 1:
-    print('Error when compressing contigs and ORFs directories. Exiting.')
-    sys.exit(1)
+    print ('Predicting ORFs from contigs.')
+    if args.code25:
+        contigs2orfs = str('bash ' + contigs2orfs_sh + ' ' + args.project + '.assemblies ' + args.location + ' ' + args.extension + ' names code25 >> '  + args.project + '.contigs2orfslog')
+    else:
+        contigs2orfs = str('bash ' + contigs2orfs_sh + ' ' + args.project + '.assemblies ' + args.location + ' ' + args.extension + ' names >> '  + args.project + '.contigs2orfslog')
+    #os.system(contigs2orfs)
+    if os.WEXITSTATUS(os.system(contigs2orfs)) == 1:
+        print('Error during contigs2orfs.sh script. Exiting.')
+        sys.exit(1)
 
-print ('Creating run directory.')
-backup = str('mkdir ' + args.project + '_herd && mv -i ' + args.project + '.assemblies ' + args.project + '.assembliesnames ' + args.project + '.createrecordslog ' + args.project + '.contigs2orfslog ' + args.project + '.pyrodigallog ' + args.project + '.createdblog ' + args.project + '.database ' + args.project + '_orfs.tar.gz ' + args.project + '_herd/')
-if os.WEXITSTATUS(os.system(backup)) == 1:
-    print('Error when creating run directory. Exiting.')
-    sys.exit(1)
+    print ('Creating local database.')
+    createdb = str('bash ' + createdb_sh + ' ' + args.project + '.assemblies '  + args.project + '_orfs/ ' + '.faa >> ' + args.project + '.createdblog')
+    #os.system(createdb)
+    if os.WEXITSTATUS(os.system(createdb)) == 1:
+        print('Error during createdb.sh script. Exiting.')
+        sys.exit(1)
+
+    #The ORFs directory is compressed with all cores (see archivedirs.py). gzip archives are indexed, so the ORFs of a few genomes can be taken from them without decompressing the rest (see orfarchive.py).
+    print ('Compressing ORFs directory.')
+    archiver = Archiver(args.compression, os.cpu_count() or 1, 1)
+    archiver.archive(args.project + '_orfs', indexed=True)
+    archives, failed = archiver.wait()
+    archiver.shutdown()
+    if len(failed) > 0:
+        print('Error when compressing ORFs directory. Exiting.')
+        sys.exit(1)
+
+    #The checksums of the genome files are kept in the .herdstate file, so later runs with -update only process new or changed files.
+    write_state(initial_state(args.location, args.extension, args.project + '.assembliesnames', read_checksums(args.project + '.checksums')), args.project + '.herdstate')
+
+    print ('Creating run directory.')
+    backup = str('mkdir ' + args.project + '_herd && mv -i ' + args.project + '.assemblies ' + args.project + '.assembliesnames ' + args.project + '.createrecordslog ' + args.project + '.contigs2orfslog ' + args.project + '.pyrodigallog ' + args.project + '.createdblog ' + args.project + '.duplicates ' + args.project + '.checksums ' + args.project + '.herdstate ' + args.project + '.database ' + args.project + '.database.format ' + args.project + '.database.index ' + ' '.join(archive + ' ' + archive + '.index' if os.path.isfile(archive + '.index') else archive for archive in archives) + ' ' + args.project + '_herd/')
+    if os.WEXITSTATUS(os.system(backup)) == 1:
+        print('Error when creating run directory. Exiting.')
+        sys.exit(1)
+
+if args.store_cap is not None:
+    reduce_store()
+
+#With -watch, the genome directory is checked for new or changed genome files until the script is interrupted.
+if args.watch is not None:
+    print ('Watching the genome directory every ' + str(args.watch) + ' seconds. Press Ctrl+C to stop.')
+    settled = dict()
+    try:
+        while True:
+            time.sleep(args.watch)
+            if update_run(settled) and args.store_cap is not None:
+                reduce_store()
+    except KeyboardInterrupt:
+        print ('Stopped watching the genome directory.')
 
 print('Bork bork! I finish. Gib chimken pls?')
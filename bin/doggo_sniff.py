@@ -13,17 +13,21 @@
 #Dependencies
 #1) Biopython (https://biopython.org/wiki/Download or https://anaconda.org/conda-forge/biopython)
 #2) HMMER (https://anaconda.org/bioconda/hmmer)
-#3) seqtk (https://anaconda.org/bioconda/seqtk)
-#4) MAFFT (https://anaconda.org/bioconda/mafft)
-#5) BMGE (https://anaconda.org/bioconda/bmge)
+#3) MAFFT (https://anaconda.org/bioconda/mafft)
+#4) BMGE (https://anaconda.org/bioconda/bmge)
 
 import argparse
 import os
 import random
 import re
+import shlex
+import shutil
 import string
 import sys
 
+from archivedirs import Archiver
+from dbformat import database_format, normalized_format
+
 #Check if required non-standard libraries are installed.
 import importlib.util
 nonstandardlibraries = {"Bio" : "https://biopython.org/wiki/Download or https://anaconda.org/conda-forge/biopython"}
@@ -37,7 +41,6 @@ for nstlobject,link in nonstandardlibraries.items():
 #Check if required external programs are installed.
 import subprocess
 externalprograms = {"hmmsearch": "https://anaconda.org/bioconda/hmmer",
-                    "seqtk": "https://anaconda.org/bioconda/seqtk",
                     "einsi": "https://anaconda.org/bioconda/mafft",
                     "bmge": "https://anaconda.org/bioconda/bmge"}
 for extprg,link in externalprograms.items():
@@ -53,6 +56,11 @@ try:
 except subprocess.CalledProcessError:
     print('Script hmmsearchout2accessions.sh not found in PATH. Exiting.')
     sys.exit(1)
+try:
+    pullsequences_py = (subprocess.check_output("which pullsequences.py", shell=True, universal_newlines=True).strip())
+except subprocess.CalledProcessError:
+    print('Script pullsequences.py not found in PATH. Exiting.')
+    sys.exit(1)
 try:
     fasta2distribution_py = (subprocess.check_output("which fasta2distribution.py", shell=True, universal_newlines=True).strip())
 except subprocess.CalledProcessError:
@@ -112,6 +120,7 @@ parser.add_argument("-hmm", "--hmm", required=True, help="HMM must be a director
 parser.add_argument("-con", "--concatenation", required=False, help="CONCATENATION must be the filename stem of the concatenation output containing alphanumeric characters and/or underscores only. If not provided, it will default to five random alphanumeric characters. (optional)")
 parser.add_argument("-cut", "--cutoffs", required=False, help="CUTOFFS must be a tab-delimited file with two columns, the marker HMM profile filename and its domain bitscore cutoff as it would be input in HMMER. The HMM profile filename must only contain alphanumeric characters and/or underscores and use the .hmm extension. The domain bitscore must be a number, with or without decimals. For any files not included or if this argument is not provided, default domain bitscore cutoff is 30. (optional)")
 parser.add_argument("-f", "--fuse", action='store_true', help="FUSE will run an additional step to fuse fragmented adjacent sequences (up to three fragments, four or more will be ignored), based on their accessions. WARNING: This option is still experimental, use it with caution and manually check your final alignments and concatenation. (optional)")
+parser.add_argument("-comp", "--compression", required=False, default="gzip", choices=["gzip", "zstd"], help="COMPRESSION must be the compression of the archives of the intermediate directories: gzip (default, multi-threaded with pigz if installed) or zstd (requires zstd). (optional)")
 args=parser.parse_args()
 #TODO: Add possibility for the user to define an output directory.
 
@@ -177,19 +186,30 @@ else:
     print ('Concatenation name is invalid. Exiting.')
     sys.exit(1)
 
+## checkpoint for the compression of the archives
+if args.compression == 'zstd' and shutil.which('zstd') is None:
+    print('External program zstd not installed. Download it from: https://anaconda.org/conda-forge/zstd. Exiting.')
+    sys.exit(1)
+
 #Remove any previous output files with the same name.
 print ('Removing files and directories with names identical to the output.')
-removal = str('rm -r ' + args.concatenation + '_hmmsearch/ ' + args.concatenation + '_hmmsearchout2accessions/ ' + args.concatenation + '_seqtk/ ' + args.concatenation + '_faafixedheaders/ ' + args.concatenation + '_einsiprefuse/ ' + args.concatenation + '_fuseadjacent/ ' + args.concatenation + '_removemultiples/ ' + args.concatenation + '_einsi/ ' + args.concatenation + '_bmge30/ ' + args.concatenation + '_preconcatenation/ ' + args.concatenation + '_otherlogs/ ' + args.concatenation + '_hmmsearch.tar.gz ' + args.concatenation + '_hmmsearchout2accessions.tar.gz ' + args.concatenation + '_seqtk.tar.gz ' + args.concatenation + '_faafixedheaders.tar.gz ' + args.concatenation + '_einsiprefuse.tar.gz ' + args.concatenation + '_fuseadjacent.tar.gz ' + args.concatenation + '_removemultiples.tar.gz ' + args.concatenation + '_einsi.tar.gz ' + args.concatenation + '_bmge30.tar.gz ' + args.concatenation + '_preconcatenation.tar.gz ' + args.concatenation + '_otherlogs.tar.gz ' + args.concatenation + '.database ' + args.concatenation + '.assembliesnames *.distro ' + args.concatenation + '.distribution ' + args.concatenation + '.fasta2distributionlog ' + args.concatenation + '.concatenation ' + args.concatenation + '.concatenationlog ' + args.concatenation + '_sniff/  2> /dev/null')
+stages = ('hmmsearch', 'hmmsearchout2accessions', 'seqtk', 'faafixedheaders', 'einsiprefuse', 'fuseadjacent', 'removemultiples', 'einsi', 'bmge30', 'preconcatenation', 'otherlogs')
+removal = str('rm -r ' + ' '.join(args.concatenation + '_' + stage + '.tar.zst' for stage in stages) + ' ' + args.concatenation + '_hmmsearch/ ' + args.concatenation + '_hmmsearchout2accessions/ ' + args.concatenation + '_seqtk/ ' + args.concatenation + '_faafixedheaders/ ' + args.concatenation + '_einsiprefuse/ ' + args.concatenation + '_fuseadjacent/ ' + args.concatenation + '_removemultiples/ ' + args.concatenation + '_einsi/ ' + args.concatenation + '_bmge30/ ' + args.concatenation + '_preconcatenation/ ' + args.concatenation + '_otherlogs/ ' + args.concatenation + '_hmmsearch.tar.gz ' + args.concatenation + '_hmmsearchout2accessions.tar.gz ' + args.concatenation + '_seqtk.tar.gz ' + args.concatenation + '_faafixedheaders.tar.gz ' + args.concatenation + '_einsiprefuse.tar.gz ' + args.concatenation + '_fuseadjacent.tar.gz ' + args.concatenation + '_removemultiples.tar.gz ' + args.concatenation + '_einsi.tar.gz ' + args.concatenation + '_bmge30.tar.gz ' + args.concatenation + '_preconcatenation.tar.gz ' + args.concatenation + '_otherlogs.tar.gz ' + args.concatenation + '.pullsequenceslog ' + args.concatenation + '.assembliesnames *.distro ' + args.concatenation + '.distribution ' + args.concatenation + '.fasta2distributionlog ' + args.concatenation + '.concatenation ' + args.concatenation + '.concatenationlog ' + args.concatenation + '_sniff/  2> /dev/null')
 os.system(removal)
 
-##Create a combined database in the current directory to avoid spreading datasets over multiple directories.
-#TODO: Have the hmmsearch run separately for each db and output in a new directory. Then the pipeline runs separately for the output of each db and the fasta files are combined at some point, possibly at demultiplied, before aligning.
-print ('Combining individual databases and assembliesnames files.')
+##The databases are read as one, without combining them into a new file: they are streamed into hmmsearch one after the other, and the sequences of the hits are pulled through the offset index of each database (see pullsequences.py).
+#hmmsearch gets the same sequences in the same order as from a combined database, so the hits (and E-values) are the same. Only the (small) assembliesnames files are combined.
+database_files = ' '.join(shlex.quote(os.path.abspath(dbmember)) for dbmember in args.databases)
+if len(args.databases) == 1:
+    hmmsearch_stream = ''
+    hmmsearch_target = database_files
+else:
+    hmmsearch_stream = 'cat ' + database_files + ' | '
+    hmmsearch_target = '-'
+#The headers of databases in the normalized format (see dbformat.py) were already fixed when the databases were created, except for the protein accessions, which are fixed and swapped with the assembly accessions while pulling the sequences.
+normalized_databases = all(database_format(dbmember) == normalized_format for dbmember in args.databases)
+print ('Combining assembliesnames files.')
 for dbmember in args.databases:
-    cat_databases = str('cat ' + dbmember + ' >> ' + args.concatenation + '.database')
-    if os.WEXITSTATUS(os.system(cat_databases)) == 1:
-        print('Error while combining databases. Exiting.')
-        sys.exit(1)
     #TODO: Parameter expansion might not be the safest (most portable) way to remove the extensions. Maybe look into dirname combined and basename.
     #cat_assembliesnames = str('cat "${' + dbmember + '%.*}".assembliesnames >> ' + args.concatenation + '.assembliesnames')
     cat_assembliesnames = str('cat "$(dirname ' + dbmember + ')"/"$(basename ' + dbmember + ' | perl -p -e \'s/^(.*?)\\..*/$1/g\')".assembliesnames >> ' + args.concatenation + '.assembliesnames')
@@ -212,20 +232,20 @@ if args.cutoffs is not None:
     for fname in os.listdir(args.hmm):
         if fname.endswith('.hmm') and fname in correspond_cutoff.keys():
             set_cutoff = correspond_cutoff[fname]
-            hmmsearch=str('cd ' + args.concatenation + '_hmmsearch && hmmsearch --domT ' + set_cutoff + ' --domtblout "$(basename ' + fname + ' .hmm)".hmmsearchout ' + args.hmm + fname + ' ../' + args.concatenation + '.database >> ' + args.concatenation + '.hmmsearchlog 2>&1')
+            hmmsearch=str('cd ' + args.concatenation + '_hmmsearch && ' + hmmsearch_stream + 'hmmsearch --tformat fasta --domT ' + set_cutoff + ' --domtblout "$(basename ' + fname + ' .hmm)".hmmsearchout ' + args.hmm + fname + ' ' + hmmsearch_target + ' >> ' + args.concatenation + '.hmmsearchlog 2>&1')
             if os.WEXITSTATUS(os.system(hmmsearch)) == 1:
                 print('Error during hmmsearch for ' + args.hmm + fname + '. Exiting.')
                 sys.exit(1)
         elif fname.endswith('.hmm') and fname not in correspond_cutoff.keys():
             set_cutoff = '30'
-            hmmsearch=str('cd ' + args.concatenation + '_hmmsearch && hmmsearch --domT ' + set_cutoff + ' --domtblout "$(basename ' + fname + ' .hmm)".hmmsearchout ' + args.hmm + fname + ' ../' + args.concatenation + '.database >> ' + args.concatenation + '.hmmsearchlog 2>&1')
+            hmmsearch=str('cd ' + args.concatenation + '_hmmsearch && ' + hmmsearch_stream + 'hmmsearch --tformat fasta --domT ' + set_cutoff + ' --domtblout "$(basename ' + fname + ' .hmm)".hmmsearchout ' + args.hmm + fname + ' ' + hmmsearch_target + ' >> ' + args.concatenation + '.hmmsearchlog 2>&1')
             if os.WEXITSTATUS(os.system(hmmsearch)) == 1:
                 print('Error during hmmsearch for ' + args.hmm + fname + '. Exiting.')
                 sys.exit(1)
 else:
     for fname in os.listdir(args.hmm):
         if fname.endswith('.hmm'):
-            hmmsearch=str('cd ' + args.concatenation + '_hmmsearch && hmmsearch --domT ' + set_cutoff + ' --domtblout "$(basename ' + fname + ' .hmm)".hmmsearchout ' + args.hmm + fname + ' ../' + args.concatenation + '.database >> ' + args.concatenation + '.hmmsearchlog 2>&1')
+            hmmsearch=str('cd ' + args.concatenation + '_hmmsearch && ' + hmmsearch_stream + 'hmmsearch --tformat fasta --domT ' + set_cutoff + ' --domtblout "$(basename ' + fname + ' .hmm)".hmmsearchout ' + args.hmm + fname + ' ' + hmmsearch_target + ' >> ' + args.concatenation + '.hmmsearchlog 2>&1')
             if os.WEXITSTATUS(os.system(hmmsearch)) == 1:
                 print('Error during hmmsearch for ' + args.hmm + fname + '. Exiting.')
                 sys.exit(1)
@@ -236,14 +256,21 @@ exacc = str('mkdir ' + args.concatenation + '_hmmsearchout2accessions && cd ' +
 if os.WEXITSTATUS(os.system(exacc)) == 1:
     print('Error during hmmsearchout2accessions.sh script. Exiting.')
     sys.exit(1)
+#Intermediate directories are archived in the background as soon as no later step reads them (see archivedirs.py).
+archiver = Archiver(args.compression, os.cpu_count() or 1, 2)
+archiver.archive(args.concatenation + '_hmmsearch')
 
 ## this is now for pulling the actual sequences from the local database(s)
-print ('Pulling sequences from database (seqtk).')
-#TODO: seqtk doesn't seem to output anything to stdout or stderror, so there's nothing we can redirect as log.
-seqtk = str('mkdir ' + args.concatenation + '_seqtk && cd ' + args.concatenation + '_seqtk && for i in ../' + args.concatenation + '_hmmsearchout2accessions/*.accessions ; do seqtk subseq ../' + args.concatenation + '.database "$i" >> "$(basename $i .accessions)".faaoriginal ; done')
+#The sequences are read through the offset indexes of the databases (see dbindex.py and pullsequences.py), so only the records of the hits are read, instead of the whole database once per marker with seqtk subseq. The output (and the _seqtk directory name) is the same as with seqtk on a combined database.
+print ('Pulling sequences from database(s).')
+if normalized_databases:
+    seqtk = str('mkdir ' + args.concatenation + '_seqtk ' + args.concatenation + '_faafixedheaders && cd ' + args.concatenation + '_seqtk && python -u ' + pullsequences_py + ' ../' + args.concatenation + '_hmmsearchout2accessions/ .accessions .faaoriginal ' + database_files + ' --fixed-headers ../' + args.concatenation + '_faafixedheaders .faafixedheaders >> ../' + args.concatenation + '.pullsequenceslog')
+else:
+    seqtk = str('mkdir ' + args.concatenation + '_seqtk && cd ' + args.concatenation + '_seqtk && python -u ' + pullsequences_py + ' ../' + args.concatenation + '_hmmsearchout2accessions/ .accessions .faaoriginal ' + database_files + ' >> ../' + args.concatenation + '.pullsequenceslog')
 if os.WEXITSTATUS(os.system(seqtk)) == 1:
     print('Error when pulling sequences from the local database. Exiting.')
     sys.exit(1)
+archiver.archive(args.concatenation + '_hmmsearchout2accessions')
 
 ## this is for creating a file with the taxonomic distribution of each marker
 print ('Creating taxonomic distribution file.')
@@ -251,7 +278,7 @@ dirotherlogs = str('mkdir ' + args.concatenation + '_otherlogs')
 if os.WEXITSTATUS(os.system(dirotherlogs)) == 1:
     print('Error when making the otherlogs directory. Exiting.')
     sys.exit(1)
-taxdistro = str ('python -u ' + fasta2distribution_py + ' ./' + args.concatenation + '_seqtk/ .faaoriginal ' + args.concatenation + '.distribution ' + args.concatenation + '.assembliesnames >> ' + args.concatenation + '.fasta2distributionlog && mv ' + args.concatenation + '.fasta2distributionlog ' + args.concatenation + '_otherlogs/')
+taxdistro = str ('python -u ' + fasta2distribution_py + ' ./' + args.concatenation + '_seqtk/ .faaoriginal ' + args.concatenation + '.distribution ' + args.concatenation + '.assembliesnames >> ' + args.concatenation + '.fasta2distributionlog && mv ' + args.concatenation + '.fasta2distributionlog ' + args.concatenation + '.pullsequenceslog ' + args.concatenation + '_otherlogs/')
 if os.WEXITSTATUS(os.system(taxdistro)) == 1:
     print('Error during fasta2distribution.py script. Exiting.')
     sys.exit(1)
@@ -259,12 +286,17 @@ if os.WEXITSTATUS(os.system(taxdistro)) == 1:
 ## this is for removing weird symbols from the .faaoriginal fasta files that often cause alignment or tree-building programs to crash and reversing the assembly and sequence accessions.
 #The reason is to have the same assembly accession as FASTA header accession for all sequences from the same genome across markers, in order to be able to concatenate them.
 #There's nothing to redirect as a log here.
-print ('Fixing FASTA headers (removing problematic characters, reversing assembly and sequence accessions).')
-#Originally was using cp with the new extensions and in-place editing, but after testing, runtime is 1/3 with this command, plus slightly lower peak memory consumption.
-headerfix = str('mkdir ' + args.concatenation + '_faafixedheaders && cd ' + args.concatenation + '_faafixedheaders && for i in ../' + args.concatenation + '_seqtk/*.faaoriginal ; do perl -p -e \'s/\\(/ /g\' "$i" | perl -p -e \'s/\\)/ /g\' | perl -p -e \'s/\\;/ /g\' | perl -p -e \'s/\\:/ /g\' | perl -p -e \'s/\\,/ /g\' | perl -p -e \'s/>(.*?) (.*?) (.*)/>$2 $1 $3/g\' >> "$(basename $i .faaoriginal)".faafixedheaders ; done')
-if os.WEXITSTATUS(os.system(headerfix)) == 1:
-    print('Error when fixing FASTA headers. Exiting.')
-    sys.exit(1)
+#For databases in the normalized format, the fixed headers were already written while pulling the sequences.
+if normalized_databases:
+    print ('FASTA headers already fixed (normalized databases). Skipping.')
+else:
+    print ('Fixing FASTA headers (removing problematic characters, reversing assembly and sequence accessions).')
+    #Originally was using cp with the new extensions and in-place editing, but after testing, runtime is 1/3 with this command, plus slightly lower peak memory consumption.
+    headerfix = str('mkdir ' + args.concatenation + '_faafixedheaders && cd ' + args.concatenation + '_faafixedheaders && for i in ../' + args.concatenation + '_seqtk/*.faaoriginal ; do perl -p -e \'s/\\(/ /g\' "$i" | perl -p -e \'s/\\)/ /g\' | perl -p -e \'s/\\;/ /g\' | perl -p -e \'s/\\:/ /g\' | perl -p -e \'s/\\,/ /g\' | perl -p -e \'s/>(.*?) (.*?) (.*)/>$2 $1 $3/g\' >> "$(basename $i .faaoriginal)".faafixedheaders ; done')
+    if os.WEXITSTATUS(os.system(headerfix)) == 1:
+        print('Error when fixing FASTA headers. Exiting.')
+        sys.exit(1)
+archiver.archive(args.concatenation + '_seqtk')
 
 if args.fuse:
     ## this is for fusing adjacent fragmented sequences
@@ -274,10 +306,12 @@ if args.fuse:
     if os.WEXITSTATUS(os.system(einsiunfused)) == 1:
         print('Error when aligning datasets with MAFFT E-INS-i (before fusing adjacent fragmented sequences). Exiting.')
         sys.exit(1)
+    archiver.archive(args.concatenation + '_faafixedheaders')
     fuseadjacent = str('mkdir ' + args.concatenation + '_fuseadjacent && cd ' + args.concatenation + '_fuseadjacent && python -u ' + fuseadjacent_py + ' ../' + args.concatenation + '_einsiprefuse/ .einsiunfused .faafused ' + args.concatenation + '.fusedlog >> '  + args.concatenation + '.fuseadjacentlog')
     if os.WEXITSTATUS(os.system(fuseadjacent)) == 1:
         print('Error when fusing adjacent fragmented sequences. Exiting.')
         sys.exit(1)
+    archiver.archive(args.concatenation + '_einsiprefuse')
     ## this is for removing taxa with multiple sequences from datasets
     print ('Removing from each marker any taxa with multiple sequences.')
     removemultiples = str('mkdir ' + args.concatenation + '_removemultiples && cd ' + args.concatenation + '_removemultiples && python -u ' + removemultiples_py + ' ../' + args.concatenation + '_fuseadjacent/ .faafused .faademultiplied ' + args.concatenation + '.demultipliedlog >> '  + args.concatenation + '.removemultipleslog')
@@ -287,6 +321,8 @@ else:
 if os.WEXITSTATUS(os.system(removemultiples)) == 1:
     print('Error during removemultiples.py script. Exiting.')
     sys.exit(1)
+archiver.archive(args.concatenation + '_faafixedheaders')
+archiver.archive(args.concatenation + '_fuseadjacent')
 
 ## this is for aligning the .demultiplied fasta files with mafft
 print ('Aligning with MAFFT E-INS-i.')
@@ -295,6 +331,7 @@ einsi = str('mkdir ' + args.concatenation + '_einsi && cd ' + args.concatenation
 if os.WEXITSTATUS(os.system(einsi)) == 1:
     print('Error when aligning datasets with MAFFT E-INS-i. Exiting.')
     sys.exit(1)
+archiver.archive(args.concatenation + '_removemultiples')
 
 ## this is for trimming with BMGE
 print ('Trimming with BMGE (BLOSUM30).')
@@ -302,6 +339,7 @@ bmge30 = ('mkdir ' + args.concatenation + '_bmge30 && cd ' + args.concatenation
 if os.WEXITSTATUS(os.system(bmge30)) == 1:
     print('Error when trimming alignments with BMGE. Exiting.')
     sys.exit(1)
+archiver.archive(args.concatenation + '_einsi')
 
 ## this is for running the preconcatenation script (responsible for generating a file with the dataset names to be concatenated in the next step)
 print ('Running preconcatenation script.')
@@ -317,14 +355,19 @@ if os.WEXITSTATUS(os.system(concatenation)) == 1:
     print('Error during concatenation.py script. Exiting.')
     sys.exit(1)
 
-#Back up files in a dedicated directory. Remove the combined database to avoid redundancy and save disk space.
-print ('Creating run directory and removing combined database.')
-if args.fuse:
-    backup = str('mkdir ' + args.concatenation + '_sniff && tar -czf ' + args.concatenation + '_hmmsearch.tar.gz ' + args.concatenation + '_hmmsearch/ && tar -czf ' + args.concatenation +  '_hmmsearchout2accessions.tar.gz ' + args.concatenation + '_hmmsearchout2accessions/ && tar -czf ' + args.concatenation + '_seqtk.tar.gz ' + args.concatenation + '_seqtk/ && tar -czf ' + args.concatenation + '_faafixedheaders.tar.gz ' + args.concatenation + '_faafixedheaders/ && tar -czf ' + args.concatenation + '_einsiprefuse.tar.gz ' + args.concatenation + '_einsiprefuse/ && tar -czf ' + args.concatenation + '_fuseadjacent.tar.gz ' + args.concatenation + '_fuseadjacent/ && tar -czf ' + args.concatenation + '_removemultiples.tar.gz ' + args.concatenation + '_removemultiples/ && tar -czf ' + args.concatenation + '_einsi.tar.gz ' + args.concatenation + '_einsi/ && tar -czf ' + args.concatenation + '_bmge30.tar.gz ' + args.concatenation + '_bmge30/ && tar -czf ' + args.concatenation + '_preconcatenation.tar.gz ' + args.concatenation + '_preconcatenation/ && tar -czf ' + args.concatenation + '_otherlogs.tar.gz ' + args.concatenation + '_otherlogs/ && mv -i ' + args.concatenation + '_hmmsearch.tar.gz ' + args.concatenation + '_hmmsearchout2accessions.tar.gz ' + args.concatenation + '_seqtk.tar.gz ' + args.concatenation + '_faafixedheaders.tar.gz ' + args.concatenation + '_einsiprefuse.tar.gz ' + args.concatenation + '_fuseadjacent.tar.gz ' + args.concatenation + '_removemultiples.tar.gz ' + args.concatenation + '_einsi.tar.gz ' + args.concatenation + '_bmge30.tar.gz ' + args.concatenation + '_preconcatenation.tar.gz ' + args.concatenation + '_otherlogs.tar.gz ' + args.concatenation + '.assembliesnames ' + args.concatenation + '.distribution ' + args.concatenation + '.concatenation ' + args.concatenation + '_sniff/ && rm -r ' + args.concatenation + '_hmmsearch/ ' + args.concatenation + '_hmmsearchout2accessions/ ' + args.concatenation + '_seqtk/ ' + args.concatenation + '_faafixedheaders/ ' + args.concatenation + '_einsiprefuse/ ' + args.concatenation + '_fuseadjacent/ ' + args.concatenation + '_removemultiples/ ' + args.concatenation + '_einsi/ ' + args.concatenation + '_bmge30/ ' + args.concatenation + '_preconcatenation/ ' + args.concatenation + '_otherlogs/ ' + args.concatenation + '.database 2> /dev/null')
-else:
-    backup = str('mkdir ' + args.concatenation + '_sniff && tar -czf ' + args.concatenation + '_hmmsearch.tar.gz ' + args.concatenation + '_hmmsearch/ && tar -czf ' + args.concatenation + '_hmmsearchout2accessions.tar.gz ' + args.concatenation + '_hmmsearchout2accessions/ && tar -czf ' + args.concatenation + '_seqtk.tar.gz ' + args.concatenation + '_seqtk/ && tar -czf ' + args.concatenation + '_faafixedheaders.tar.gz ' + args.concatenation + '_faafixedheaders/ && tar -czf ' + args.concatenation + '_removemultiples.tar.gz ' + args.concatenation + '_removemultiples/ && tar -czf ' + args.concatenation + '_einsi.tar.gz ' + args.concatenation + '_einsi/ && tar -czf ' + args.concatenation + '_bmge30.tar.gz ' + args.concatenation + '_bmge30/ && tar -czf ' + args.concatenation + '_preconcatenation.tar.gz ' + args.concatenation + '_preconcatenation/ && tar -czf ' + args.concatenation + '_otherlogs.tar.gz ' + args.concatenation + '_otherlogs/ && mv -i ' + args.concatenation + '_hmmsearch.tar.gz ' + args.concatenation + '_hmmsearchout2accessions.tar.gz ' + args.concatenation + '_seqtk.tar.gz ' + args.concatenation + '_faafixedheaders.tar.gz ' + args.concatenation + '_removemultiples.tar.gz ' + args.concatenation + '_einsi.tar.gz ' + args.concatenation + '_bmge30.tar.gz ' + args.concatenation + '_preconcatenation.tar.gz ' + args.concatenation + '_otherlogs.tar.gz ' + args.concatenation + '.assembliesnames ' + args.concatenation + '.distribution ' + args.concatenation + '.concatenation ' + args.concatenation + '_sniff/ && rm -r ' + args.concatenation + '_hmmsearch/ ' + args.concatenation + '_hmmsearchout2accessions/ ' + args.concatenation + '_seqtk/ ' + args.concatenation + '_faafixedheaders/ ' + args.concatenation + '_removemultiples/ ' + args.concatenation + '_einsi/ ' + args.concatenation + '_bmge30/ ' + args.concatenation + '_preconcatenation/ ' + args.concatenation + '_otherlogs/ ' + args.concatenation + '.database 2> /dev/null')
+#Back up files in a dedicated directory. The local databases are searched in place, so there is no combined database to remove.
+#The remaining intermediate directories are archived now, in parallel with those still being archived.
+print ('Creating run directory.')
+for stage in ('bmge30', 'preconcatenation', 'otherlogs'):
+    archiver.archive(args.concatenation + '_' + stage)
+archives, failed = archiver.wait()
+archiver.shutdown()
+if len(failed) > 0:
+    print('Error when compressing ' + ' '.join(failed) + '. Exiting.')
+    sys.exit(1)
+backup = str('mkdir ' + args.concatenation + '_sniff && mv -i ' + ' '.join(archives) + ' ' + args.concatenation + '.assembliesnames ' + args.concatenation + '.distribution ' + args.concatenation + '.concatenation ' + args.concatenation + '_sniff/')
 if os.WEXITSTATUS(os.system(backup)) == 1:
-    print('Error when creating run directory and removing combined database. Exiting.')
+    print('Error when creating run directory. Exiting.')
     sys.exit(1)
 
 print('Bork bork! I finish. Gib treato pls?')
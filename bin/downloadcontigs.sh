@@ -7,33 +7,53 @@
 
 #Function
 #This script will download contigs (each genome's latest version) from Genbank for a list of assemblies. It is essentially a wrapper for ncbi-datasets-cli with small extra features (e.g., an extra failed/non-genome download check).
+#The contigs are kept gzip-compressed (<assembly>.fna.gz) from the moment they are downloaded, so the uncompressed genomes never take up disk space all together.
+#The assemblies are split into chunks that are downloaded by concurrent workers (or, with "dehydrated", downloaded as dehydrated packages and rehydrated with datasets' own concurrent workers).
+#The assembly version of every contig file kept (the latest Genbank version at the time of the download) is recorded in the .contigversions file (versionless and versioned assembly, tab-delimited, 1/line).
+#Finished chunks (those whose assemblies all have contig files) are recorded in the .downloadstate file, so if a run is interrupted, rerunning the script with the same assemblies file and chunk size resumes where it stopped.
 
 #NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The datasets program can be replaced with a local stand-in (e.g., for testing offline) by setting the DOGGO_DATASETS environment variable to its path.
 
 #Dependencies
 #1) ncbi-datasets-cli (https://github.com/ncbi/datasets)
 
 assemblies="$1"
+chunksize="${2:-500}"
+workers="${3:-4}"
+mode="${4:-direct}"
+datasets_bin="${DOGGO_DATASETS:-datasets}"
 
 #Check if all dependencies are installed.
-if ! command -v datasets &> /dev/null
+if ! command -v "$datasets_bin" &> /dev/null
 then
     echo "Program datasets not installed. Download it from https://github.com/ncbi/datasets. Exiting."
     exit 1
 fi
 
+#Check if internal scripts are in the PATH.
+if ! command -v extractcontigs.py &> /dev/null
+then
+    echo "Script extractcontigs.py not found in PATH. Exiting."
+    exit 1
+fi
+extractcontigs_py="$(command -v extractcontigs.py)"
+
 cat << EndOfMessage
 #Script: downloadcontigs.sh
 #Version: v20241212
-#Usage: downloadcontigs.sh <assemblies>
+#Usage: downloadcontigs.sh <assemblies> <chunk_size> <workers> <mode>
 #<assemblies> must be a text file of versionless Genbank assemblies (1/line). RefSeq will be converted to Genbank and version numbers removed. (required)
+#<chunk_size> must be the number of assemblies downloaded per datasets call. (optional, default: 500)
+#<workers> must be the number of chunks downloaded concurrently, or the number of rehydration workers for "dehydrated" (at most 30). (optional, default: 4)
+#<mode> must be "direct" or "dehydrated". "dehydrated" downloads dehydrated packages and fetches the sequences with datasets rehydrate. (optional, default: direct)
 #For more information refer to the comments in the script and/or the Github page.
 EndOfMessage
 
 #Check if the number of arguments is correct, otherwise exit.
-if [ "$#" -eq 1 ]
+if [[ "$#" -ge 1 && "$#" -le 4 ]]
 then
-	echo "One argument found. Proceeding."
+	echo "$# argument(s) found. Proceeding."
 else
 	echo "Wrong number of arguments given. Exiting."
 	exit 1
@@ -48,15 +68,35 @@ else
 	exit 1
 fi
 
+#Check if the chunk size and number of workers are positive integers, and the mode is valid.
+if [[ "$chunksize" =~ ^[0-9]+$ && "$chunksize" -gt 0 ]]
+then
+	echo "Chunk size is valid ($chunksize). Proceeding."
+else
+	echo "Chunk size must be a positive integer. Exiting."
+	exit 1
+fi
+if [[ "$workers" =~ ^[0-9]+$ && "$workers" -gt 0 ]]
+then
+	echo "Number of workers is valid ($workers). Proceeding."
+else
+	echo "Number of workers must be a positive integer. Exiting."
+	exit 1
+fi
+if [[ "$mode" = "direct" || "$mode" = "dehydrated" ]]
+then
+	echo "Download mode is valid ($mode). Proceeding."
+else
+	echo "Download mode must be \"direct\" or \"dehydrated\". Exiting."
+	exit 1
+fi
+
 #Isolate the stem of the assemblies file name as a separate variable to avoid any issues with extensions.
 #To make it path and extension agnostic (since it's input and not created by another command to be certain of the name), basename removes the path and the perl one-liner the extensions.
 #Output is always in the working directory.
 baseassemblies="$(basename "$assemblies" | perl -p -e 's/^(.*?)\..*/$1/g')"
-
-#For any given assemblies file, remove all the files a previous run would have produced to avoid clashes.
-#All output will be in the working directory.
-echo "Removing files and directories with names identical to the output."
-rm -r "$baseassemblies"_contigs/ "$baseassemblies".failed "$baseassemblies".retry ncbi_dataset.zip ncbi_dataset/ 2> /dev/null
+statefile="$baseassemblies".downloadstate
+workdir="$baseassemblies"_download
 
 creationtime="$(echo $(TZ=UTC date '+%Y-%m-%d-%H-%M-%S'))"
 echo "This script was run at $creationtime UTC."
@@ -70,72 +110,162 @@ perl -p -i -e 's/^GCF_/GCA_/g' "$assemblies"
 #Remove the assembly version.
 perl -p -i -e 's/^(GCA_\d+?)\.\d+/$1/g' "$assemblies"
 
-#Download genomes (Genbank, latest version) with ncbi-datasets-cli.
-echo "Downloading contig datasets from GenBank."
-datasets download genome accession --inputfile "$assemblies" --assembly-source GenBank --assembly-version latest
-
-#Unzip the contig fna files from the downloaded zip file (we haven't changed the default name ncbi_dataset.zip). We don't care about the readme, json assembly reports etc. Then remove the zip file to save disk space.
-echo "Uncompressing genome files."
-touch "$baseassemblies".retry
-mkdir "$baseassemblies"_contigs/
-#Unzip the fna files.
-#If any of the downloaded genome files are corrupted (usually because of an unstable internet connection), an error message "error:  invalid compressed data to inflate" followed by the file will be passed.
-#From these messages we extract versionless assemblies and redirect them to the .retry file, ignoring other error messages.
-unzip -q -j -d "$baseassemblies"_contigs/ ncbi_dataset.zip '*.fna' 2>&1 >/dev/null | grep 'invalid compressed data to inflate' | perl -p -e 's/^.*?_contigs\/(GCA_\d+?)\..*/$1/g' > "$baseassemblies".retry
-rm ncbi_dataset.zip
-
-#Create a variable that will be used as a checkpoint for any downloaded corrupted genomes.
-declare -i corruptedcheck
-corruptedcheck=0
-
-#If the .retry file is not empty, we enter a loop of retrying the downloads of any corrupted genomes until there are none left.
-if [ "$(wc -l < "$baseassemblies".retry | sed 's/ //g')" -gt 0 ]
+#The first line of the state file identifies the run (checksum of the assemblies file and chunk size). The following lines are the finished chunks.
+stateheader="#assemblies $(cksum < "$assemblies" | awk '{print $1"_"$2}') chunk $chunksize"
+
+#For any given assemblies file, remove all the files a previous run would have produced to avoid clashes, unless that run was interrupted and can be resumed.
+#All output will be in the working directory.
+if [[ -f "$statefile" && "$(head -n 1 "$statefile")" = "$stateheader" && -d "$baseassemblies"_contigs ]]
 then
-	#Check the value of the corruptedcheck variable.
-	while [ "$corruptedcheck" -eq 0 ] ; do
-		#Check how many lines the .retry file contains, to pass a grammatically correct message.
-		if [ "$(wc -l < "$baseassemblies".retry | sed 's/ //g')" -eq 1 ]
+	echo "Resuming the interrupted download of the same assemblies ($(( $(wc -l < "$statefile") - 1 )) chunk(s) already finished)."
+	rm -r "$baseassemblies".failed "$baseassemblies".retry "$workdir" 2> /dev/null
+else
+	echo "Removing files and directories with names identical to the output."
+	rm -r "$baseassemblies"_contigs "$baseassemblies".contigversions "$baseassemblies".failed "$baseassemblies".retry "$statefile" "$workdir" ncbi_dataset.zip ncbi_dataset 2> /dev/null
+	echo "$stateheader" > "$statefile"
+	mkdir "$baseassemblies"_contigs/
+fi
+
+#Split the assemblies into chunks (chunk_aaaa, chunk_aaab, etc.). The chunks of the same assemblies file and chunk size always get the same names, so finished chunks can be skipped.
+mkdir "$workdir"/
+split -l "$chunksize" -a 4 "$assemblies" "$workdir"/chunk_
+touch "$workdir"/pending
+for i in "$workdir"/chunk_* ; do
+	if [ -f "$i" ] && ! grep -q -x -F "$(basename "$i")" "$statefile" ; then
+		echo "$i" >> "$workdir"/pending
+	fi
+done
+echo "$(ls "$workdir" | grep -c '^chunk_') chunk(s) of up to $chunksize assemblies, $(wc -l < "$workdir"/pending | sed 's/ //g') left to download."
+
+#The assemblies of a chunk that have no contig file in the contigs directory (yet).
+missing_assemblies() {
+	while IFS= read -r line ; do
+		if [ -n "$line" ] && [ ! -f "$baseassemblies"_contigs/"$line".fna.gz ] ; then
+			echo "$line"
+		fi
+	done < "$1"
+}
+export -f missing_assemblies
+
+#Download, check, and unpack one chunk. Contig files are written straight to the contigs directory as versionless assembly.fna.gz (gzip-compressed), and only once they pass their integrity checks.
+download_chunk() {
+	chunk="$1"
+	chunkname="$(basename "$chunk")"
+	chunkdir="$workdir"/"$chunkname"_download
+	rm -r "$chunkdir" "$chunkdir".retry 2> /dev/null
+	mkdir "$chunkdir"/
+	echo "Downloading contig datasets from GenBank ($chunkname)."
+	if [ "$mode" = "dehydrated" ]
+	then
+		#Dehydrated packages only contain the file list; datasets rehydrate then downloads the sequences with up to 30 concurrent workers.
+		if ! "$datasets_bin" download genome accession --inputfile "$chunk" --assembly-source GenBank --assembly-version latest --dehydrated --filename "$chunkdir"/ncbi_dataset.zip
+		then
+			echo "Download of $chunkname failed. It will be retried when the script is rerun."
+			return 0
+		fi
+		if ! unzip -q -o -d "$chunkdir"/ "$chunkdir"/ncbi_dataset.zip
+		then
+			echo "Unpacking of $chunkname failed. It will be retried when the script is rerun."
+			rm -r "$chunkdir" 2> /dev/null
+			return 0
+		fi
+		rm "$chunkdir"/ncbi_dataset.zip
+		if ! "$datasets_bin" rehydrate --directory "$chunkdir"/ --max-workers "$(( workers < 30 ? workers : 30 ))"
+		then
+			echo "Rehydration of $chunkname incomplete. Retrying."
+			"$datasets_bin" rehydrate --directory "$chunkdir"/ --max-workers "$(( workers < 30 ? workers : 30 ))"
+		fi
+		#Compress the rehydrated files to their versionless assembly names, checking them against the md5 checksums and file sizes of the package first, as for direct downloads.
+		#Files that fail the checks (or were not rehydrated at all) are not kept, and their versionless assemblies are written to the .retry file.
+		echo "Checking and compressing rehydrated genome files ($chunkname)."
+		python -u "$extractcontigs_py" "$chunkdir"/ "$baseassemblies"_contigs/ "$chunkdir".retry "$extractthreads" --versions "$baseassemblies".contigversions | grep -v '^#'
+		if [ "${PIPESTATUS[0]}" -ne 0 ]
+		then
+			echo "Checking of $chunkname failed. Retrying the whole chunk."
+			missing_assemblies "$chunk" > "$chunkdir".retry
+		fi
+	else
+		if ! "$datasets_bin" download genome accession --inputfile "$chunk" --assembly-source GenBank --assembly-version latest --filename "$chunkdir"/ncbi_dataset.zip
+		then
+			echo "Download of $chunkname failed. It will be retried when the script is rerun."
+			return 0
+		fi
+		#Extract the fna files straight to gzip-compressed files with their versionless assembly names, checking the zip CRC and the md5 checksums of the package as they are written.
+		#Corrupted files (usually because of an unstable internet connection) are not kept, and their versionless assemblies are written to the .retry file.
+		echo "Uncompressing genome files ($chunkname)."
+		#If the package cannot be read at all (e.g., a truncated zip), all assemblies of the chunk still missing are retried.
+		python -u "$extractcontigs_py" "$chunkdir"/ncbi_dataset.zip "$baseassemblies"_contigs/ "$chunkdir".retry "$extractthreads" --versions "$baseassemblies".contigversions | grep -v '^#'
+		if [ "${PIPESTATUS[0]}" -ne 0 ]
 		then
-			echo "One corrupted genome file detected in the previous download. Retrying for that genome."
-		else
-			echo ""$(wc -l < "$baseassemblies".retry | sed 's/ //g')" corrupted genome files detected in the previous download. Retrying for these genomes."
+			echo "Extraction of $chunkname failed. Retrying the whole chunk."
+			missing_assemblies "$chunk" > "$chunkdir".retry
 		fi
-		#Remove the corrupted files to avoid conflicts with the new download.
-		echo "Removing corrupted genome files."
-		while IFS= read -r line; do rm -r "$baseassemblies"_contigs/"$line"* ; done < "$baseassemblies".retry
-		#Reattempt the downloads using the assembly list in the .retry file.
-		echo "Downloading contig datasets from GenBank."
-		datasets download genome accession --inputfile "$baseassemblies".retry --assembly-source GenBank --assembly-version latest
-		echo "Uncompressing genome files."
-		unzip -q -j -d "$baseassemblies"_contigs/ ncbi_dataset.zip '*.fna' 2>&1 >/dev/null | grep 'invalid compressed data to inflate' | perl -p -e 's/^.*?_contigs\/(GCA_\d+?)\..*/$1/g' > "$baseassemblies".retry
-		rm ncbi_dataset.zip
-		#If the retry file is now empty, change the value of corruptedcheck to break the loop.
-		if [ "$(wc -l < "$baseassemblies".retry | sed 's/ //g')" -eq 0 ]
+		rm "$chunkdir"/ncbi_dataset.zip 2> /dev/null
+	fi
+	#Retry the downloads of only the corrupted genomes (of either mode, downloaded directly) until there are none left (at most 10 rounds per chunk; anything still missing is caught by the checks at the end).
+	declare -i retryround
+	retryround=0
+	while [[ "$(wc -l < "$chunkdir".retry | sed 's/ //g')" -gt 0 && "$retryround" -lt 10 ]] ; do
+		retryround+=1
+		echo "$(wc -l < "$chunkdir".retry | sed 's/ //g') corrupted genome file(s) detected in $chunkname. Retrying for these genomes."
+		"$datasets_bin" download genome accession --inputfile "$chunkdir".retry --assembly-source GenBank --assembly-version latest --filename "$chunkdir"/ncbi_dataset.zip
+		python -u "$extractcontigs_py" "$chunkdir"/ncbi_dataset.zip "$baseassemblies"_contigs/ "$chunkdir".retry "$extractthreads" --versions "$baseassemblies".contigversions | grep -v '^#'
+		if [ "${PIPESTATUS[0]}" -ne 0 ]
 		then
-			corruptedcheck=1
-			echo "No corrupted genome files detected in the previous download. Proceeding."
-			rm "$baseassemblies".retry
+			echo "Extraction of $chunkname failed. Retrying the whole chunk."
+			missing_assemblies "$chunk" > "$chunkdir".retry
 		fi
+		rm "$chunkdir"/ncbi_dataset.zip 2> /dev/null
 	done
+	rm -r "$chunkdir" "$chunkdir".retry 2> /dev/null
+	#A chunk is only finished once every one of its assemblies has a contig file. Otherwise it is not recorded, so a rerun retries it.
+	missing="$(missing_assemblies "$chunk" | wc -l | sed 's/ //g')"
+	if [ "$missing" -gt 0 ]
+	then
+		echo "$missing genome(s) of $chunkname missing. It will be retried when the script is rerun."
+		return 0
+	fi
+	echo "$chunkname" >> "$statefile"
+	echo "Finished $chunkname."
+}
+export -f download_chunk
+
+#Dehydrated chunks are processed one at a time, as datasets rehydrate already downloads concurrently.
+#Each chunk extracts its contig files with as many threads as there are cores per concurrent chunk.
+if [ "$mode" = "dehydrated" ]
+then
+	parallelchunks=1
 else
-	echo "No corrupted genome files detected in the previous download. Proceeding."
-	rm "$baseassemblies".retry
+	parallelchunks="$workers"
 fi
+cores="$(getconf _NPROCESSORS_ONLN 2> /dev/null || echo 1)"
+extractthreads=$(( cores / parallelchunks > 0 ? cores / parallelchunks : 1 ))
+export workdir statefile baseassemblies mode workers datasets_bin extractcontigs_py extractthreads
+xargs -P "$parallelchunks" -n 1 bash -c 'download_chunk "$1"' _ < "$workdir"/pending
 
-#Rename the dataset name stems to only a versionless assembly. This will make it easier to modify the headers later.
-#The new name is the minimum amount of characters until we encounter the first dot, including the preceding directory structure. We substitute the remaining characters with the extension .fna .
-echo "Modifying genome filename stems to correspond to the versionless assemblies."
-#This renaming command works too but it seems a bit sketchier.
-#for i in "$baseassemblies"_contigs/*.fna ; do mv "$i" "${i%%.*}".fna ; done
-for i in "$baseassemblies"_contigs/*.fna ; do mv "$i" "$baseassemblies"_contigs/"$(basename "$i" | perl -p -e 's/^(.*?)\..*/$1/g')".fna ; done
+#If all chunks are finished, the download is complete and the state is no longer needed. Otherwise it is kept, so a rerun only retries the unfinished chunks.
+declare -i unfinished
+unfinished=0
+for i in "$workdir"/chunk_* ; do
+	if [ -f "$i" ] && ! grep -q -x -F "$(basename "$i")" "$statefile" ; then
+		unfinished+=1
+	fi
+done
+if [ "$unfinished" -eq 0 ]
+then
+	echo "All chunks downloaded. Proceeding."
+	rm -r "$statefile" "$workdir"
+else
+	echo "$unfinished chunk(s) could not be downloaded. Rerun the script with the same arguments to resume."
+fi
 
 #Check if any of the downloads failed or shouldn't be considered a genome, as it contains very little data. The genome afiles are removed and their assemblies logged in the failed file.
-#We've arbitrarily selected a size of 10 bytes as the threshold.
+#We've arbitrarily selected a size of 10 bytes (uncompressed) as the threshold.
 echo "Removing failed or non-genome downloads and writing assemblies to the .failed file."
 touch "$baseassemblies".failed
-for i in "$baseassemblies"_contigs/*.fna ; do
-	if [ $(wc -c < $i | sed 's/ //g') -lt 10 ] ; then
-		echo "$(basename "$i" .fna)" >> "$baseassemblies".failed
+for i in "$baseassemblies"_contigs/*.fna.gz ; do
+	if [ -f "$i" ] && [ $(gzip -dc "$i" 2> /dev/null | head -c 10 | wc -c | sed 's/ //g') -lt 10 ] ; then
+		echo "$(basename "$i" .fna.gz)" >> "$baseassemblies".failed
 		rm "$i"
 	fi
 done
@@ -144,7 +274,7 @@ done
 declare -i dlwarn
 dlwarn=0
 while IFS= read -r line; do
-	if [ "$(ls "$baseassemblies"_contigs/"$line".fna | wc -l | sed 's/ //g')" -eq 0 ] ; then
+	if [ ! -f "$baseassemblies"_contigs/"$line".fna.gz ] ; then
     echo "$line" >> "$baseassemblies".failed
 		dlwarn=5
 	fi
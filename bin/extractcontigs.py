@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script extracts the contig (.fna) files of an ncbi-datasets-cli genome package (zip file) straight to gzip-compressed files with versionless assembly names (e.g. GCA_011362025.fna.gz), without unpacking the rest of the package. The uncompressed contigs are never written to disk.
+#Each file is streamed out of the zip file, checked, and compressed as it is written: the zip CRC, and the md5 checksum listed in the package's md5sum.txt (if present), are checked on the uncompressed contigs.
+#Files that fail either check are not kept, and their versionless assemblies are written to the retry file, so only these are downloaded again (see downloadcontigs.sh).
+#The package can also be the directory of a rehydrated dehydrated package. Its contig files are then checked against the md5 checksums of md5sum.txt and the sizes of fetch.txt (if present) instead, and files listed in fetch.txt but missing are taken as corrupted.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: Files are written under a temporary name in the output directory and only renamed once both checks pass, so an interrupted extraction never leaves a partial genome behind.
+#NOTE 3: With --versions, the versionless and versioned assembly of every file kept (e.g., GCA_011362025 and GCA_011362025.1, from the file name in the package) are appended to <versions_file>, tab-delimited, before the file is renamed. These are the versions actually downloaded, which doggo_fetch.py uses as the keys of the genome store.
+
+#Dependencies
+#NONE
+
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import hashlib
+import os
+import re
+import sys
+import threading
+import zipfile
+import zlib
+
+print('#Script: extractcontigs.py')
+print('#Version: v20241212')
+print('#Usage: python extractcontigs.py <input_package> <output_dir> <retry_file> <threads> [--versions <versions_file>]')
+print('#<input_package> must be a genome package (zip file) downloaded with ncbi-datasets-cli, or the directory of a rehydrated dehydrated package. (required)')
+print('#<output_dir> must be the directory where the contig files will be written. It is created if it does not exist. (required)')
+print('#<retry_file> must be the name of the file that will contain the versionless assemblies whose files are corrupted. (required)')
+print('#<threads> must be the number of files extracted at the same time. (optional, default: 1)')
+print('#--versions <versions_file>: append the versionless and versioned assembly of every file kept to <versions_file> (see NOTE 3). (optional)')
+print('#For more information refer to the comments in the script and/or the Github page.')
+
+#Take out the --versions option (given by downloadcontigs.sh) before checking the positional arguments.
+versions_file = None
+if '--versions' in sys.argv and sys.argv.index('--versions') + 1 < len(sys.argv):
+    option_position = sys.argv.index('--versions')
+    versions_file = sys.argv[option_position + 1]
+    del sys.argv[option_position:option_position + 2]
+
+# Check if the correct number of arguments is given
+if len(sys.argv) == 4 or len(sys.argv) == 5:
+    print(str((len(sys.argv)-1)) + ' arguments found. Proceeding.')
+else:
+    print('Wrong number of arguments given. Exiting.')
+    sys.exit(1)
+
+# checkpoint for input file
+if os.path.isfile(sys.argv[1]):
+    print('Input zip file found. Proceeding.')
+elif os.path.isdir(sys.argv[1]):
+    print('Input package directory found. Proceeding.')
+else:
+    print('Input package not found. Exiting.')
+    sys.exit(1)
+package_dir = os.path.isdir(sys.argv[1])
+
+# checkpoint for number of threads
+threads = 1
+if len(sys.argv) == 5:
+    try:
+        threads = int(sys.argv[4])
+    except ValueError:
+        threads = 0
+    if threads > 0:
+        print('Number of threads is valid. Proceeding.')
+    else:
+        print('Number of threads must be a positive integer. Exiting.')
+        sys.exit(1)
+
+os.makedirs(sys.argv[2], exist_ok=True)
+
+#The versionless assembly of a zip member (everything until the first dot of the file name). Its contig file is the assembly plus .fna.gz .
+def member_assembly(member):
+    return os.path.basename(member).split('.', 1)[0]
+
+#The versioned assembly of a zip member (e.g., GCA_011362025.1 for GCA_011362025.1_ASM1136202v1_genomic.fna), or None.
+def member_version(member):
+    match = re.match(r'(GC[AF]_\d+\.\d+)', os.path.basename(member))
+    return match.group(1) if match else None
+
+#Record the version of a file kept (see NOTE 3). Each line is written at once in append mode, so several chunks can record versions in the same file.
+versions_lock = threading.Lock()
+def record_version(member):
+    if versions_file is None or member_version(member) is None:
+        return
+    with versions_lock, open(versions_file, 'a') as versions:
+        versions.write(member_assembly(member) + '\t' + member_version(member) + '\n')
+
+#Each thread opens the zip file once, as zip file objects must not be shared between threads.
+local = threading.local()
+def open_zip():
+    if not hasattr(local, 'zip'):
+        local.zip = zipfile.ZipFile(sys.argv[1])
+    return local.zip
+
+#Open a member of the package (a path relative to the package directory for rehydrated packages).
+def open_member(member):
+    if package_dir:
+        return open(os.path.join(sys.argv[1], member), 'rb')
+    return open_zip().open(member)
+
+#Extract one member to its contig file. Returns the versionless assembly if the file is corrupted, None otherwise.
+def extract(member, expected_md5, expected_size):
+    output_path = os.path.join(sys.argv[2], member_assembly(member) + '.fna.gz')
+    partial_path = os.path.join(sys.argv[2], '.' + member_assembly(member) + '.fna.gz.part')
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        #No file name or time stamp in the gzip header, so the same contigs always give the same file.
+        with open_member(member) as source, open(partial_path, 'wb') as raw_target, gzip.GzipFile(filename='', mode='wb', compresslevel=6, fileobj=raw_target, mtime=0) as target:
+            for block in iter(lambda: source.read(1048576), b''):
+                md5.update(block)
+                size += len(block)
+                target.write(block)
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as error:
+        print('Corrupted file ' + member + ' (' + str(error) + ').')
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return member_assembly(member)
+    if expected_md5 is not None and md5.hexdigest() != expected_md5:
+        print('Corrupted file ' + member + ' (md5 checksum does not match).')
+        os.remove(partial_path)
+        return member_assembly(member)
+    if expected_size is not None and size != expected_size:
+        print('Corrupted file ' + member + ' (size does not match).')
+        os.remove(partial_path)
+        return member_assembly(member)
+    record_version(member)
+    os.replace(partial_path, output_path)
+    return None
+
+#The md5 checksums shipped in the package (lines of "checksum  path"), by path.
+def read_checksums(text):
+    checksums = dict()
+    for line in text.splitlines():
+        x = line.split()
+        if len(x) == 2:
+            checksums[os.path.normpath(x[1])] = x[0].lower()
+    return checksums
+
+#The sizes of the files fetched by datasets rehydrate (lines of "url<tab>size<tab>path", paths relative to ncbi_dataset), by path.
+def read_sizes(text):
+    sizes = dict()
+    for line in text.splitlines():
+        x = line.split('\t')
+        if len(x) == 3 and x[1].strip().isdigit():
+            path = os.path.normpath(x[2].strip())
+            if not path.startswith('ncbi_dataset' + os.sep):
+                path = os.path.join('ncbi_dataset', path)
+            sizes[path] = int(x[1])
+    return sizes
+
+#Read the member list, the md5 checksums, and (for rehydrated packages) the expected sizes of the package.
+sizes = dict()
+if package_dir:
+    members = sorted(os.path.normpath(os.path.relpath(os.path.join(root, name), sys.argv[1])) for root, dirs, names in os.walk(sys.argv[1]) for name in names if name.endswith('.fna'))
+    checksums = dict()
+    if os.path.isfile(os.path.join(sys.argv[1], 'md5sum.txt')):
+        with open(os.path.join(sys.argv[1], 'md5sum.txt'), 'r') as f:
+            checksums = read_checksums(f.read())
+    if os.path.isfile(os.path.join(sys.argv[1], 'ncbi_dataset', 'fetch.txt')):
+        with open(os.path.join(sys.argv[1], 'ncbi_dataset', 'fetch.txt'), 'r') as f:
+            sizes = read_sizes(f.read())
+    #Files that were to be fetched but are not there are taken as corrupted (see extract).
+    members += sorted(path for path in sizes if path.endswith('.fna') and path not in members)
+else:
+    try:
+        with zipfile.ZipFile(sys.argv[1]) as package:
+            members = [info.filename for info in package.infolist() if info.filename.endswith('.fna')]
+            checksums = dict()
+            if 'md5sum.txt' in package.namelist():
+                checksums = read_checksums(package.read('md5sum.txt').decode())
+    except zipfile.BadZipFile:
+        print('Input file is not a valid zip file. Exiting.')
+        sys.exit(1)
+print(str(len(members)) + ' contig file(s) found in the package. Extracting.')
+
+with ThreadPoolExecutor(max_workers=threads) as executor:
+    corrupted = [assembly for assembly in executor.map(lambda member: extract(member, checksums.get(os.path.normpath(member)), sizes.get(os.path.normpath(member))), members) if assembly is not None]
+
+with open(sys.argv[3], 'w') as retry:
+    for assembly in sorted(set(corrupted)):
+        retry.write(assembly + '\n')
+
+print(str(len(members) - len(corrupted)) + ' contig file(s) extracted, ' + str(len(corrupted)) + ' corrupted.')
+print('All done!')
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module keeps the cost records of doggo_fetch.py runs (<stem>.costs, in the run directory) and turns them into estimates for pickgenomes_dry.py: download volume and time, disk space for the contigs and ORFs, and CPU time for ORF prediction, all from the total genome size (GTDB metadata) of the genomes picked.
+#It is imported by the scripts in this directory and is not meant to be run on its own.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: Costs are calibrated as rates per base (or bytes per second for downloads), summed over all records given. Without records, the default rates below are used (typical for prokaryotic genomes, one 2020s laptop core, and a fast connection).
+
+#Dependencies
+#NONE
+
+import os
+import re
+
+#Fields of a cost record, in the order they are written. Bases are the total genome size in the GTDB metadata.
+cost_fields = ('genomes', 'bases', 'contigs_bytes', 'downloaded_genomes', 'downloaded_bases', 'downloaded_bytes', 'download_seconds', 'orfs_bytes', 'predicted_genomes', 'predicted_bases', 'orf_cpu_seconds')
+
+default_rates = {'contigs_bytes_per_base': 0.3,
+                 'orfs_bytes_per_base': 1.8,
+                 'cpu_seconds_per_base': 1.5e-6,
+                 'download_bytes_per_second': 2e7}
+
+#The summary line predictorfs.py prints, so doggo_fetch.py can read the CPU time of ORF prediction from the contigs2orfs log.
+prediction_summary = re.compile(r'^CPU time of ORF prediction: ([0-9.]+) seconds for ([0-9]+) predicted genome\(s\) \(([0-9]+) bases\)\.$')
+
+def prediction_line(cpu_seconds, genomes, bases):
+    return 'CPU time of ORF prediction: ' + str(round(cpu_seconds, 2)) + ' seconds for ' + str(genomes) + ' predicted genome(s) (' + str(bases) + ' bases).'
+
+#The CPU seconds, genomes, and bases of all summary lines in a log (0 if there are none).
+def read_prediction_summary(log_path):
+    cpu_seconds, genomes, bases = 0.0, 0, 0
+    if not os.path.isfile(log_path):
+        return cpu_seconds, genomes, bases
+    with open(log_path, 'r') as log:
+        for line in log:
+            match = prediction_summary.match(line.strip())
+            if match:
+                cpu_seconds += float(match.group(1))
+                genomes += int(match.group(2))
+                bases += int(match.group(3))
+    return round(cpu_seconds, 2), genomes, bases
+
+#Total size of the files in a directory tree.
+def directory_bytes(directory):
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+#A cost record is two tab-delimited lines: the field names and the values.
+def write_costs(record, path):
+    with open(path, 'w') as costs:
+        costs.write('\t'.join(cost_fields) + '\n')
+        costs.write('\t'.join(str(record.get(field, 0)) for field in cost_fields) + '\n')
+
+#Read the cost records of <paths>: .costs files, or directories searched for them (e.g., a directory of _fetch run directories). Unreadable records are skipped.
+def read_costs(paths):
+    cost_files = list()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                cost_files.extend(os.path.join(root, filename) for filename in sorted(files) if filename.endswith('.costs'))
+        elif os.path.isfile(path):
+            cost_files.append(path)
+    records = list()
+    for cost_file in cost_files:
+        try:
+            with open(cost_file, 'r') as costs:
+                lines = costs.read().splitlines()
+            records.append({field: float(value) for field, value in zip(lines[0].split('\t'), lines[1].split('\t')) if field in cost_fields})
+        except (OSError, IndexError, ValueError):
+            continue
+    return records
+
+#Rates from cost records, as ratios of sums. Rates without any data in the records keep their defaults. Returns the rates and, per rate, the number of records it is based on.
+def calibrate(records):
+    rates = dict(default_rates)
+    based_on = {rate: 0 for rate in rates}
+    pairs = {'contigs_bytes_per_base': ('contigs_bytes', 'bases'),
+             'orfs_bytes_per_base': ('orfs_bytes', 'bases'),
+             'cpu_seconds_per_base': ('orf_cpu_seconds', 'predicted_bases'),
+             'download_bytes_per_second': ('downloaded_bytes', 'download_seconds')}
+    for rate, (numerator, denominator) in pairs.items():
+        used = [record for record in records if record.get(numerator, 0) > 0 and record.get(denominator, 0) > 0]
+        if used:
+            rates[rate] = sum(record[numerator] for record in used) / sum(record[denominator] for record in used)
+            based_on[rate] = len(used)
+    return rates, based_on
+
+#Costs of fetching genomes with a total size of <bases>, as a dictionary of download bytes and seconds, disk bytes of the contigs and ORFs, and CPU seconds of ORF prediction.
+def estimate(bases, rates):
+    return {'download_bytes': bases * rates['contigs_bytes_per_base'],
+            'download_seconds': bases * rates['contigs_bytes_per_base'] / rates['download_bytes_per_second'],
+            'contigs_bytes': bases * rates['contigs_bytes_per_base'],
+            'orfs_bytes': bases * rates['orfs_bytes_per_base'],
+            'cpu_seconds': bases * rates['cpu_seconds_per_base']}
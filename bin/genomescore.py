@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module computes genome quality scores for pickgenomes.py over whole metadata columns with NumPy. It is imported by the scripts in this directory and is not meant to be run on its own.
+#A score is either one of the named scores below or an arithmetic expression over the numeric metadata columns (completeness, contamination, strain_heterogeneity, contig_count, genome_size, n50), e.g. "completeness-5*contamination+log10(n50)".
+#Expressions may use numbers, + - * / ** %, comparisons (which count as 1 or 0), parentheses, and the functions log10, log, log2, sqrt, abs, minimum, and maximum. Nothing else is allowed.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: Genomes whose score is not a number (e.g. missing N50) get the lowest possible score, so they are only picked when nothing else is left.
+
+#Dependencies
+#1) NumPy (https://numpy.org/install/)
+
+import ast
+
+import numpy as np
+
+from gtdbmetadata import cached_columns
+
+#Named scores. drep is the default and is identical to the genome quality score used by dRep.
+named_scores = {'drep': '1*completeness-5*contamination+1*(contamination*(strain_heterogeneity/100))+0.5*log10(n50)+0*log10(genome_size)',
+                'checkm': 'completeness-5*contamination',
+                'completeness': 'completeness-contamination',
+                'contiguity': 'log10(n50)-log10(contig_count)'}
+default_score = 'drep'
+
+score_functions = {'log10': np.log10,
+                   'log': np.log,
+                   'log2': np.log2,
+                   'sqrt': np.sqrt,
+                   'abs': np.abs,
+                   'minimum': np.minimum,
+                   'maximum': np.maximum}
+
+#The numeric metadata columns an expression can use.
+score_columns = [name for name, (index, kind) in cached_columns.items() if kind == 'f64']
+
+allowed_nodes = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+                 ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd,
+                 ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq)
+
+#Turn a score name or expression into (expression, compiled expression). Raises ValueError with a readable message if the expression is not allowed.
+def parse_score(score):
+    expression = named_scores.get(score, score)
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError:
+        raise ValueError('Score "' + score + '" is neither a named score (' + ', '.join(named_scores) + ') nor a valid expression.')
+    for node in ast.walk(tree):
+        if not isinstance(node, allowed_nodes):
+            raise ValueError('Score expression "' + expression + '" contains something other than numbers, columns, operators, and functions.')
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise ValueError('Score expression "' + expression + '" contains a constant that is not a number.')
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id not in score_functions or node.keywords):
+            raise ValueError('Score expression "' + expression + '" calls a function other than: ' + ', '.join(score_functions) + '.')
+        if isinstance(node, ast.Name) and node.id not in score_columns and node.id not in score_functions:
+            raise ValueError('Score expression "' + expression + '" uses "' + node.id + '", which is not one of the columns: ' + ', '.join(score_columns) + '.')
+    return expression, compile(tree, '<score>', 'eval')
+
+#Score every genome in the metadata at once. Returns a float64 array in metadata order.
+def compute_scores(metadata, score = default_score):
+    expression, code = parse_score(score)
+    namespace = dict(score_functions)
+    for name in score_columns:
+        namespace[name] = np.frombuffer(metadata.column(name), dtype=np.float64, count=metadata.rows)
+    with np.errstate(all='ignore'):
+        scores = np.asarray(eval(code, {'__builtins__': {}}, namespace), dtype=np.float64)
+    scores = np.array(np.broadcast_to(scores, (metadata.rows,)))
+    scores[np.isnan(scores)] = -np.inf
+    return scores
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module is the local genome store shared by doggo_fetch.py and doggo_herd.py runs (-store). It keeps the contigs of every genome downloaded, keyed by the Genbank assembly accession and version actually downloaded (e.g., GCA_011362025.1, see extractcontigs.py), and the Pyrodigal output of every genome, keyed by accession, version, and Genetic Code. Local genomes (doggo_herd.py) have no assembly version, so their Pyrodigal output is keyed by a checksum of their contigs, the Pyrodigal version, and the Genetic Code instead (see predictorfs.py).
+#Runs take the genomes and ORFs they need from the store and only download and predict the rest, which are then added to the store.
+#The store can be given a size cap. The least recently used genomes and ORFs are removed until the store is smaller than the cap.
+#Run on its own, it reports the size of a store and, optionally, reduces it to a size cap.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: Entries are written under a temporary name and renamed when complete, so several runs can use the same store at the same time. Eviction is done by one run at a time (lock file).
+#NOTE 3: Contigs are hard-linked between the store and the runs when they are on the same file system, so a genome used by a run takes no extra disk space.
+
+#Dependencies
+#NONE
+
+import fcntl
+import os
+import shutil
+import sys
+import tempfile
+
+#Store layout: contigs/<accession.version>.fna.gz (gzip-compressed, as downloaded) and orfs/code<Genetic Code>/<accession.version or contigs checksum_pyrodigal<version>>/ (orfs.faa, orfs.ffn, orfs.gbk, and the log of the Pyrodigal run).
+orf_files = ('orfs.faa', 'orfs.ffn', 'orfs.gbk', 'log')
+
+#Hard-link a file if possible, otherwise copy it.
+def link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+class GenomeStore:
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.contigs_dir = os.path.join(store_dir, 'contigs')
+        self.orfs_dir = os.path.join(store_dir, 'orfs')
+        os.makedirs(self.contigs_dir, exist_ok=True)
+        os.makedirs(self.orfs_dir, exist_ok=True)
+
+    #Mark an entry as used now. The modification time of the entry is its last use.
+    def touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    #Put the contigs of <key> in <target>. Returns False if the store doesn't have them (or they were evicted while being taken).
+    def get_contigs(self, key, target):
+        path = os.path.join(self.contigs_dir, key + '.fna.gz')
+        try:
+            link_or_copy(path, target)
+        except OSError:
+            return False
+        self.touch(path)
+        return True
+
+    #The versions of the contigs in the store, by versionless assembly (e.g., GCA_011362025: [1, 2]).
+    def contig_versions(self):
+        versions = dict()
+        for genome_file in os.listdir(self.contigs_dir):
+            if genome_file.startswith('.') or not genome_file.endswith('.fna.gz'):
+                continue
+            assembly, _, version = genome_file[:-len('.fna.gz')].rpartition('.')
+            if version.isdigit():
+                versions.setdefault(assembly, list()).append(int(version))
+        return versions
+
+    def add_contigs(self, key, source):
+        path = os.path.join(self.contigs_dir, key + '.fna.gz')
+        if os.path.isfile(path):
+            self.touch(path)
+            return
+        partial_path = os.path.join(self.contigs_dir, '.' + key + '.' + str(os.getpid()) + '.part')
+        link_or_copy(source, partial_path)
+        os.replace(partial_path, path)
+
+    def orfs_path(self, key, translation_table):
+        return os.path.join(self.orfs_dir, 'code' + str(translation_table), key)
+
+    #The ORF files and log of <key> with <translation_table>, as a dictionary of file name to contents. Returns None if the store doesn't have them.
+    def get_orfs(self, key, translation_table):
+        path = self.orfs_path(key, translation_table)
+        orfs = dict()
+        try:
+            for orf_file in orf_files:
+                with open(os.path.join(path, orf_file), 'r') as f:
+                    orfs[orf_file] = f.read()
+        except OSError:
+            return None
+        self.touch(path)
+        return orfs
+
+    #Add ORF files and a log to the store. <files> is a dictionary with one path per file name of orf_files, and <log> the log of the Pyrodigal run.
+    def add_orfs(self, key, translation_table, files, log):
+        path = self.orfs_path(key, translation_table)
+        if os.path.isdir(path):
+            self.touch(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = tempfile.mkdtemp(prefix='.' + key + '.', dir=os.path.dirname(path))
+        for orf_file, source in files.items():
+            shutil.copyfile(source, os.path.join(partial_path, orf_file))
+        with open(os.path.join(partial_path, 'log'), 'w') as f:
+            f.write(log)
+        try:
+            os.rename(partial_path, path)
+        except OSError:
+            #Another run added the same ORFs in the meantime.
+            shutil.rmtree(partial_path, ignore_errors=True)
+
+    #All entries as (last use, size, path) tuples.
+    def entries(self):
+        entries = list()
+        with os.scandir(self.contigs_dir) as contigs:
+            for entry in contigs:
+                if not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        for code_dir in os.listdir(self.orfs_dir):
+            with os.scandir(os.path.join(self.orfs_dir, code_dir)) as orfs:
+                for entry in orfs:
+                    if not entry.name.startswith('.'):
+                        size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                        entries.append((entry.stat().st_mtime, size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for last_use, size, path in self.entries())
+
+    #Remove the least recently used entries until the store is not larger than <max_bytes>. Returns the number of entries removed and the size of the store.
+    def evict(self, max_bytes):
+        with open(os.path.join(self.store_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = sorted(self.entries())
+            total = sum(size for last_use, size, path in entries)
+            removed = 0
+            for last_use, size, path in entries:
+                if total <= max_bytes:
+                    break
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+                total -= size
+                removed += 1
+        return removed, total
+
+#Size cap given in GB (decimal, as for disks). Returns None if it is not a positive number.
+def parse_size(size):
+    try:
+        size = float(size)
+    except ValueError:
+        return None
+    if size <= 0:
+        return None
+    return int(size * 1e9)
+
+if __name__ == '__main__':
+    print('#Script: genomestore.py')
+    print('#Version: v20241212')
+    print('#Usage: python genomestore.py <store_dir> <max_size>')
+    print('#<store_dir> must be the directory of a genome store, as given to doggo_fetch.py or doggo_herd.py with -store. (required)')
+    print('#<max_size> must be the size cap of the store in GB. If given, the least recently used genomes and ORFs are removed until the store is smaller. (optional)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    if len(sys.argv) == 2 or len(sys.argv) == 3:
+        print(str((len(sys.argv)-1)) + ' argument(s) found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    if os.path.isdir(sys.argv[1]) == True:
+        print('Store directory found. Proceeding.')
+    else:
+        print('Store directory not found. Exiting.')
+        sys.exit(1)
+
+    store = GenomeStore(sys.argv[1])
+    entries = store.entries()
+    print('Store contains ' + str(len(os.listdir(store.contigs_dir))) + ' genome(s) and ' + str(len(entries) - len(os.listdir(store.contigs_dir))) + ' ORF set(s), ' + str(round(sum(size for last_use, size, path in entries) / 1e9, 3)) + ' GB in total.')
+
+    if len(sys.argv) == 3:
+        max_bytes = parse_size(sys.argv[2])
+        if max_bytes is None:
+            print('Size cap must be a positive number. Exiting.')
+            sys.exit(1)
+        removed, total = store.evict(max_bytes)
+        print(str(removed) + ' least recently used entries removed. Store is now ' + str(round(total / 1e9, 3)) + ' GB.')
+
+    print('All done!')
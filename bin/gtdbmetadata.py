@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module converts a GTDB metadata file once into a compact columnar cache and loads it memory-mapped. doggo_fetch.py, pickgenomes.py, pickgenomes_dry.py, and createignore.sh all load the metadata through it.
+#Only the columns WhereDoGGo? uses are kept: accession, completeness, contamination, strain heterogeneity, contig count, genome size, the representative flag, GTDB taxonomy, and N50.
+#The cache is keyed by the SHA-256 checksum of the metadata file, so an edited or newer metadata file always gets a new cache. It is written to a .doggocache directory next to the metadata file (or ~/.cache/wheredoggo if that directory is not writable).
+#Run on its own, it builds the cache for a metadata file and, optionally, writes the versionless Genbank assemblies of a taxon (used by createignore.sh).
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The checksum is only recomputed if the size or modification time of the metadata file changed since the last run.
+
+#Dependencies
+#NONE
+
+import array
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+
+cache_version = 1
+
+#Columns kept in the cache. Key = column name, value = (field index in GTDB metadata, type). Numbers are stored as doubles (NaN if not a number) and the representative flag as one byte (1 for 't').
+cached_columns = {'accession': (0, 'str'),
+                  'completeness': (2, 'f64'),
+                  'contamination': (3, 'f64'),
+                  'strain_heterogeneity': (10, 'f64'),
+                  'contig_count': (13, 'f64'),
+                  'genome_size': (16, 'f64'),
+                  'representative': (18, 'flag'),
+                  'taxonomy': (19, 'str'),
+                  'n50': (47, 'f64')}
+min_fields = max(index for index, kind in cached_columns.values()) + 1
+
+#Rows are written to the cache files in blocks of this size, so memory stays flat while converting.
+flush_rows = 65536
+
+def cache_roots(metadata_path):
+    return [os.path.join(os.path.dirname(os.path.abspath(metadata_path)), '.doggocache'),
+            os.path.join(os.path.expanduser('~'), '.cache', 'wheredoggo')]
+
+def file_checksum(path):
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(4194304), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+#Checksum of the metadata file. Each cache root remembers the size, modification time, and checksum of the metadata files it has seen.
+def metadata_checksum(metadata_path):
+    stat = os.stat(metadata_path)
+    stamp = str(stat.st_size) + '\t' + str(stat.st_mtime_ns)
+    stamp_name = hashlib.sha1(os.path.realpath(metadata_path).encode()).hexdigest() + '.stat'
+    for root in cache_roots(metadata_path):
+        try:
+            with open(os.path.join(root, stamp_name), 'r') as stamp_file:
+                x = stamp_file.read().strip().split('\t')
+            if '\t'.join(x[:2]) == stamp:
+                return x[2]
+        except (OSError, IndexError):
+            pass
+    checksum = file_checksum(metadata_path)
+    for root in cache_roots(metadata_path):
+        try:
+            os.makedirs(root, exist_ok=True)
+            with open(os.path.join(root, stamp_name + '.' + str(os.getpid())), 'w') as stamp_file:
+                stamp_file.write(stamp + '\t' + checksum + '\n')
+            os.replace(os.path.join(root, stamp_name + '.' + str(os.getpid())), os.path.join(root, stamp_name))
+            break
+        except OSError:
+            pass
+    return checksum
+
+def parse_number(field):
+    try:
+        return float(field)
+    except ValueError:
+        return float('nan')
+
+#Convert the metadata file into the cache directory in one streaming pass. The cache is written under a temporary name and renamed when complete, so an interrupted conversion is never picked up.
+def build_cache(metadata_path, cache_dir, checksum):
+    temp_dir = cache_dir + '.tmp' + str(os.getpid())
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    outputs = dict()
+    buffers = dict()
+    for name, (index, kind) in cached_columns.items():
+        if kind == 'str':
+            outputs[name] = (open(os.path.join(temp_dir, name + '.data'), 'wb'), open(os.path.join(temp_dir, name + '.offsets'), 'wb'))
+            buffers[name] = (bytearray(), array.array('q'))
+        elif kind == 'f64':
+            outputs[name] = open(os.path.join(temp_dir, name + '.f64'), 'wb')
+            buffers[name] = array.array('d')
+        else:
+            outputs[name] = open(os.path.join(temp_dir, name + '.flag'), 'wb')
+            buffers[name] = bytearray()
+    string_offsets = {name: 0 for name, (index, kind) in cached_columns.items() if kind == 'str'}
+    for name in string_offsets:
+        buffers[name][1].append(0)
+
+    def flush():
+        for name, (index, kind) in cached_columns.items():
+            if kind == 'str':
+                outputs[name][0].write(buffers[name][0])
+                buffers[name][1].tofile(outputs[name][1])
+                del buffers[name][0][:]
+                del buffers[name][1][:]
+            elif kind == 'f64':
+                buffers[name].tofile(outputs[name])
+                del buffers[name][:]
+            else:
+                outputs[name].write(buffers[name])
+                del buffers[name][:]
+
+    rows = 0
+    all_representative = True
+    with open(metadata_path, 'rb') as metadata:
+        for line_number, line in enumerate(metadata, 1):
+            x = line.rstrip(b'\r\n').split(b'\t')
+            if x == [b'']:
+                continue
+            if len(x) < min_fields:
+                print('Line ' + str(line_number) + ' of ' + metadata_path + ' has fewer than ' + str(min_fields) + ' tab-delimited fields. Input file is not GTDB metadata. Exiting.')
+                sys.exit(1)
+            for name, (index, kind) in cached_columns.items():
+                if kind == 'str':
+                    buffers[name][0].extend(x[index])
+                    string_offsets[name] += len(x[index])
+                    buffers[name][1].append(string_offsets[name])
+                elif kind == 'f64':
+                    buffers[name].append(parse_number(x[index]))
+                else:
+                    buffers[name].append(1 if x[index] == b't' else 0)
+                    if x[index] != b't':
+                        all_representative = False
+            rows += 1
+            if rows % flush_rows == 0:
+                flush()
+    flush()
+    for output in outputs.values():
+        for f in (output if isinstance(output, tuple) else (output,)):
+            f.close()
+    stat = os.stat(metadata_path)
+    with open(os.path.join(temp_dir, 'cache.json'), 'w') as info:
+        json.dump({'version': cache_version, 'checksum': checksum, 'source': os.path.abspath(metadata_path), 'size': stat.st_size, 'rows': rows, 'all_representative': all_representative, 'columns': cached_columns}, info, indent=1)
+    #A cache of another version (or an incomplete one) under the same name is replaced, otherwise it would be in the way forever.
+    if os.path.isdir(cache_dir) and not cache_is_complete(cache_dir):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    try:
+        os.rename(temp_dir, cache_dir)
+    except OSError: #Another run finished the same cache first.
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+#A cache is only used if it has the current version and exactly the columns kept now (JSON stores the column tuples as lists).
+def cache_is_complete(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'cache.json'), 'r') as info:
+            x = json.load(info)
+        return x.get('version') == cache_version and x.get('columns') == {name: list(column) for name, column in cached_columns.items()}
+    except (OSError, ValueError):
+        return False
+
+class GTDBMetadata:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, 'cache.json'), 'r') as info:
+            self.info = json.load(info)
+        self.rows = self.info['rows']
+        self.all_representative = self.info['all_representative']
+        self.columns = dict()
+        self.offsets = dict()
+        for name, (index, kind) in cached_columns.items():
+            if kind == 'str':
+                self.columns[name] = self.map(name + '.data')
+                self.offsets[name] = self.map(name + '.offsets').cast('q')
+            elif kind == 'f64':
+                self.columns[name] = self.map(name + '.f64').cast('d')
+            else:
+                self.columns[name] = self.map(name + '.flag')
+
+    #Memory-map one cache file read-only. mmap cannot map empty files, so these become empty views.
+    def map(self, filename):
+        with open(os.path.join(self.cache_dir, filename), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b'')
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return self.rows
+
+    def text(self, name, row):
+        offsets = self.offsets[name]
+        return bytes(self.columns[name][offsets[row]:offsets[row + 1]]).decode()
+
+    #All values of a text column, in metadata order.
+    def strings(self, name):
+        offsets = self.offsets[name]
+        data = self.columns[name]
+        for row in range(self.rows):
+            yield bytes(data[offsets[row]:offsets[row + 1]]).decode()
+
+    def column(self, name):
+        return self.columns[name]
+
+#Load GTDB metadata through its cache, converting it first if this metadata file has not been seen before.
+def load_metadata(metadata_path):
+    checksum = metadata_checksum(metadata_path)
+    for root in cache_roots(metadata_path):
+        if cache_is_complete(os.path.join(root, checksum)):
+            return GTDBMetadata(os.path.join(root, checksum))
+    print('Converting metadata into columnar cache (only done once per metadata file).')
+    for root in cache_roots(metadata_path):
+        try:
+            os.makedirs(root, exist_ok=True)
+            build_cache(metadata_path, os.path.join(root, checksum), checksum)
+        except OSError:
+            continue
+        if cache_is_complete(os.path.join(root, checksum)):
+            return GTDBMetadata(os.path.join(root, checksum))
+    #No writable cache location: convert into a temporary directory for this run only.
+    temp_root = tempfile.mkdtemp(prefix='doggocache')
+    build_cache(metadata_path, os.path.join(temp_root, checksum), checksum)
+    return GTDBMetadata(os.path.join(temp_root, checksum))
+
+#Validate the metadata for a taxonomic level in a single streaming pass over the taxonomy column. Returns a small record: whether the metadata is parsed (representative genomes only), whether <tax_level> is a valid taxon, and the domain of <tax_level>.
+#The record can be saved with write_validation and handed to pickgenomes.py, so the same checks are not repeated.
+def validate_metadata(metadata, tax_level):
+    record = {'checksum': metadata.info['checksum'],
+              'tax_level': tax_level,
+              'parsed': metadata.all_representative,
+              'level_valid': False,
+              'domain': None}
+    for taxonomy in metadata.strings('taxonomy'):
+        if not record['level_valid'] and tax_level + ';' in taxonomy:
+            record['level_valid'] = True
+        if record['domain'] is None and tax_level in taxonomy:
+            domain = taxonomy.split(';', 1)[0]
+            if domain == 'd__Archaea':
+                record['domain'] = 'Archaea'
+            elif domain == 'd__Bacteria':
+                record['domain'] = 'Bacteria'
+        if record['level_valid'] and record['domain'] is not None:
+            break
+    return record
+
+def write_validation(record, path):
+    with open(path, 'w') as validation:
+        json.dump(record, validation, indent=1)
+
+#Read a validation record. It is only returned if it was made for the same metadata (by checksum) and taxonomic level, otherwise None.
+def read_validation(path, metadata, tax_level):
+    try:
+        with open(path, 'r') as validation:
+            record = json.load(validation)
+    except (OSError, ValueError):
+        return None
+    if record.get('checksum') == metadata.info['checksum'] and record.get('tax_level') == tax_level:
+        return record
+    return None
+
+#Versionless Genbank assembly of a GTDB accession e.g., RS_GCF_000008085.1 becomes GCA_000008085.
+def versionless_genbank(accession):
+    accession = accession[3:].rsplit('.', 1)[0]
+    return 'GCA_' + accession[4:] if accession.startswith('GCF_') else accession
+
+#Genbank assembly with its version of a GTDB accession e.g., RS_GCF_000008085.1 becomes GCA_000008085.1 (used to look up genomes in the genome store, see doggo_fetch.py). For RefSeq accessions, the version is that of RefSeq, which can differ from the Genbank version.
+def versioned_genbank(accession):
+    accession = accession[3:]
+    return 'GCA_' + accession[4:] if accession.startswith('GCF_') else accession
+
+if __name__ == '__main__':
+    print('#Script: gtdbmetadata.py')
+    print('#Version: v20241212')
+    print('#Usage: python gtdbmetadata.py <input_tsv> <taxon> <output_file>')
+    print('#<input_tsv> must be a tab-delimited file as per GTDB\'s metadata files for Bacteria or Archaea. Its columnar cache is created if it does not exist. (required)')
+    print('#<taxon> must be a GTDB taxon. The versionless Genbank assemblies of all genomes whose GTDB taxonomy contains <taxon> are written to <output_file>. (optional)')
+    print('#<output_file> must be the name of the output file for <taxon>. (required if <taxon> is given)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    if len(sys.argv) == 2 or len(sys.argv) == 4:
+        print(str((len(sys.argv)-1)) + ' argument(s) found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    if os.path.isfile(sys.argv[1]) == True:
+        print('Input file found. Proceeding.')
+    else:
+        print('Input file not found. Exiting.')
+        sys.exit(1)
+
+    metadata = load_metadata(sys.argv[1])
+    print('Columnar cache for ' + str(len(metadata)) + ' metadata lines found in ' + metadata.cache_dir + '.')
+
+    if len(sys.argv) == 4:
+        print('Writing the assemblies of ' + sys.argv[2] + '.')
+        with open(sys.argv[3], 'w') as assemblies:
+            for row, taxonomy in enumerate(metadata.strings('taxonomy')):
+                if sys.argv[2] in taxonomy:
+                    assemblies.write(versionless_genbank(metadata.text('accession', row)) + '\n')
+
+    print('All done!')
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module keeps track of the genome files processed by a doggo_herd.py run (<project>.herdstate, in the run directory), so that doggo_herd.py -update (and -watch) only processes the genome files that are new or whose contents changed since, and appends them to the run directory.
+#It is imported by doggo_herd.py and is not meant to be run on its own.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: Files are compared by their SHA-256 checksum. A file is only read again if its size or modification time differ from those recorded, so unchanged files are not read at every update.
+#NOTE 3: New genomes get dummy assemblies following the last one of the run. Changed genomes keep theirs, and their old records are replaced by the new ones. Genome files that were removed from the location stay in the run.
+#NOTE 4: Duplicate genome files (see createrecords.py) are kept in the state with "-" as their assembly, so they are not taken as new at every update.
+
+#Dependencies
+#NONE
+
+import hashlib
+import os
+
+from createrecords import first_counter
+
+#Fields of the state file, in the order they are written. The assembly is the dummy assembly of the genome (first column of the .assembliesnames file).
+state_fields = ('file', 'assembly', 'size', 'mtime_ns', 'sha256')
+
+def file_checksum(path):
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+#Read a state file into a dictionary of genome file to record (empty if there is no state file).
+def read_state(path):
+    state = dict()
+    if not os.path.isfile(path):
+        return state
+    with open(path, 'r') as f:
+        for line in f:
+            x = line.rstrip('\n').split('\t')
+            if len(x) != len(state_fields) or x[0] == state_fields[0]:
+                continue
+            state[x[0]] = {'assembly': x[1], 'size': int(x[2]), 'mtime_ns': int(x[3]), 'sha256': x[4]}
+    return state
+
+#The state file is written under a temporary name and renamed when complete, so an interrupted update keeps the previous state.
+def write_state(state, path):
+    with open(path + '.part', 'w') as f:
+        f.write('\t'.join(state_fields) + '\n')
+        for genome_file in sorted(state):
+            record = state[genome_file]
+            f.write('\t'.join([genome_file, record['assembly'], str(record['size']), str(record['mtime_ns']), record['sha256']]) + '\n')
+    os.replace(path + '.part', path)
+
+#The genome files of a location, in the order createrecords.py numbers them.
+def genome_files(location, extension):
+    return sorted(fname for fname in os.listdir(location) if fname.endswith(extension) and os.path.isfile(os.path.join(location, fname)))
+
+#State records for the genome files of a run, from its .assembliesnames file (<assembly>\t<file name without extension>). Genome files no longer in the location are left out.
+#The file checksums of the run (see createrecords.py), if any, are used instead of reading the genome files again, and the genome files without records in them are duplicates.
+def initial_state(location, extension, assembliesnames, checksums=None):
+    checksums = checksums or dict()
+    state = dict()
+    with open(assembliesnames, 'r') as f:
+        for line in f:
+            x = line.rstrip('\n').split('\t')
+            if len(x) < 2:
+                continue
+            path = os.path.join(location, x[1] + extension)
+            if not os.path.isfile(path):
+                continue
+            size, mtime_ns = file_stamp(path)
+            state[x[1] + extension] = {'assembly': x[0], 'size': size, 'mtime_ns': mtime_ns, 'sha256': checksums[x[1] + extension][0] if x[1] + extension in checksums else file_checksum(path)}
+    for genome_file in checksums:
+        path = os.path.join(location, genome_file)
+        if genome_file not in state and os.path.isfile(path):
+            size, mtime_ns = file_stamp(path)
+            state[genome_file] = {'assembly': '-', 'size': size, 'mtime_ns': mtime_ns, 'sha256': checksums[genome_file][0]}
+    return state
+
+#Compare the genome files of a location with the state of the run. Returns the new and changed genome files (in the order of genome_files), with their records (the assembly of new files is None), and updates the stamps of the files that were touched but did not change.
+#With <settled>, a dictionary of genome file to stamp from the previous scan, only files whose stamp did not change since are returned, so files still being copied are left for the next scan. It is updated with the stamps of this scan.
+def scan(location, extension, state, settled=None):
+    new, changed = list(), list()
+    stamps = dict()
+    for genome_file in genome_files(location, extension):
+        path = os.path.join(location, genome_file)
+        try:
+            size, mtime_ns = file_stamp(path)
+        except OSError:
+            continue
+        stamps[genome_file] = (size, mtime_ns)
+        record = state.get(genome_file)
+        if record is not None and (record['size'], record['mtime_ns']) == (size, mtime_ns):
+            continue
+        if settled is not None and settled.get(genome_file) != (size, mtime_ns):
+            continue
+        checksum = file_checksum(path)
+        if record is not None and record['sha256'] == checksum:
+            record['size'], record['mtime_ns'] = size, mtime_ns
+            continue
+        if record is None or record['assembly'] == '-':
+            new.append((genome_file, {'assembly': None, 'size': size, 'mtime_ns': mtime_ns, 'sha256': checksum}))
+        else:
+            changed.append((genome_file, {'assembly': record['assembly'], 'size': size, 'mtime_ns': mtime_ns, 'sha256': checksum}))
+    if settled is not None:
+        settled.clear()
+        settled.update(stamps)
+    return new, changed
+
+#The counter of the next dummy assembly of a project.
+def next_counter(assemblies, project):
+    counters = [int(assembly[len(project):]) for assembly in assemblies if assembly.startswith(project) and assembly[len(project):].isdigit()]
+    return max(counters) + 1 if counters else first_counter
+
+#Write the (assembly, lines) blocks of the old file, except those of dropped assemblies, followed by all blocks of the new file (see refreshrun.py for the blocks of databases and pyrodigal logs).
+def append_blocks(old_blocks, new_blocks, output_path, dropped):
+    with open(output_path, 'w') as output:
+        for assembly, lines in old_blocks:
+            if assembly not in dropped:
+                output.writelines(lines)
+        for assembly, lines in new_blocks:
+            output.writelines(lines)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script writes the ignore and atypical lists of createignore.sh from the assemblies of a taxon and the NCBI assemblies of its domain (all, and excluding atypical), and looks up the organism names (and atypical warnings) of the assemblies in them on NCBI.
+#All lists are compared as sets in memory, and the lookups are done with one datasets call per batch of assemblies (--inputfile) instead of one per assembly.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The output files are the same as those createignore.sh wrote with per-assembly lookups: <output_stem>.ignore, .ignorenames, .ignorediff, .atypical, .atypicalnameswarnings, and .atypicaldiff. Lookup results are written in the order of the assemblies looked up.
+#NOTE 3: datasets and dataformat are called through the PATH, so the script can be tested offline with local stand-ins for them.
+
+#Dependencies
+#1) ncbi-datasets-cli (https://github.com/ncbi/datasets)
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+#Number of assemblies looked up per datasets call.
+lookup_batch = 1000
+
+#Versionless assemblies, as createignore.sh wrote them (the first .<version> is removed).
+def versionless(line):
+    return re.sub(r'^(.*?)\.\d+', r'\1', line, count=1)
+
+def read_lines(path):
+    with open(path, 'r') as f:
+        return [line.rstrip('\n') for line in f if line.rstrip('\n')]
+
+def write_lines(lines, path):
+    with open(path, 'w') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+#Look up <assemblies> on NCBI with the dataformat <fields>, in batches. Returns the versionless output lines, grouped by assembly in the order given. Assemblies without results (e.g., suppressed) have no lines.
+def lookup(assemblies, fields):
+    results = dict()
+    unique = list(dict.fromkeys(assemblies))
+    for start in range(0, len(unique), lookup_batch):
+        batch = unique[start:start + lookup_batch]
+        with tempfile.NamedTemporaryFile('w', suffix='.accessions', delete=False) as inputfile:
+            inputfile.write('\n'.join(batch) + '\n')
+        try:
+            command = 'datasets summary genome accession --inputfile ' + inputfile.name + ' --as-json-lines --assembly-source GenBank --assembly-version latest | dataformat tsv genome --fields ' + fields + ' --elide-header'
+            process = subprocess.run(['bash', '-o', 'pipefail', '-c', command], stdout=subprocess.PIPE, universal_newlines=True)
+        finally:
+            os.remove(inputfile.name)
+        if process.returncode != 0:
+            print('Lookup of ' + str(len(batch)) + ' assemblies returned an error. Assemblies without results will be in the diff file.')
+        for line in process.stdout.splitlines():
+            if line:
+                line = versionless(line)
+                results.setdefault(line.split('\t', 1)[0], list()).append(line)
+        print('Looked up ' + str(min(start + lookup_batch, len(unique))) + ' of ' + str(len(unique)) + ' assemblies.')
+    return [line for assembly in unique for line in results.get(assembly, [])]
+
+#Assemblies (in order) without a line in the lookup results.
+def missing(assemblies, lines):
+    found = set(line.split('\t', 1)[0] for line in lines)
+    return [assembly for assembly in assemblies if assembly not in found]
+
+if __name__ == '__main__':
+    print('#Script: ignorelists.py')
+    print('#Version: v20241212')
+    print('#Usage: python ignorelists.py <assemblies> <ncbi_all> <ncbi_noatypical> <output_stem>')
+    print('#<assemblies> must be a text file of versionless assemblies of a taxon (1/line). (required)')
+    print('#<ncbi_all> must be a text file of all versionless NCBI assemblies of the domain of the taxon (1/line). (required)')
+    print('#<ncbi_noatypical> must be a text file of all versionless NCBI assemblies of the domain of the taxon, excluding atypical (1/line). (required)')
+    print('#<output_stem> must be the stem of the output files (e.g., <domain>_<creation time>). (required)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    if len(sys.argv) == 5:
+        print(str((len(sys.argv)-1)) + ' arguments found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    for path in sys.argv[1:4]:
+        if os.path.isfile(path) == True:
+            print('Input file ' + path + ' found. Proceeding.')
+        else:
+            print('Input file ' + path + ' not found. Exiting.')
+            sys.exit(1)
+
+    output_stem = sys.argv[4]
+    assemblies = read_lines(sys.argv[1])
+    ncbi_all = set(read_lines(sys.argv[2]))
+    ncbi_noatypical = set(read_lines(sys.argv[3]))
+
+    #Assemblies not among the NCBI assemblies for the domain are ignored.
+    print('Writing all assemblies not among the NCBI assemblies to the .ignore file.')
+    ignore = [assembly for assembly in assemblies if assembly not in ncbi_all]
+    write_lines(ignore, output_stem + '.ignore')
+
+    #The organism names of the ignored assemblies confirm the most common reason for not finding an assembly (especially for Archaea), reassignment to a different domain.
+    print('Writing ignore assemblies and the NCBI organism names to the .ignorenames file.')
+    ignorenames = lookup(ignore, 'accession,organism-name')
+    write_lines(ignorenames, output_stem + '.ignorenames')
+
+    print('Checking for discrepancies between the assemblies in the .ignore and .ignorenames files. If there are any, writing them to the .ignorediff file. These are usually suppressed GenBank assemblies.')
+    write_lines(missing(ignore, ignorenames), output_stem + '.ignorediff')
+
+    #Assemblies neither among the non-atypical NCBI assemblies nor in the ignore list are atypical.
+    print('Writing all assemblies not among the non-atypical NCBI assemblies and not in the .ignore file to the .atypical file.')
+    ignore_set = set(ignore)
+    atypical = [assembly for assembly in assemblies if assembly not in ncbi_noatypical and assembly not in ignore_set]
+    write_lines(atypical, output_stem + '.atypical')
+
+    print('Writing atypical assemblies, organism names, and atypical warnings to the .atypicalnameswarnings file.')
+    atypicalnameswarnings = lookup(atypical, 'accession,organism-name,assminfo-atypicalwarnings')
+    write_lines(atypicalnameswarnings, output_stem + '.atypicalnameswarnings')
+
+    print('Checking for discrepancies between the assemblies in the .atypical and .atypicalnameswarnings files. If there are any, writing them to the .atypicaldiff file.')
+    write_lines(missing(atypical, atypicalnameswarnings), output_stem + '.atypicaldiff')
+
+    print(str(len(ignore)) + ' assemblies ignored (' + str(len(missing(ignore, ignorenames))) + ' not found by lookup), ' + str(len(atypical)) + ' atypical (' + str(len(missing(atypical, atypicalnameswarnings))) + ' not found by lookup).')
+    print('All done!')
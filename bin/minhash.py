@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module computes MinHash sketches of genomes with NumPy, from their proteomes (amino acid k-mers) or contigs (canonical nucleotide k-mers), and estimates the average amino acid or nucleotide identity (AAI/ANI) of two genomes from their sketches, as Mash does. It is used by dereplicate.py and is not meant to be run on its own.
+#Sketches are cached per genome, keyed by a checksum of its sequences, so genomes sketched before are not sketched again.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: A sketch is the <sketch_size> smallest distinct hashes of the k-mers of a genome (bottom-s sketch). The Jaccard index of two genomes is estimated from the smallest <sketch_size> hashes of both sketches together, and the identity from the Mash distance (-1/k*ln(2J/(1+J))).
+
+#Dependencies
+#1) NumPy (https://numpy.org/install/)
+
+import hashlib
+import math
+import os
+
+import numpy as np
+
+#Sketch parameters per kind of sequence. Amino acids are encoded in 5 bits and nucleotides in 2, so k-mers fit in 64 bits.
+sketch_kinds = {'protein': {'k': 9, 'bits': 5},
+                'nucleotide': {'k': 21, 'bits': 2}}
+default_sketch_size = 1000
+
+#Byte to code tables (0 for characters that are not part of k-mers, e.g., X, N, *, or line breaks).
+protein_table = np.zeros(256, dtype=np.uint64)
+for code, residue in enumerate(b'ACDEFGHIKLMNPQRSTVWY', 1):
+    protein_table[residue] = code
+    protein_table[residue + 32] = code
+nucleotide_table = np.zeros(256, dtype=np.uint64)
+for code, base in enumerate(b'ACGT', 1):
+    nucleotide_table[base] = code
+    nucleotide_table[base + 32] = code
+
+#64-bit mixing function (splitmix64), so the smallest hashes are a random sample of the k-mers.
+def mix64(x):
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+#The k-mers of a sequence of codes (0 = not part of k-mers) as integers, skipping k-mers with a 0.
+def kmer_values(codes, k, bits):
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    windows = len(codes) - k + 1
+    values = np.zeros(windows, dtype=np.uint64)
+    for i in range(k):
+        values = (values << np.uint64(bits)) | codes[i:i + windows]
+    gaps = np.concatenate(([0], np.cumsum(codes == 0)))
+    return values[gaps[k:] - gaps[:windows] == 0]
+
+#The bottom-s sketch of a genome and its size (residues or bases). <sequences> is the genome as bytes, with sequences separated by characters that are not part of k-mers (e.g., line breaks).
+def sketch_sequences(sequences, kind, sketch_size):
+    k = sketch_kinds[kind]['k']
+    bits = sketch_kinds[kind]['bits']
+    data = np.frombuffer(sequences, dtype=np.uint8)
+    if kind == 'protein':
+        codes = protein_table[data]
+        values = kmer_values(codes, k, bits)
+    else:
+        codes = nucleotide_table[data]
+        values = canonical_values(codes, k, bits)
+    size = int(np.count_nonzero(codes))
+    hashes = np.unique(mix64(values))[:sketch_size]
+    return hashes, size
+
+#Canonical nucleotide k-mers (the smaller of the k-mer and its reverse complement) of a sequence of codes (1-4 for A, C, G, T, 0 otherwise).
+def canonical_values(codes, k, bits):
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.uint64)
+    valid = codes > 0
+    bases = np.where(valid, codes - np.uint64(1), np.uint64(0))
+    complement = np.where(valid, np.uint64(3) - bases, np.uint64(0))
+    windows = len(codes) - k + 1
+    forward = np.zeros(windows, dtype=np.uint64)
+    reverse = np.zeros(windows, dtype=np.uint64)
+    for i in range(k):
+        forward = (forward << np.uint64(bits)) | bases[i:i + windows]
+        reverse = reverse | (complement[i:i + windows] << np.uint64(bits * i))
+    gaps = np.concatenate(([0], np.cumsum(~valid)))
+    keep = gaps[k:] - gaps[:windows] == 0
+    return np.minimum(forward, reverse)[keep]
+
+#Checksum of the sequences of a genome, the key of its sketch in the cache.
+def sequences_checksum(sequences):
+    return hashlib.sha1(sequences).hexdigest()
+
+class SketchCache:
+    def __init__(self, cache_dir, kind, sketch_size):
+        self.kind = kind
+        self.sketch_size = sketch_size
+        self.cache_dir = os.path.join(cache_dir, kind + '_k' + str(sketch_kinds[kind]['k']) + '_s' + str(sketch_size))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, checksum):
+        return os.path.join(self.cache_dir, checksum[:2], checksum + '.npy')
+
+    #The cached sketch and size of a genome, or None. The size is stored as the last value of the sketch.
+    def get(self, checksum):
+        try:
+            values = np.load(self.path(checksum))
+        except (OSError, ValueError):
+            return None
+        return values[:-1], int(values[-1])
+
+    #Sketches are written under a temporary name and renamed when complete, so several runs can share a cache.
+    def add(self, checksum, hashes, size):
+        path = self.path(checksum)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = path + '.' + str(os.getpid()) + '.part'
+        with open(partial_path, 'wb') as f:
+            np.save(f, np.append(hashes, np.uint64(size)))
+        os.replace(partial_path, path)
+
+#Sketch a genome or take its sketch from the cache. Returns the sketch, the size of the genome, and whether it was sketched now.
+def cached_sketch(cache_dir, kind, sketch_size, sequences):
+    cache = SketchCache(cache_dir, kind, sketch_size)
+    checksum = sequences_checksum(sequences)
+    cached = cache.get(checksum)
+    if cached is not None:
+        return cached[0], cached[1], False
+    hashes, size = sketch_sequences(sequences, kind, sketch_size)
+    cache.add(checksum, hashes, size)
+    return hashes, size, True
+
+#Jaccard index of two genomes, estimated from the smallest <sketch_size> hashes of both sketches together.
+def jaccard(sketch1, sketch2, sketch_size):
+    union = np.union1d(sketch1, sketch2)[:sketch_size]
+    if len(union) == 0:
+        return 0.0
+    shared = np.intersect1d(np.intersect1d(sketch1, sketch2, assume_unique=True), union, assume_unique=True)
+    return len(shared) / len(union)
+
+#Identity (ANI or AAI, 0-1) from a Jaccard index, through the Mash distance.
+def jaccard_identity(jaccard_index, kind):
+    if jaccard_index <= 0:
+        return 0.0
+    return 1 + math.log(2 * jaccard_index / (1 + jaccard_index)) / sketch_kinds[kind]['k']
+
+#The lowest Jaccard index of two genomes with at least <identity>.
+def identity_jaccard(identity, kind):
+    ratio = math.exp(-sketch_kinds[kind]['k'] * (1 - identity))
+    return ratio / (2 - ratio)
+
+#Pairs of genomes (indices in <sketches>) that may have at least <identity>, with the number of hashes their sketches share.
+#The shared hashes of all pairs are counted with NumPy: the hashes of all sketches are sorted, every two genomes with the same hash make a pair, and the pairs are counted <pairs_per_block> at a time so memory stays bounded.
+#Up to <dense_genomes> genomes, the counts of all pairs are kept in one array (all against all), otherwise only the counts of pairs that share hashes.
+#The estimated Jaccard index of two sketches is at most their shared hashes over the smallest union they can have, so no pair above <identity> is missed.
+pairs_per_block = 10000000
+dense_genomes = 4096
+
+def candidate_pairs(sketches, identity, kind, sketch_size):
+    min_jaccard = identity_jaccard(identity, kind)
+    genome_count = len(sketches)
+    if genome_count < 2:
+        return dict()
+    hashes = np.concatenate(sketches)
+    genomes = np.repeat(np.arange(genome_count, dtype=np.int64), [len(sketch) for sketch in sketches])
+    order = np.argsort(hashes, kind='stable')
+    hashes = hashes[order]
+    genomes = genomes[order]
+    #Each hash is paired with the later hashes of its group (the genomes of a sketch are distinct, so the pairs are too).
+    starts = np.flatnonzero(np.concatenate(([True], hashes[1:] != hashes[:-1])))
+    ends = np.append(starts[1:], len(hashes))
+    group_ends = np.repeat(ends, ends - starts)
+    later = group_ends - np.arange(len(hashes)) - 1
+    dense = genome_count <= dense_genomes
+    keys = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(genome_count * genome_count if dense else 0, dtype=np.int64)
+    pairs_done = np.concatenate(([0], np.cumsum(later)))
+    position = 0
+    while position < len(hashes):
+        #At least one hash per block, so a single group larger than a block still moves on.
+        block_end = max(int(np.searchsorted(pairs_done, pairs_done[position] + pairs_per_block, side='right')) - 1, position + 1)
+        block_later = later[position:block_end]
+        first = np.repeat(np.arange(position, block_end), block_later)
+        offsets = np.arange(len(first)) - np.repeat(np.cumsum(block_later) - block_later, block_later)
+        second = first + offsets + 1
+        first_genomes = genomes[first]
+        second_genomes = genomes[second]
+        block_keys = np.minimum(first_genomes, second_genomes) * genome_count + np.maximum(first_genomes, second_genomes)
+        if dense:
+            counts += np.bincount(block_keys, minlength=len(counts))
+        else:
+            keys, inverse = np.unique(np.concatenate((keys, block_keys)), return_inverse=True)
+            counts = np.bincount(inverse.ravel(), weights=np.concatenate((counts, np.ones(len(block_keys), dtype=np.int64))), minlength=len(keys)).astype(np.int64)
+        position = block_end
+    if dense:
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+    first_genomes = keys // genome_count
+    second_genomes = keys % genome_count
+    lengths = np.array([len(sketch) for sketch in sketches], dtype=np.int64)
+    smallest_union = np.minimum(sketch_size, np.maximum(lengths[first_genomes], lengths[second_genomes]))
+    keep = counts >= min_jaccard * smallest_union
+    return {(int(first), int(second)): int(count) for first, second, count in zip(first_genomes[keep], second_genomes[keep], counts[keep])}
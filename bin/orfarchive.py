@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script creates a local database for a set of genomes from the ORFs archive of a doggo_fetch or doggo_herd run (_orfs.tar.gz), instead of from the database of the run. Both assemblies found and not found are logged, as by subsampledb.sh, which uses it for ORFs archives.
+#Optionally, all ORF files of the genomes (including the Pyrodigal runs) are extracted to a directory, e.g., to rebuild a run for a few genomes.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: ORFs archives written since archivedirs.py have an index (<archive>.index), and only the files of the selected genomes are read and decompressed. Older archives (and zstd archives) have no index and are read from start to end.
+#NOTE 3: The database is in the order createdb.sh uses (by ORF file name), so it is the same as a database created from the ORF files of the selected genomes.
+
+#Dependencies
+#NONE
+
+import os
+import sys
+
+from archivedirs import archive_groups
+
+#The members of the selected assemblies in the ORFs archive, as a dictionary of assembly to (TarInfo, data) members.
+def pull_orfs(archive_path, assemblies):
+    orfs = dict()
+    for group, members in archive_groups(archive_path, set(assemblies)):
+        orfs.setdefault(group, list()).extend(members)
+    return orfs
+
+#The ORF file of an assembly with doggo format headers (<archive_dir>/<assembly>.faa), as (name, data), or None.
+def doggo_faa(members):
+    for member, data in members:
+        if member.isfile() and member.name.count('/') == 1 and member.name.endswith('.faa'):
+            return member.name, data
+    return None
+
+if __name__ == '__main__':
+    print('#Script: orfarchive.py')
+    print('#Version: v20241212')
+    print('#Usage: python orfarchive.py <assemblies> <orfs_archive> <output_dir>')
+    print('#<assemblies> must be a text file of versionless assemblies (or genome names for doggo_herd runs) whose ORFs will be pulled from <orfs_archive> (1/line). (required)')
+    print('#<orfs_archive> must be the ORFs archive of a doggo_fetch or doggo_herd run. (required)')
+    print('#<output_dir> must be the directory where all ORF files of the assemblies will be extracted. (optional)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    if len(sys.argv) == 3 or len(sys.argv) == 4:
+        print(str((len(sys.argv)-1)) + ' argument(s) found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    if os.path.isfile(sys.argv[1]) == True:
+        print('Assemblies file found. Proceeding.')
+    else:
+        print('Assemblies file not found. Exiting.')
+        sys.exit(1)
+
+    if os.path.isfile(sys.argv[2]) == True:
+        print('ORFs archive found. Proceeding.')
+    else:
+        print('ORFs archive not found. Exiting.')
+        sys.exit(1)
+    if os.path.isfile(sys.argv[2] + '.index'):
+        print('ORFs archive is indexed. Only the selected genomes will be read.')
+    else:
+        print('ORFs archive has no index. It will be read from start to end.')
+
+    #Same output files as subsampledb.sh, named after the stem of the assemblies file.
+    baseassemblies = os.path.basename(sys.argv[1]).split('.', 1)[0]
+    print('Removing files and directories with names identical to the output.')
+    for extension in ('.database', '.subsampled', '.notsubsampled'):
+        if os.path.isfile(baseassemblies + extension):
+            os.remove(baseassemblies + extension)
+
+    with open(sys.argv[1], 'r') as f:
+        assemblies = [line.strip() for line in f if line.strip()]
+
+    print('Pulling ORFs from the ORFs archive.')
+    try:
+        orfs = pull_orfs(sys.argv[2], assemblies)
+    except Exception:
+        print('Error when reading the ORFs archive. Exiting.')
+        sys.exit(1)
+
+    print('Creating local database.')
+    faa_files = sorted((doggo_faa(orfs[assembly]), assembly) for assembly in orfs if assembly is not None and doggo_faa(orfs[assembly]) is not None)
+    with open(baseassemblies + '.database', 'wb') as database, open(baseassemblies + '.subsampled', 'w') as subsampled:
+        for (name, data), assembly in faa_files:
+            database.write(data)
+            subsampled.write(assembly + '\n')
+    found = set(assembly for faa_file, assembly in faa_files)
+    with open(baseassemblies + '.notsubsampled', 'w') as notsubsampled:
+        for assembly in assemblies:
+            if assembly not in found:
+                notsubsampled.write(assembly + '\n')
+    print(str(len(found)) + ' assemblies found, ' + str(len([assembly for assembly in assemblies if assembly not in found])) + ' not found.')
+
+    if len(sys.argv) == 4:
+        print('Extracting ORF files.')
+        for assembly in sorted(assembly for assembly in orfs if assembly in found):
+            for member, data in orfs[assembly]:
+                path = os.path.join(sys.argv[3], *member.name.split('/')[1:])
+                if member.isdir():
+                    os.makedirs(path, exist_ok=True)
+                elif member.isfile():
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as f:
+                        f.write(data)
+
+    print('All done!')
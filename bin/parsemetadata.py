@@ -7,49 +7,156 @@
 
 #Function
 #This script will parse a file containing GTDB metadata and output only the lines containing the representative genome for each species cluster.
+#With --project, only the columns WhereDoGGo? uses (see gtdbmetadata.py) are written. The other fields are left empty, so every column stays in its place and the output is read as any other GTDB metadata, but it is much smaller and faster to load.
 
 #NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The input file can be plain or gzip-compressed (e.g., bac120_metadata_r220.tsv.gz, as downloaded from GTDB). It is read in large chunks of whole lines, which are parsed by several processes at a time and written in the input order.
 
 #Dependencies
 #NONE
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import gzip
 import os
 import sys
 
-print('#Script: parsemetadata.py')
-print('#Version: v20241212')
-print('#Usage: python parsemetadata.py <input_file> <output_file>')
-print('#<input_file> must be tab-delimited GTDB metadata. (required)')
-print('#<output_file> must be the name of the output file that will contain the representative genome of each species cluster. (required)')
-print('#For more information refer to the comments in the script and/or the Github page.')
-
-# Check if the correct number of arguments is given
-if len(sys.argv) == 3:
-    print ('Two arguments found. Proceeding.')
-else:
-    print('Wrong number of arguments given. Exiting.')
-    sys.exit(1)
-
-# checkpoint for input file
-check_file = os.path.isfile(sys.argv[1])
-if check_file == True:
-    print('Input file found. Proceeding.')
-else:
-    print('Input file not found. Exiting.')
-    sys.exit(1)
-#TODO: Check if the input file is what's expected, at least if it's tab-delimited.
-
-#Remove files from previous runs
-print('Removing files with names identical to the output.')
-removal = ('rm -r ' + sys.argv[2] + ' 2> /dev/null')
-os.system(removal)
-
-#Keep lines marked with a "t" in the 16th field, denoting representative genome.
-print('Parsing GTDB metadata')
-with open(sys.argv[1], 'r') as metadata, open(sys.argv[2], 'w') as parsed:
-    for line in metadata:
-        x = line.split('\t')
-        if x[18]=='t':
-            parsed.write(line)
-
-print('All done!')
+from gtdbmetadata import cached_columns
+
+#Size of the chunks of the input file parsed by each process.
+chunk_size = 16777216
+
+#Field of the representative flag ("t" for the representative genome of a species cluster).
+representative_field = cached_columns['representative'][0]
+
+#Open plain or gzip-compressed metadata for reading bytes.
+def open_metadata(path):
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+#Chunks of whole lines of the input file.
+def read_chunks(metadata):
+    rest = b''
+    while True:
+        block = metadata.read(chunk_size)
+        if not block:
+            break
+        block = rest + block
+        end = block.rfind(b'\n') + 1
+        if end == 0:
+            rest = block
+            continue
+        rest = block[end:]
+        yield block[:end]
+    if rest:
+        yield rest + b'\n'
+
+#Keep the lines of a chunk marked with a "t" in the representative field. With <keep_fields>, all other fields are emptied. Returns the parsed chunk and the number of lines with too few fields.
+#Lines are only split up to the representative field, and only representative lines are split further.
+def parse_chunk(chunk, keep_fields):
+    parsed = list()
+    malformed = 0
+    for line in chunk.splitlines(True):
+        x = line.split(b'\t', representative_field + 1)
+        if len(x) <= representative_field:
+            if line.strip(b'\r\n'):
+                malformed += 1
+            continue
+        if x[representative_field] != b't':
+            continue
+        if keep_fields:
+            x = line.rstrip(b'\r\n').split(b'\t')
+            if len(x) <= max(keep_fields):
+                malformed += 1
+                continue
+            parsed.append(b'\t'.join([field if i in keep_fields else b'' for i, field in enumerate(x)]) + b'\n')
+        else:
+            parsed.append(line)
+    return b''.join(parsed), malformed
+
+#Parse the chunks with <threads> processes (in this process if only one), in the input order. Only a few chunks are parsed or waiting to be written at a time, so memory stays flat.
+def parse_chunks(chunks, keep_fields, threads):
+    if threads == 1:
+        for chunk in chunks:
+            yield parse_chunk(chunk, keep_fields)
+        return
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(parse_chunk, chunk, keep_fields))
+            while len(pending) > 2 * threads or (pending and pending[0].done()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+if __name__ == '__main__':
+    print('#Script: parsemetadata.py')
+    print('#Version: v20241212')
+    print('#Usage: python parsemetadata.py <input_file> <output_file>')
+    print('#<input_file> must be tab-delimited GTDB metadata, plain or gzip-compressed. (required)')
+    print('#<output_file> must be the name of the output file that will contain the representative genome of each species cluster. (required)')
+    print('#--project can be added to write only the columns used by WhereDoGGo? (other fields are left empty). (optional)')
+    print('#--threads <threads> must be the number of processes parsing the input file (default: all cores). (optional)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    #Take out the options before checking the positional arguments.
+    keep_fields = None
+    if '--project' in sys.argv:
+        keep_fields = frozenset(index for index, kind in cached_columns.values())
+        sys.argv.remove('--project')
+    threads = os.cpu_count() or 1
+    if '--threads' in sys.argv and sys.argv.index('--threads') + 1 < len(sys.argv):
+        option_position = sys.argv.index('--threads')
+        try:
+            threads = int(sys.argv[option_position + 1])
+        except ValueError:
+            threads = 0
+        del sys.argv[option_position:option_position + 2]
+        if threads <= 0:
+            print('Number of threads must be a positive integer. Exiting.')
+            sys.exit(1)
+
+    # Check if the correct number of arguments is given
+    if len(sys.argv) == 3:
+        print ('Two arguments found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    # checkpoint for input file
+    check_file = os.path.isfile(sys.argv[1])
+    if check_file == True:
+        print('Input file found. Proceeding.')
+    else:
+        print('Input file not found. Exiting.')
+        sys.exit(1)
+
+    #Remove files from previous runs
+    print('Removing files with names identical to the output.')
+    removal = ('rm -r ' + sys.argv[2] + ' 2> /dev/null')
+    os.system(removal)
+
+    #Keep lines marked with a "t" in the representative field.
+    if keep_fields:
+        print('Parsing GTDB metadata (only the columns used by WhereDoGGo?) with ' + str(threads) + ' process(es).')
+    else:
+        print('Parsing GTDB metadata with ' + str(threads) + ' process(es).')
+    malformed = 0
+    try:
+        with open_metadata(sys.argv[1]) as metadata, open(sys.argv[2], 'wb') as parsed:
+            for data, chunk_malformed in parse_chunks(read_chunks(metadata), keep_fields, threads):
+                parsed.write(data)
+                malformed += chunk_malformed
+    except (OSError, EOFError):
+        print('Error when reading the input file. Exiting.')
+        os.system(removal)
+        sys.exit(1)
+    if malformed > 0:
+        print(str(malformed) + ' line(s) with too few tab-delimited fields. Input file is not GTDB metadata. Exiting.')
+        os.system(removal)
+        sys.exit(1)
+
+    print('All done!')
@@ -7,6 +7,8 @@
 
 #Function
 #This script does a dry run of pickgenomes, reporting from which taxa and how many genomes will be picked, and the total number.
+#In sweep mode, it does the same for a grid of resolutions, numbers, and minimum numbers of genomes at once, to help choose the parameters of a doggo_fetch run.
+#It also estimates what fetching the genomes picked will cost: download volume and time, disk space for the contigs and ORFs, and CPU time for ORF prediction, from their total genome size in the metadata. With --calibration, the estimates are calibrated against the cost records of previous doggo_fetch runs (see fetchcosts.py).
 
 #Dependencies
 #NONE
@@ -14,9 +16,13 @@
 #NOTE 1: All code was written and tested on Intel macOS and Ubuntu. Please report any issues.
 
 from collections import Counter
+import math
 import os
 import sys
 
+from fetchcosts import calibrate, estimate, read_costs
+from gtdbmetadata import load_metadata, validate_metadata
+
 print('#Script: pickgenomes_dry.py')
 print('#Version: v20241212')
 print('#Usage: python pickgenomes_dry.py <input_tsv> <tax_level> <tax_resolution> <number> <min_genomes> <ignore_list>')
@@ -26,11 +32,20 @@ print('#<tax_resolution> must be a taxonomic level lower than <tax_level>. For e
 print('#<number> must be the number of genomes to be picked per <tax_resolution>. It must be a positive integer or "all". If <tax_resolution> is "all", <number> must also be "all". (required)')
 print('#<min_genomes> must be the minimum number of genomes in a <tax_resolution> for these genomes to be picked. It must be a positive integer, lower than or equal to <number>. If number is <all>, it can be any positive integer but it will be overridden. (required)')
 print('#<ignore_list> must be a text file containing genome assembly accessions (once per line, versionless, e.g. GCA_011362025) that should be not included in the pickgenomes process (optional)')
+print('#Sweep mode: <tax_resolution>, <number>, and <min_genomes> can also be comma-separated lists (e.g. c,o,f 1,3,5 1,2). Every valid combination is then evaluated from a single read of the metadata, and <tax_level>_sweep.dry gets one line per combination with the number of genomes picked and below the minimum, and the number of taxa covered and below the minimum (1 and 0 for "all"), followed by the estimated costs.')
+print('#--calibration <path> must be the cost record (.costs) of a previous doggo_fetch run, or a directory searched for them (e.g., a _fetch run directory or a directory of them). Can be given more than once. Without it, default rates are used. (optional)')
 print('#For more information refer to the comments in the script and/or the Github page.')
 
-resolutions = list()
-ignore_list = list()
+ignore_list = set()
 all_res_count = 0
+all_res_size = [0.0, 0] # total genome size and number of genomes with a known genome size
+
+#Take out the --calibration options before checking the positional arguments.
+calibration_paths = list()
+while '--calibration' in sys.argv and sys.argv.index('--calibration') + 1 < len(sys.argv):
+    option_position = sys.argv.index('--calibration')
+    calibration_paths.append(sys.argv[option_position + 1])
+    del sys.argv[option_position:option_position + 2]
 
 # checkpoint for number of arguments
 if len(sys.argv) == 6 or len(sys.argv) == 7:
@@ -49,74 +64,88 @@ else:
     print('Input file not found. Exiting.')
     sys.exit(1)
 
+#Load the metadata through its columnar cache (see gtdbmetadata.py). It is converted only the first time a metadata file is used.
+metadata = load_metadata(sys.argv[1])
+
+#Validate the metadata in a single pass (parsed GTDB metadata, taxonomic level).
+validation = validate_metadata(metadata, sys.argv[2])
+
 #Check if input file is parsed GTDB metadata.
-with open(sys.argv[1], 'r') as parsedcheck:
-    for line in parsedcheck:
-        x = line.split('\t')
-        if x[18]=='t':
-            pass
-        else:
-            print('Input file does not contain parsed GTDB metadata. Exiting.')
-            sys.exit(1)
-print('Input file contains parsed GTDB metadata. Proceeding.')
+if validation['parsed']:
+    print('Input file contains parsed GTDB metadata. Proceeding.')
+else:
+    print('Input file does not contain parsed GTDB metadata. Exiting.')
+    sys.exit(1)
 
 # checkpoint for taxonomic level
-with open(sys.argv[1], 'r') as file:
-    content = file.read()
-    if str(sys.argv[2]+';') in content:
-        print('Taxonomic level is valid. Proceeding.')
-    else:
-        print('Taxonomic level is invalid. Check spelling. Exiting.')
-        sys.exit(1)
+if validation['level_valid']:
+    print('Taxonomic level is valid. Proceeding.')
+else:
+    print('Taxonomic level is invalid. Check spelling. Exiting.')
+    sys.exit(1)
+
+#Sweep mode: <tax_resolution>, <number>, and <min_genomes> can be comma-separated lists (e.g. c,o,f 1,3,5 1,2). The metadata is read once and every combination is evaluated.
+sweep = ',' in sys.argv[3] or ',' in sys.argv[4] or ',' in sys.argv[5]
+res_given = sys.argv[3].split(',')
+number_given = sys.argv[4].split(',')
+min_given = sys.argv[5].split(',')
+if sweep:
+    file_stem = str(sys.argv[2]) + '_sweep'
+    print('Sweep mode: ' + str(len(res_given)) + ' resolution(s), ' + str(len(number_given)) + ' number(s), ' + str(len(min_given)) + ' minimum number(s) of genomes. Proceeding.')
 
 # checkpoint for taxonomic resolution
 tax_res = ['p', 'c', 'o', 'f', 'g']
-if sys.argv[3] in tax_res:
-    print('Taxonomic resolution is valid. Proceeding.')
-elif sys.argv[3] == 'all':
-    print('Taxonomic resolution is valid (all). Proceeding.')
-else:
-    print('Taxonomic resolution is invalid or missing. Check if it is one of: "p", "c", "o", "f", "g", or "all". Exiting.')
-    sys.exit(1)
+for res in res_given:
+    if res in tax_res:
+        print('Taxonomic resolution is valid. Proceeding.')
+    elif res == 'all':
+        print('Taxonomic resolution is valid (all). Proceeding.')
+    else:
+        print('Taxonomic resolution is invalid or missing. Check if it is one of: "p", "c", "o", "f", "g", or "all". Exiting.')
+        sys.exit(1)
 
-# checkpoint for resolution and number of genomes both being "all"
-if sys.argv[3] == 'all' and sys.argv[4] != 'all':
+# checkpoint for resolution and number of genomes both being "all" (in sweep mode these combinations are skipped instead)
+if not sweep and sys.argv[3] == 'all' and sys.argv[4] != 'all':
     print('When <tax_resolution> is "all", <number> must also be "all". Exiting.')
     sys.exit(1)
-elif sys.argv[3] != 'all' and sys.argv[4] == 'all':
+elif not sweep and sys.argv[3] != 'all' and sys.argv[4] == 'all':
     print('When <number> is "all", <tax_resolution> must also be "all". Exiting.')
     sys.exit(1)
 
 # checkpoint for number of genomes to be picked
-flag1 = True
-try:
-    int(sys.argv[4])
-except:
-    flag1 = False
-if flag1 and int(sys.argv[4])>0:
-    print('Number given is valid. Proceeding.')
-elif sys.argv[4] == 'all':
-    print('Number given is valid (all). Proceeding.')
-else:
-    print('Number given is invalid. Exiting.')
-    sys.exit(1)
+for number in number_given:
+    flag1 = True
+    try:
+        int(number)
+    except:
+        flag1 = False
+    if flag1 and int(number)>0:
+        print('Number given is valid. Proceeding.')
+    elif number == 'all':
+        print('Number given is valid (all). Proceeding.')
+    else:
+        print('Number given is invalid. Exiting.')
+        sys.exit(1)
 
 # checkpoint for minimum number of genomes in resolution
-flag2 = True
-try:
-    int(sys.argv[5])
-except:
-    flag2 = False
-    print('Minimum number of genomes given is invalid. Exiting.')
-    sys.exit(1)
-if flag2 and int(sys.argv[5])>0:
-    print('Minimum number of genomes given is valid. Proceeding.')
-else:
-    print('Minimum number of genomes given is invalid. Exiting.')
-    sys.exit(1)
+for min_genomes in min_given:
+    flag2 = True
+    try:
+        int(min_genomes)
+    except:
+        flag2 = False
+        print('Minimum number of genomes given is invalid. Exiting.')
+        sys.exit(1)
+    if flag2 and int(min_genomes)>0:
+        print('Minimum number of genomes given is valid. Proceeding.')
+    else:
+        print('Minimum number of genomes given is invalid. Exiting.')
+        sys.exit(1)
 
-# checkpoint for number of genomes being more than minimum number of genomes
-if sys.argv[4] == 'all':
+# checkpoint for number of genomes being more than minimum number of genomes (in sweep mode these combinations are skipped instead)
+if sweep:
+    pass
+elif sys.argv[4] == 'all':
     print('Number given is all. This will override the minimum number of genomes. Proceeding.')
 elif int(sys.argv[5]) <= int(sys.argv[4]):
     print('Number is higher than or equal to minimum number of genomes. Proceeding.')
@@ -124,6 +153,20 @@ else:
     print('Number is lower than minimum number of genomes. Exiting.')
     sys.exit(1)
 
+#All valid combinations of resolution, number, and minimum number of genomes (just one outside sweep mode).
+combinations = list()
+for res in res_given:
+    for number in number_given:
+        for min_genomes in min_given:
+            if (res == 'all') != (number == 'all'):
+                continue
+            if number != 'all' and int(min_genomes) > int(number):
+                continue
+            combinations.append((res, number, min_genomes))
+if len(combinations) == 0:
+    print('No valid combination of <tax_resolution>, <number>, and <min_genomes> given. Exiting.')
+    sys.exit(1)
+
 #Parsing the assemblies in the ignore_list file. TODO: We don't check for formatting, maybe add?
 if len(sys.argv) == 7: ## this is to make the ignore_list argument optional
     check_ignore = os.path.isfile(sys.argv[6])
@@ -132,13 +175,31 @@ if len(sys.argv) == 7: ## this is to make the ignore_list argument optional
         with open(sys.argv[6], 'r') as ignore_text:
             for line in ignore_text:
                 x=line.strip()
-                ignore_list.append(x)
+                ignore_list.add(x)
     else:
         print('Ignore list file not found. Exiting.')
         sys.exit(1)
 else:
         print('No ignore list specified. Proceeding.')
 
+#Cost rates, from the cost records of previous runs if given.
+for calibration_path in calibration_paths:
+    if not os.path.exists(calibration_path):
+        print('Calibration file or directory ' + calibration_path + ' not found. Exiting.')
+        sys.exit(1)
+cost_records = read_costs(calibration_paths)
+if len(calibration_paths) > 0 and len(cost_records) == 0:
+    print('No cost records found in the calibration files or directories. Exiting.')
+    sys.exit(1)
+rates, based_on = calibrate(cost_records)
+if len(cost_records) > 0:
+    calibration_note = 'Costs calibrated against ' + str(len(cost_records)) + ' cost record(s) of previous runs.'
+    if 0 in based_on.values():
+        calibration_note += ' Default rates used for: ' + ', '.join(rate for rate, records in based_on.items() if records == 0) + '.'
+else:
+    calibration_note = 'Costs estimated with default rates (no --calibration given).'
+print(calibration_note + ' Proceeding.')
+
 #Remove files from previous runs
 print('Removing files with names identical to the output.')
 removal = ('rm -r ' + file_stem + '.dry 2> /dev/null')
@@ -146,44 +207,92 @@ os.system(removal)
 
 print('Picking genomes.')
 
-with open(sys.argv[1], 'r') as taxa_records:
-    for line in taxa_records:
-        x = line.split('\t')
-        if x[0] != 'accession': #Ignore the headers line
-            y = x[19].split(';')
-            x[0] = x[0][:5] + 'A' + x[0][6:] if x[0][5] == 'F' else x[0]
-            if x[0][3:-2] not in ignore_list and sys.argv[2] in y: ## this is the step where we exclude all the assemblies from the ignore_list
-                if sys.argv[3] == str(y[1])[0]: #if <tax_resolutions> equals the first letter of y element 1 (aka equals "p" for phylum) add it to the resolutions list (will have duplicates).
-                    resolutions.append(y[1])
-                elif sys.argv[3] == str(y[2])[0]: #ditto for class
-                    resolutions.append(y[2])
-                elif sys.argv[3] == str(y[3])[0]: #ditto for order
-                    resolutions.append(y[3])
-                elif sys.argv[3] == str(y[4])[0]: #ditto for family
-                    resolutions.append(y[4])
-                elif sys.argv[3] == str(y[5])[0]: #ditto for genus
-                    resolutions.append(y[5])
-                elif sys.argv[3] == 'all':
-                    all_res_count += 1
-
-resolution_counts = Counter(resolutions) # this is a dictionary {resolution : occurances}
-total_genomes_tbd = 0 # total number genomes to be downloaded
-total_genomes_ntbd = 0 # total number of genomes not picked
+#Count the genomes of each taxon once for every resolution given. resolution_counts is a dictionary {resolution : {taxon : occurrences}}, with taxa in order of first appearance.
+#resolution_sizes is a dictionary {resolution : {taxon : [total genome size, genomes with a known genome size]}}, for the cost estimates.
+resolution_counts = dict()
+resolution_sizes = dict()
+for res in res_given:
+    if res != 'all':
+        resolution_counts[res] = Counter()
+        resolution_sizes[res] = dict()
+tax_index = {'p': 1, 'c': 2, 'o': 3, 'f': 4, 'g': 5}
+genome_size_column = metadata.column('genome_size')
+for i, accession in enumerate(metadata.strings('accession')):
+    if accession != 'accession': #Ignore the headers line
+        y = metadata.text('taxonomy', i).split(';')
+        accession = accession[:5] + 'A' + accession[6:] if accession[5] == 'F' else accession
+        if accession[3:-2] not in ignore_list and sys.argv[2] in y: ## this is the step where we exclude all the assemblies from the ignore_list
+            genome_size = genome_size_column[i]
+            for res, counts in resolution_counts.items(): #the taxon of y at <tax_resolution> (e.g. y[1] for phylum)
+                counts[y[tax_index[res]]] += 1
+                if not math.isnan(genome_size):
+                    sizes = resolution_sizes[res].setdefault(y[tax_index[res]], [0.0, 0])
+                    sizes[0] += genome_size
+                    sizes[1] += 1
+            all_res_count += 1
+            if not math.isnan(genome_size):
+                all_res_size[0] += genome_size
+                all_res_size[1] += 1
+
+#Mean genome size of the genomes of a taxon (or of <tax_level> if none of them has a known genome size).
+mean_size = all_res_size[0] / all_res_size[1] if all_res_size[1] > 0 else 0.0
+def taxon_mean_size(res, taxon):
+    sizes = resolution_sizes[res].get(taxon)
+    if sizes is None:
+        return mean_size
+    return sizes[0] / sizes[1]
+
+#Estimated costs of fetching genomes with a total size of <bases>, as lines of the report.
+def cost_report(bases):
+    costs = estimate(bases, rates)
+    cores = os.cpu_count() or 1
+    download_time = ' (about ' + str(round(costs['download_seconds'] / 60, 1)) + ' minutes)' if based_on['download_bytes_per_second'] > 0 else ''
+    return ["Estimated total genome size of the genomes to be downloaded: " + str(round(bases / 1e6, 1)) + " Mb",
+            "Estimated download volume: " + str(round(costs['download_bytes'] / 1e9, 3)) + " GB" + download_time,
+            "Estimated disk space for contigs: " + str(round(costs['contigs_bytes'] / 1e9, 3)) + " GB",
+            "Estimated disk space for ORFs: " + str(round(costs['orfs_bytes'] / 1e9, 3)) + " GB",
+            "Estimated CPU time for ORF prediction: " + str(round(costs['cpu_seconds'] / 3600, 2)) + " hours (" + str(round(costs['cpu_seconds'] / 3600 / cores, 2)) + " hours with " + str(cores) + " cores)",
+            calibration_note]
+
+#Dry run of one combination: the number of genomes to be downloaded and not picked, the taxa picked and not picked, the estimated total genome size of the genomes to be downloaded, and the lines of the report.
+#The genomes picked from a taxon with more than <number> genomes are the best ones by quality score, so their total genome size is estimated from the mean of the taxon.
+def dry_run(res, number, min_genomes):
+    if number == 'all':
+        return all_res_count, 0, 1, 0, all_res_size[0] + mean_size * (all_res_count - all_res_size[1]), ["Number of " + sys.argv[2] + " genomes to be downloaded: " + str(all_res_count)]
+    total_genomes_tbd = 0 # total number genomes to be downloaded
+    total_bases_tbd = 0.0 # estimated total genome size of the genomes to be downloaded
+    total_genomes_ntbd = 0 # total number of genomes not picked
+    taxa_picked = 0
+    taxa_not_picked = 0
+    report = list()
+    for resolution, count in resolution_counts[res].items():
+        if count <= int(number) and count >= int(min_genomes):
+            total_genomes_tbd = total_genomes_tbd + count
+            total_bases_tbd += count * taxon_mean_size(res, resolution)
+            taxa_picked += 1
+            report.append(f"Number of {resolution} genomes to be downloaded: {count}")
+        elif count >= int(number) and count >= int(min_genomes):
+            total_genomes_tbd = total_genomes_tbd + int(number)
+            total_bases_tbd += int(number) * taxon_mean_size(res, resolution)
+            taxa_picked += 1
+            report.append(f"Number of {resolution} genomes to be downloaded: " + number)
+        else:
+            report.append(f"Number of {resolution} genomes not picked: {count}") # if number of genomes < min number
+            total_genomes_ntbd = total_genomes_ntbd + count
+            taxa_not_picked += 1
+    report.append("Total number of genomes to be downloaded: " + str(total_genomes_tbd))
+    report.append("Total number of genomes not picked: " + str(total_genomes_ntbd))
+    return total_genomes_tbd, total_genomes_ntbd, taxa_picked, taxa_not_picked, total_bases_tbd, report
+
 with open(file_stem + '.dry', 'w') as outdry:
-    if sys.argv[4] == 'all':
-        outdry.write("Number of " + sys.argv[2] + " genomes to be downloaded: " + str(all_res_count))
+    if sweep: #one line per combination, tab-delimited
+        outdry.write('tax_resolution\tnumber\tmin_genomes\tgenomes_picked\tgenomes_below_min\ttaxa_covered\ttaxa_below_min\tgenome_size_mb\tdownload_gb\tcontigs_gb\torfs_gb\torf_cpu_hours' + '\n')
+        for res, number, min_genomes in combinations:
+            picked, below_min, taxa_covered, taxa_below_min, bases, report = dry_run(res, number, min_genomes)
+            costs = estimate(bases, rates)
+            outdry.write('\t'.join([res, number, min_genomes, str(picked), str(below_min), str(taxa_covered), str(taxa_below_min), str(round(bases / 1e6, 1)), str(round(costs['download_bytes'] / 1e9, 3)), str(round(costs['contigs_bytes'] / 1e9, 3)), str(round(costs['orfs_bytes'] / 1e9, 3)), str(round(costs['cpu_seconds'] / 3600, 2))]) + '\n')
     else:
-        for resolution, count in resolution_counts.items(): # resolutions has multiplicates
-            if count <= int(sys.argv[4]) and count >= int(sys.argv[5]):
-                total_genomes_tbd = total_genomes_tbd + count
-                outdry.write(f"Number of {resolution} genomes to be downloaded: {count}" + "\n")
-            elif count >= int(sys.argv[4]) and count >= int(sys.argv[5]):
-                total_genomes_tbd = total_genomes_tbd + int(sys.argv[4])
-                outdry.write(f"Number of {resolution} genomes to be downloaded: " + sys.argv[4] + "\n")
-            else:
-                outdry.write(f"Number of {resolution} genomes not picked: {count}" + "\n") # if number of genomes < min number
-                total_genomes_ntbd = total_genomes_ntbd + count
-        outdry.write("Total number of genomes to be downloaded: " + str(total_genomes_tbd) + "\n")
-        outdry.write("Total number of genomes not picked: " + str(total_genomes_ntbd))
+        picked, below_min, taxa_covered, taxa_below_min, bases, report = dry_run(sys.argv[3], sys.argv[4], sys.argv[5])
+        outdry.write('\n'.join(report + cost_report(bases)))
 
 print('All done!')
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script predicts ORFs for all genome files (contigs, plain or gzip-compressed) in a directory with the Pyrodigal library, running several genomes at the same time in a process pool. It is the ORF prediction engine of contigs2orfs.sh.
+#For each genome, the Pyrodigal output (faa, ffn, and gff, as the pyrodigal command line wrote it with -m) is kept in <output_dir>/pyrodigal_runs/<assembly>/, and <output_dir>/<assembly>.faa is written directly with doggo headers (>assembly_orf assembly [name]) and without asterisks.
+#Genomes of SR1 or Gracilibacteria (c__JAEDAM01 in the assembliesnames file), or all genomes if "code25" is given, use Genetic Code 25. All others use Code 11 (the pyrodigal default).
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: Genomes are matched to the assembliesnames file by the first (assemblies) or second (names) column. If a genome matches more than one line, the first one is used.
+#NOTE 3: With --follow <done_file>, the contigs directory is watched while it is still being filled (see doggo_fetch.py -stream): every genome file is predicted as soon as it appears (downloaded genomes are only given their final name once verified), until <done_file> exists.
+#With --database <database_file>, the ORF files are also appended to the database as they are written, in the same (file name) order as createdb.sh, so the database is identical to the one createdb.sh would create from the ORF directory.
+#NOTE 4: If the DOGGO_STORE environment variable is set to a genome store (see genomestore.py and doggo_fetch.py -store), the ORFs of genomes in the store are taken from there instead of predicted, and new ones are added to it. Genomes are looked up by assembly version and Genetic Code if a .contigversions file (versionless assembly and the version of its contigs, tab-delimited, 1/line, see doggo_fetch.py) with the same stem as the assembliesnames file exists and has them. With --follow, it is read again when a genome file of an assembly it does not have yet appears. All others (e.g., local genomes of doggo_herd.py) are looked up by a checksum of their contigs (identifiers and sequences), the Genetic Code, and the Pyrodigal version, so only the doggo headers are written for genomes predicted before, in any run or project.
+#NOTE 5: The CPU time of the run (this process and its workers) and the number of bases predicted (genomes taken from the genome store are not counted) are printed at the end, for the cost records of doggo_fetch.py (see fetchcosts.py).
+
+#Dependencies
+#1) Pyrodigal (https://github.com/althonos/pyrodigal)
+
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import sys
+import time
+import warnings
+
+#Check if required non-standard libraries are installed.
+import importlib.util
+nonstandardlibraries = {"pyrodigal" : "https://github.com/althonos/pyrodigal"}
+for nstlobject,link in nonstandardlibraries.items():
+    if importlib.util.find_spec(nstlobject) is not None:
+        pass
+    else:
+        print('Library ' + nstlobject + ' not installed. Download it from: ' + link + '. Exiting.')
+        sys.exit(1)
+
+import pyrodigal
+
+from fetchcosts import prediction_line
+from genomestore import GenomeStore
+
+#Open a fasta file for reading, decompressing it on the fly if it is gzip-compressed (e.g., .fna.gz contigs from downloadcontigs.sh).
+def open_fasta(path):
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+#Read a fasta file into a list of (identifier, sequence) tuples. The identifier is the header up to the first whitespace, as in the pyrodigal command line.
+def read_fasta(path):
+    records = list()
+    identifier = None
+    sequence = list()
+    with open_fasta(path) as fasta:
+        for line in fasta:
+            if line.startswith('>'):
+                if identifier is not None:
+                    records.append((identifier, ''.join(sequence)))
+                fields = line[1:].split(maxsplit=1)
+                identifier = fields[0] if len(fields) > 0 else ''
+                sequence = list()
+            elif line.strip():
+                sequence.append(line.strip())
+    if identifier is not None:
+        records.append((identifier, ''.join(sequence)))
+    return records
+
+#Rewrite Pyrodigal protein translations to the doggo format: headers become >assembly_orf assembly [name] (from the assembliesnames line) and all asterisks (stop codons) are removed.
+def doggo_translations(translations, namesline):
+    assembly, name = namesline.split('\t', 1)
+    output = list()
+    for line in translations.splitlines():
+        if line.startswith('>'):
+            output.append('>' + assembly + '_' + line[1:].split(' ', 1)[0] + ' ' + assembly + ' [' + name + ']')
+        else:
+            line = line.replace('*', '')
+            if line:
+                output.append(line)
+    return '\n'.join(output) + '\n' if output else ''
+
+#Load the assembliesnames file once. Key = assembly (first column) or name (second column), depending on whatwematch, value = the whole line.
+def load_names(assembliesnames_file, whatwematch):
+    names = dict()
+    with open(assembliesnames_file, 'r') as assembliesnames:
+        for line in assembliesnames:
+            line = line.rstrip('\n')
+            x = line.split('\t')
+            if len(x) < 2:
+                continue
+            key = x[0] if whatwematch == 'assemblies' else x[1]
+            names.setdefault(key, line)
+    return names
+
+#The arguments of predict() for one genome file, or None if the genome is not in the assembliesnames file.
+def genome_task(contigs, genome_file, filext, names, whatwematch, code25, output_dir):
+    filestem = genome_file[:-len(filext)]
+    if filestem not in names:
+        return None
+    namesline = names[filestem]
+    x = namesline.split('\t')
+    #The assembly or name used for the output files, as determined by whatwematch.
+    assemblyacc = x[0] if whatwematch == 'assemblies' else x[1]
+    #If the genome is from SR1 or Gracilibacteria (c__JAEDAM01), use Code 25.
+    if code25 or 'c__JAEDAM01' in namesline:
+        translation_table = 25
+    else:
+        translation_table = 11
+    return (os.path.join(contigs, genome_file), assemblyacc, namesline, translation_table, output_dir)
+
+#The genome store key of a genome without an assembly version: a checksum of its contigs (identifiers, as used in the Pyrodigal output, and sequences) and the Pyrodigal version.
+def content_key(records):
+    checksum = hashlib.sha256()
+    for identifier, sequence in records:
+        checksum.update(('>' + identifier + '\n' + sequence + '\n').encode())
+    return checksum.hexdigest() + '_pyrodigal' + pyrodigal.__version__
+
+#Predict the ORFs of one genome, as the pyrodigal command line does in single mode with masking (-m): train on all its contigs, then find genes in each contig. Returns the log entry of the genome and the number of bases predicted (for the CPU time summary, see fetchcosts.py).
+#<records> are the contigs of the genome, if they were already read.
+def predict(genome_path, assemblyacc, namesline, translation_table, output_dir, records=None):
+    run_dir = os.path.join(output_dir, 'pyrodigal_runs', assemblyacc)
+    os.makedirs(run_dir, exist_ok=True)
+    log = assemblyacc + '\n'
+    bases = 0
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            if records is None:
+                records = read_fasta(genome_path)
+            bases = sum(len(sequence) for identifier, sequence in records)
+            gene_finder = pyrodigal.GeneFinder(meta=False, mask=True)
+            gene_finder.train(*(sequence for identifier, sequence in records), translation_table=translation_table)
+        for warning in caught:
+            log += 'Warning: ' + str(warning.message) + '\n'
+        translations = io.StringIO()
+        with open(os.path.join(run_dir, assemblyacc + '.gbk'), 'w') as gff, open(os.path.join(run_dir, assemblyacc + '.ffn'), 'w') as ffn:
+            for identifier, sequence in records:
+                genes = gene_finder.find_genes(sequence)
+                genes.write_gff(gff, identifier)
+                genes.write_genes(ffn, identifier)
+                genes.write_translations(translations, identifier)
+        with open(os.path.join(run_dir, assemblyacc + '.faa'), 'w') as faa:
+            faa.write(translations.getvalue())
+        with open(os.path.join(output_dir, assemblyacc + '.faa'), 'w') as faa:
+            faa.write(doggo_translations(translations.getvalue(), namesline))
+    except Exception as error:
+        return log + 'Error: ' + str(error) + '\n//\n', bases
+    return log + '//\n', bases
+
+#Predict the ORFs of one genome, or take them from the genome store if it has them for this assembly version (or these contigs, if <store_key> is None, see content_key) and Genetic Code (no bases predicted). Newly predicted ORFs are added to the store. Without a store (store_dir is None), this is predict().
+def predict_or_restore(store_dir, store_key, genome_path, assemblyacc, namesline, translation_table, output_dir):
+    if store_dir is None:
+        return predict(genome_path, assemblyacc, namesline, translation_table, output_dir)
+    store = GenomeStore(store_dir)
+    records = None
+    if store_key is None:
+        try:
+            records = read_fasta(genome_path)
+        except Exception:
+            #The error is logged by predict().
+            return predict(genome_path, assemblyacc, namesline, translation_table, output_dir)
+        store_key = content_key(records)
+    run_dir = os.path.join(output_dir, 'pyrodigal_runs', assemblyacc)
+    orfs = store.get_orfs(store_key, translation_table)
+    if orfs is not None:
+        os.makedirs(run_dir, exist_ok=True)
+        for extension in ('faa', 'ffn', 'gbk'):
+            with open(os.path.join(run_dir, assemblyacc + '.' + extension), 'w') as f:
+                f.write(orfs['orfs.' + extension])
+        with open(os.path.join(output_dir, assemblyacc + '.faa'), 'w') as faa:
+            faa.write(doggo_translations(orfs['orfs.faa'], namesline))
+        return assemblyacc + '\n' + orfs['log'], 0
+    entry, bases = predict(genome_path, assemblyacc, namesline, translation_table, output_dir, records)
+    if '\nError: ' not in entry:
+        try:
+            store.add_orfs(store_key, translation_table, {'orfs.' + extension: os.path.join(run_dir, assemblyacc + '.' + extension) for extension in ('faa', 'ffn', 'gbk')}, entry.split('\n', 1)[1])
+        except OSError as error:
+            print('ORFs of ' + assemblyacc + ' not added to the genome store (' + str(error) + ').')
+    return entry, bases
+
+#The versions of the contigs of the genomes (see NOTE 4), or an empty dictionary if there is no .contigversions file.
+def read_versions(versions_file):
+    versions = dict()
+    if os.path.isfile(versions_file):
+        with open(versions_file, 'r') as f:
+            for line in f:
+                x = line.rstrip('\n').split('\t')
+                if len(x) == 2:
+                    versions[x[0]] = x[1]
+    return versions
+
+#CPU time of this process and its finished worker processes, in seconds.
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+if __name__ == '__main__':
+    print('#Script: predictorfs.py')
+    print('#Version: v20241212')
+    print('#Usage: python predictorfs.py <assembliesnames> <contigs> <filext> <whatwematch> <output_dir> <log_file> <threads> <code25> [--follow <done_file>] [--database <database_file>]')
+    print('#<assembliesnames> must be a tab-delimited file of assemblies and names (1/line), as written by pickgenomes.py or createrecords.py. (required)')
+    print('#<contigs> must be the path to the directory containing the genome files (as contigs). (required)')
+    print('#<filext> must be the extension of the genome files, including the leading dot. (required)')
+    print('#<whatwematch> must be "assemblies" or "names". (case-sensitive) (required)')
+    print('#<output_dir> must be the directory for the ORF files. It is created if it does not exist. (required)')
+    print('#<log_file> must be the name of the file where the log of every Pyrodigal run is appended. (required)')
+    print('#<threads> must be the number of genomes processed at the same time. (required)')
+    print('#<code25> must be "code25". If added, all genomes will use Genetic Code 25. (optional)')
+    print('#--follow <done_file>: keep watching the contigs directory for new genome files until <done_file> exists. (optional)')
+    print('#--database <database_file>: append the ORF files to <database_file> as they are written (createdb.sh order). (optional)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    #Take out the --follow and --database options (given by doggo_fetch.py) before checking the positional arguments.
+    done_file = None
+    if '--follow' in sys.argv and sys.argv.index('--follow') + 1 < len(sys.argv):
+        option_position = sys.argv.index('--follow')
+        done_file = sys.argv[option_position + 1]
+        del sys.argv[option_position:option_position + 2]
+    database_file = None
+    if '--database' in sys.argv and sys.argv.index('--database') + 1 < len(sys.argv):
+        option_position = sys.argv.index('--database')
+        database_file = sys.argv[option_position + 1]
+        del sys.argv[option_position:option_position + 2]
+
+    # Check if the correct number of arguments is given
+    if len(sys.argv) == 8 or len(sys.argv) == 9:
+        print(str((len(sys.argv)-1)) + ' arguments found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    assembliesnames_file, contigs, filext, whatwematch, output_dir, log_file = sys.argv[1:7]
+    if not os.path.isfile(assembliesnames_file):
+        print('Assembliesnames file not found. Exiting.')
+        sys.exit(1)
+    #When following a download, the contigs directory may not have been created yet.
+    if not os.path.isdir(contigs) and done_file is None:
+        print('Contig directory not found. Exiting.')
+        sys.exit(1)
+    if whatwematch not in ('assemblies', 'names'):
+        print('Invalid whatwematch option. Exiting.')
+        sys.exit(1)
+    try:
+        threads = int(sys.argv[7])
+    except ValueError:
+        threads = 0
+    if threads <= 0:
+        print('Number of threads must be a positive integer. Exiting.')
+        sys.exit(1)
+    code25 = False
+    if len(sys.argv) == 9:
+        if sys.argv[8] == 'code25':
+            code25 = True
+        else:
+            print('Eighth argument is not code25. Exiting.')
+            sys.exit(1)
+
+    names = load_names(assembliesnames_file, whatwematch)
+
+    #The genome store is used if DOGGO_STORE is set, by assembly version if known and otherwise by contigs (see NOTE 4).
+    store_dir = None
+    versions = dict()
+    versions_file = os.path.join(os.path.dirname(assembliesnames_file), os.path.basename(assembliesnames_file).split('.', 1)[0] + '.contigversions')
+    if os.environ.get('DOGGO_STORE'):
+        store_dir = os.environ['DOGGO_STORE']
+        versions = read_versions(versions_file)
+        print('Using the genome store in ' + store_dir + ' for ' + str(len(versions)) + ' assembly version(s) (other genomes by their contigs).')
+
+    #We run Pyrodigal on all genomes in the contigs directory indiscriminately.
+    if done_file is None and database_file is None:
+        tasks = list()
+        for genome_file in sorted(os.listdir(contigs)):
+            if not genome_file.endswith(filext):
+                continue
+            task = genome_task(contigs, genome_file, filext, names, whatwematch, code25, output_dir)
+            if task is None:
+                print('Genome file ' + genome_file + ' not found in the assembliesnames file. Skipping.')
+                continue
+            tasks.append((store_dir, versions.get(task[1])) + task)
+        print('Predicting ORFs for ' + str(len(tasks)) + ' genome(s) with ' + str(threads) + ' process(es).')
+
+        os.makedirs(os.path.join(output_dir, 'pyrodigal_runs'), exist_ok=True)
+        failed = 0
+        predicted = dict() # key = assembly, value = bases predicted
+        with open(log_file, 'a') as log, ProcessPoolExecutor(max_workers=threads) as executor:
+            #Results come back in the order of the genomes, so the log is the same as for a serial run.
+            for task, (entry, bases) in zip(tasks, executor.map(predict_or_restore, *zip(*tasks), chunksize=1) if tasks else []):
+                log.write(entry)
+                if '\nError: ' in entry:
+                    failed += 1
+                if bases > 0:
+                    predicted[task[3]] = bases
+        if failed > 0:
+            print(str(failed) + ' genome(s) failed during ORF prediction (check the pyrodigal log).')
+        print(prediction_line(cpu_seconds(), len(predicted), sum(predicted.values())))
+        print('All done!')
+        sys.exit(0)
+
+    #Following a download and/or streaming the database.
+    #The database order is that of the ORF file names (as the createdb.sh glob), so each genome of the assembliesnames file is appended once all genomes before it are predicted or known to be absent.
+    order = sorted((genome_task('', key + filext, filext, names, whatwematch, code25, output_dir)[1] + '.faa', key + filext) for key in names)
+    cursor = 0
+    appended = list() # ORF files appended to the database, in order
+    rewritten = False # True if a genome file changed after its ORF file was appended
+    seen = dict() # key = genome file, value = (size, modification time) when it was submitted
+    entries = dict() # key = genome file, value = log entry of its latest run
+    predicted = dict() # key = genome file, value = bases predicted in its latest run
+    completed = set() # genome files whose latest run has finished
+    pending = dict() # key = future, value = genome file
+    os.makedirs(os.path.join(output_dir, 'pyrodigal_runs'), exist_ok=True)
+    if database_file is not None:
+        database = open(database_file, 'w')
+    print('Predicting ORFs for genome files as they appear in the contig directory, with ' + str(threads) + ' process(es).')
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        while True:
+            #The done file is checked before the last look at the directory, so no genome file is missed.
+            finished = done_file is None or os.path.exists(done_file)
+            running = set(pending.values())
+            for genome_file in sorted(os.listdir(contigs)) if os.path.isdir(contigs) else []:
+                if not genome_file.endswith(filext) or genome_file.startswith('.') or genome_file in running:
+                    continue
+                try:
+                    genome_stat = os.stat(os.path.join(contigs, genome_file))
+                except FileNotFoundError:
+                    continue
+                signature = (genome_stat.st_size, genome_stat.st_mtime_ns)
+                if seen.get(genome_file) == signature:
+                    continue
+                task = genome_task(contigs, genome_file, filext, names, whatwematch, code25, output_dir)
+                #The version of a genome is recorded before its file appears (see NOTE 4).
+                if task is not None and store_dir is not None and task[1] not in versions:
+                    versions = read_versions(versions_file)
+                if task is None:
+                    print('Genome file ' + genome_file + ' not found in the assembliesnames file. Skipping.')
+                elif genome_file in seen:
+                    if task[1] + '.faa' in appended:
+                        rewritten = True
+                    completed.discard(genome_file)
+                    pending[executor.submit(predict_or_restore, store_dir, versions.get(task[1]), *task)] = genome_file
+                else:
+                    pending[executor.submit(predict_or_restore, store_dir, versions.get(task[1]), *task)] = genome_file
+                seen[genome_file] = signature
+            for future in [future for future in pending if future.done()]:
+                genome_file = pending.pop(future)
+                entries[genome_file], predicted[genome_file] = future.result()
+                completed.add(genome_file)
+            #Append the ORF files that are next in order. Genomes that never appeared are skipped only once the download is done.
+            while database_file is not None and cursor < len(order):
+                orf_file, genome_file = order[cursor]
+                if genome_file in completed:
+                    if os.path.isfile(os.path.join(output_dir, orf_file)):
+                        with open(os.path.join(output_dir, orf_file), 'r') as orfs:
+                            shutil.copyfileobj(orfs, database)
+                        database.flush()
+                        appended.append(orf_file)
+                elif not (finished and not pending):
+                    break
+                cursor += 1
+            if finished and not pending:
+                break
+            time.sleep(1)
+
+    #Genome files removed by the end of the download (e.g., empty files, see downloadcontigs.sh) are not kept, as if they had never been predicted.
+    present = set(os.listdir(contigs)) if os.path.isdir(contigs) else set()
+    for genome_file in list(entries):
+        if genome_file not in present:
+            assemblyacc = genome_task(contigs, genome_file, filext, names, whatwematch, code25, output_dir)[1]
+            if os.path.isfile(os.path.join(output_dir, assemblyacc + '.faa')):
+                os.remove(os.path.join(output_dir, assemblyacc + '.faa'))
+            shutil.rmtree(os.path.join(output_dir, 'pyrodigal_runs', assemblyacc), ignore_errors=True)
+            del entries[genome_file]
+            del predicted[genome_file]
+
+    #The log is written in the order of the genomes, as for a non-following run.
+    failed = 0
+    with open(log_file, 'a') as log:
+        for genome_file in sorted(entries):
+            log.write(entries[genome_file])
+            if '\nError: ' in entries[genome_file]:
+                failed += 1
+    print('ORFs predicted for ' + str(len(entries)) + ' genome(s).')
+    print(prediction_line(cpu_seconds(), len([bases for bases in predicted.values() if bases > 0]), sum(predicted.values())))
+    if failed > 0:
+        print(str(failed) + ' genome(s) failed during ORF prediction (check the pyrodigal log).')
+
+    #If the ORF files changed after they were appended (e.g., a resumed download that started over), the database is written again from the ORF directory.
+    if database_file is not None:
+        database.close()
+        orf_files = sorted(orf_file for orf_file in os.listdir(output_dir) if orf_file.endswith('.faa'))
+        if rewritten or appended != orf_files:
+            print('ORF files changed during the run. Writing the database again.')
+            with open(database_file, 'w') as database:
+                for orf_file in orf_files:
+                    with open(os.path.join(output_dir, orf_file), 'r') as orfs:
+                        shutil.copyfileobj(orfs, database)
+        print(str(len(orf_files)) + ' ORF file(s) in the database.')
+    print('All done!')
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This script pulls the sequences of every accessions file in a directory (e.g., the hits of each marker, from hmmsearchout2accessions.sh) from one or more local databases, and writes them to one FASTA file per accessions file in the working directory, as seqtk subseq would.
+#The databases are read through their offset indexes (see dbindex.py), so only the records of the accessions are read, once for all accessions files, instead of the whole database once per accessions file. Several databases are read as if they were combined (in the order given), without combining them.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The output is the same as that of seqtk subseq: the records in database order, with the whole header and each sequence on one line. Accessions not in the database are skipped.
+#NOTE 3: With --fixed-headers, the records are also written with their headers fixed, i.e., with the protein accession normalized and swapped with the assembly accession (see dbformat.py), to <fixed_dir>/<accessions file name><fixed_ext>. doggo_sniff uses it for databases whose headers were normalized when they were created, instead of fixing the headers of every marker afterwards.
+
+#Dependencies
+#NONE
+
+import os
+import sys
+
+from dbformat import fix_headers
+from dbindex import IndexedDatabases
+
+if __name__ == '__main__':
+    print('#Script: pullsequences.py')
+    print('#Version: v20241212')
+    print('#Usage: python pullsequences.py <accessions_dir> <accessions_ext> <output_ext> <database> ... [--fixed-headers <fixed_dir> <fixed_ext>]')
+    print('#<accessions_dir> must be the path to the directory containing the accessions files (1 accession/line). (required)')
+    print('#<accessions_ext> must be the extension of the accessions files. (leading dot optional) (required)')
+    print('#<output_ext> must be the extension of the output FASTA files, written in the working directory. (leading dot optional) (required)')
+    print('#<database> must be one or more local databases in FASTA format. Their offset indexes (<database>.index) are written if they are missing or out of date. (required)')
+    print('#--fixed-headers <fixed_dir> <fixed_ext> can be added to also write the records with the protein and assembly accessions swapped to <fixed_dir> (which must exist), with the extension <fixed_ext>. (optional)')
+    print('#For more information refer to the comments in the script and/or the Github page.')
+
+    #Take out the options before checking the positional arguments.
+    fixed_dir = None
+    if '--fixed-headers' in sys.argv and sys.argv.index('--fixed-headers') + 2 < len(sys.argv):
+        option_position = sys.argv.index('--fixed-headers')
+        fixed_dir, fixed_ext = sys.argv[option_position + 1:option_position + 3]
+        del sys.argv[option_position:option_position + 3]
+        if os.path.isdir(fixed_dir) == False:
+            print('Directory for the records with fixed headers not found. Exiting.')
+            sys.exit(1)
+        if not fixed_ext.startswith('.'):
+            fixed_ext = '.' + fixed_ext
+
+    if len(sys.argv) >= 5:
+        print(str(len(sys.argv) - 1) + ' arguments found. Proceeding.')
+    else:
+        print('Wrong number of arguments given. Exiting.')
+        sys.exit(1)
+
+    accessions_dir, accessions_ext, output_ext = sys.argv[1:4]
+    databases = sys.argv[4:]
+    for database in databases:
+        if os.path.isfile(database) == False:
+            print('Database file ' + database + ' not found. Exiting.')
+            sys.exit(1)
+    print('All database files found. Proceeding.')
+    if os.path.isdir(accessions_dir) == True:
+        print('Accessions directory found. Proceeding.')
+    else:
+        print('Accessions directory not found. Exiting.')
+        sys.exit(1)
+    if not accessions_ext.startswith('.'):
+        accessions_ext = '.' + accessions_ext
+    if not output_ext.startswith('.'):
+        output_ext = '.' + output_ext
+
+    accessions_files = sorted(fname for fname in os.listdir(accessions_dir) if fname.endswith(accessions_ext))
+    if len(accessions_files) > 0:
+        print('File(s) with the given extension found in the accessions directory. Proceeding.')
+    else:
+        print('No files with the given extension found in the accessions directory. Exiting.')
+        sys.exit(1)
+
+    print('Opening the database(s) and their offset indexes.')
+    try:
+        indexed = IndexedDatabases(databases)
+    except OSError as error:
+        print('Error when opening the database(s) (' + str(error) + '). Exiting.')
+        sys.exit(1)
+    with indexed:
+        pulled = 0
+        for accessions_file in accessions_files:
+            with open(os.path.join(accessions_dir, accessions_file), 'r') as f:
+                accessions = [line.strip() for line in f if line.strip()]
+            records = indexed.subseq(accessions)
+            with open(accessions_file[:-len(accessions_ext)] + output_ext, 'ab') as output:
+                output.write(records)
+            if fixed_dir is not None:
+                with open(os.path.join(fixed_dir, accessions_file[:-len(accessions_ext)] + fixed_ext), 'ab') as output:
+                    output.write(fix_headers(records))
+            pulled += indexed.count(accessions)
+    print(str(pulled) + ' sequence(s) pulled for ' + str(len(accessions_files)) + ' accessions file(s).')
+
+    print('All done!')
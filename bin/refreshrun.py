@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module refreshes a doggo_fetch.py run directory (<stem>_fetch) for a new GTDB release (doggo_fetch.py -refresh). It compares the genomes picked from the old and the new metadata, by assembly and version, and merges the genomes downloaded and predicted for the new release into the old run's database, pyrodigal log, and contigs and ORFs archives.
+#Genomes no longer picked or whose version changed are dropped. Genomes kept whose GTDB taxonomy changed get the new names in their ORF headers, without predicting their ORFs again.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The database and pyrodigal log are in the order of the genome files (as created by createdb.sh and predictorfs.py), so they are merged in one pass and the result is the same as for a new run with the new metadata.
+#NOTE 3: Runs made before .versions files were written have no assembly versions, so their genomes are only compared by assembly.
+
+#Dependencies
+#NONE
+
+import gzip
+import io
+import os
+
+from archivedirs import IndexedArchive, archive_groups, compressed_groups, directory_groups, group_members, open_archive, read_index, tar_files, tar_members, write_archive
+
+#Read a two-column, tab-delimited file (assembliesnames, versions) into a dictionary of first column to second column.
+def read_pairs(path):
+    pairs = dict()
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as f:
+        for line in f:
+            x = line.rstrip('\n').split('\t', 1)
+            if len(x) == 2:
+                pairs.setdefault(x[0], x[1])
+    return pairs
+
+#Compare the old run with the new picks. Returns the assemblies to download (added or new version, in the order of the new assemblies file), the assemblies to drop from the old run (removed or new version), and the new names of the kept assemblies whose names changed.
+def diff_runs(old_versions, old_names, new_assemblies, new_versions, new_names):
+    new_set = set(new_assemblies)
+    to_download = list()
+    dropped = set(assembly for assembly in old_names if assembly not in new_set)
+    renamed = dict()
+    for assembly in new_assemblies:
+        if assembly not in old_names:
+            to_download.append(assembly)
+        elif old_versions is not None and old_versions.get(assembly) != new_versions.get(assembly):
+            to_download.append(assembly)
+            dropped.add(assembly)
+        elif old_names[assembly] != new_names.get(assembly):
+            renamed[assembly] = new_names.get(assembly)
+    return to_download, dropped, renamed
+
+#Doggo headers are >assembly_orf assembly [name]. Returns the header with the new name.
+def rename_header(header, name):
+    x = header.rstrip('\n').split(' ', 2)
+    return x[0] + ' ' + x[1] + ' [' + name + ']\n'
+
+#The blocks of one genome in a database, as (assembly, lines). The assembly is the second field of the headers.
+def database_blocks(path):
+    assembly = None
+    lines = list()
+    with open(path, 'r') as database:
+        for line in database:
+            if line.startswith('>'):
+                header_assembly = line.split(' ', 2)[1].rstrip('\n') if ' ' in line else line[1:].rstrip('\n')
+                if header_assembly != assembly:
+                    if assembly is not None:
+                        yield assembly, lines
+                    assembly = header_assembly
+                    lines = list()
+            lines.append(line)
+    if assembly is not None:
+        yield assembly, lines
+
+#The blocks of one genome in a pyrodigal log, as (assembly, lines). Each entry starts with the assembly and ends with //.
+def log_blocks(path):
+    lines = list()
+    with open(path, 'r') as log:
+        for line in log:
+            lines.append(line)
+            if line == '//\n':
+                yield lines[0].rstrip('\n'), lines
+                lines = list()
+
+#Merge two sequences of (assembly, lines) blocks that are both in the order of <suffix> file names, dropping and renaming the blocks of the old ones, and write them to <output_path>.
+def merge_blocks(old_blocks, new_blocks, output_path, suffix, dropped, renamed, rename):
+    old_blocks = iter(old_blocks)
+    new_blocks = iter(new_blocks)
+    old_block = next(old_blocks, None)
+    new_block = next(new_blocks, None)
+    with open(output_path, 'w') as output:
+        while old_block is not None or new_block is not None:
+            if new_block is None or (old_block is not None and old_block[0] + suffix <= new_block[0] + suffix):
+                assembly, lines = old_block
+                old_block = next(old_blocks, None)
+                if assembly in dropped:
+                    continue
+                if rename and assembly in renamed:
+                    lines = [rename_header(line, renamed[assembly]) if line.startswith('>') else line for line in lines]
+                output.writelines(lines)
+            else:
+                output.writelines(new_block[1])
+                new_block = next(new_blocks, None)
+
+#Merge the old database with the database of the new genomes (either may not exist).
+def merge_database(old_path, new_path, output_path, dropped, renamed):
+    merge_blocks(database_blocks(old_path) if os.path.isfile(old_path) else [], database_blocks(new_path) if os.path.isfile(new_path) else [], output_path, '.faa', dropped, renamed, True)
+
+def merge_pyrodigallog(old_path, new_path, output_path, dropped):
+    merge_blocks(log_blocks(old_path) if os.path.isfile(old_path) else [], log_blocks(new_path) if os.path.isfile(new_path) else [], output_path, '.fna.gz', dropped, dict(), False)
+
+#The assembly a member of a contigs or ORFs archive belongs to: <dir>/<assembly>.fna(.gz), <dir>/<assembly>.faa, or <dir>/pyrodigal_runs/<assembly>/... (None for directories).
+def member_assembly(name):
+    parts = name.rstrip('/').split('/')
+    if len(parts) == 2 and '.' in parts[1]:
+        return parts[1].split('.', 1)[0]
+    if len(parts) >= 3 and parts[1] == 'pyrodigal_runs':
+        return parts[2]
+    return None
+
+#Write a new archive with the members of the old archive (except those of dropped assemblies; the doggo ORF files of renamed assemblies get the new names) and the files of <new_dir>, stored as <archive_dir>/... .
+#The contigs archive (compression none) is not compressed as a whole, as its files are. Uncompressed contig files of old runs (.fna) are compressed on the way (.fna.gz), like those of new runs.
+#The old archive can have any compression (see archivedirs.py), or be None if there is none.
+def merge_archive(old_path, new_dir, archive_dir, output_path, dropped, renamed, compression='gzip', threads=1):
+    archive_dir = archive_dir.rstrip('/')
+    written = set()
+    with write_archive(output_path, compression, threads) as output:
+        if old_path is not None and os.path.isfile(old_path):
+            with open_archive(old_path) as old:
+                for member in old:
+                    assembly = member_assembly(member.name)
+                    if assembly in dropped:
+                        continue
+                    if member.isfile() and assembly in renamed and member.name.count('/') == 1 and member.name.endswith('.faa'):
+                        lines = [rename_header(line, renamed[assembly]) if line.startswith('>') else line for line in old.extractfile(member).read().decode().splitlines(True)]
+                        data = ''.join(lines).encode()
+                        member.size = len(data)
+                        output.addfile(member, io.BytesIO(data))
+                    elif member.isfile() and compression == 'none' and member.name.endswith('.fna'):
+                        data = gzip.compress(old.extractfile(member).read(), compresslevel=6, mtime=0)
+                        member.name = member.name + '.gz'
+                        member.size = len(data)
+                        output.addfile(member, io.BytesIO(data))
+                    elif member.isfile():
+                        output.addfile(member, old.extractfile(member))
+                    else:
+                        output.addfile(member)
+                    written.add(member.name.rstrip('/'))
+        if not os.path.isdir(new_dir):
+            return
+        for root, dirs, files in os.walk(new_dir):
+            dirs.sort()
+            relative = os.path.relpath(root, new_dir).replace(os.sep, '/')
+            name = archive_dir if relative == '.' else archive_dir + '/' + relative
+            if name not in written:
+                output.add(root, arcname=name, recursive=False)
+            for filename in sorted(files):
+                output.add(os.path.join(root, filename), arcname=name + '/' + filename)
+
+#The members of an ORFs archive group with the new name in the headers of the doggo ORF file.
+def rename_members(members, name):
+    renamed_members = list()
+    for member, data in members:
+        if member.isfile() and member.name.count('/') == 1 and member.name.endswith('.faa'):
+            data = ''.join(rename_header(line, name) if line.startswith('>') else line for line in data.decode().splitlines(True)).encode()
+            member.size = len(data)
+        renamed_members.append((member, data))
+    return renamed_members
+
+#Write a new indexed ORFs archive (see archivedirs.py) with the groups of the old archive (except those of dropped assemblies; renamed assemblies get the new names) and the files of <new_dir>, stored as <archive_dir>/... .
+#The groups of an indexed old archive are copied as they are, without decompressing them, unless they are renamed.
+def merge_orf_archive(old_path, new_dir, archive_dir, output_path, dropped, renamed, threads=1):
+    has_top = False
+    with IndexedArchive(output_path, threads) as output:
+        if old_path is not None and os.path.isfile(old_path):
+            if read_index(old_path) is not None:
+                for group, data in compressed_groups(old_path):
+                    if group in dropped:
+                        continue
+                    if group in renamed:
+                        output.add(group, tar_members(rename_members(group_members(gzip.decompress(data)), renamed[group])))
+                    else:
+                        output.add_compressed(group, data)
+                    has_top = has_top or group is None
+            else:
+                for group, members in archive_groups(old_path):
+                    if group in dropped:
+                        continue
+                    if group in renamed:
+                        members = rename_members(members, renamed[group])
+                    output.add(group, tar_members(members))
+                    has_top = has_top or group is None
+        if os.path.isdir(new_dir):
+            for group, files in directory_groups(new_dir, archive_dir):
+                #The archived directory and its subdirectories are already in the old archive.
+                if group is None and has_top:
+                    continue
+                output.add(group, tar_files(files))
@@ -10,26 +10,21 @@
 
 #NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
 #NOTE 2: This is the WhereDoGGo? version of the script that assumes input files are correctly formatted, as per the output of doggo_fetch.
+#NOTE 3: inputdb can also be the ORFs archive of a doggo_fetch or doggo_herd run (_orfs.tar.gz). The database is then created from the ORF files of the assemblies with orfarchive.py, which only reads those of indexed archives.
 
 #Dependencies
-#1) seqtk (https://anaconda.org/bioconda/seqtk)
+#1) seqtk (https://anaconda.org/bioconda/seqtk) (for local databases in FASTA format)
+#2) orfarchive.py (for ORFs archives, in the PATH)
 
 assemblies="$1"
 inputdb="$2"
 
-#Check if all dependencies are installed.
-if ! command -v seqtk /dev/null
-then
-    echo "Program seqtk not installed. Download it from https://anaconda.org/bioconda/seqtk. Exiting."
-    exit 1
-fi
-
 cat << EndOfMessage
 #Script: subsampledb.sh
 #Version: v20241212
 #Usage: subsampledb.sh <assemblies> <inputdb>
 #<assemblies> must be a text file of versionless assemblies that will be subsampled from inputdb (1/line). (required)
-#<inputdb> must be a local database in FASTA format. (required)
+#<inputdb> must be a local database in FASTA format or the ORFs archive of a doggo_fetch or doggo_herd run. (required)
 #For more information refer to the comments in the script and/or the Github page.
 EndOfMessage
 
@@ -60,6 +55,26 @@ else
 	exit 1
 fi
 
+#ORFs archives are subsampled by orfarchive.py, with the same output files.
+if [[ "$inputdb" == *.tar.gz || "$inputdb" == *.tar.zst || "$inputdb" == *.tar ]]
+then
+	if ! command -v orfarchive.py > /dev/null
+	then
+		echo "Script orfarchive.py not found in PATH. Exiting."
+		exit 1
+	fi
+	echo "Local database is an ORFs archive. Pulling ORFs with orfarchive.py."
+	python -u "$(command -v orfarchive.py)" "$assemblies" "$inputdb" || exit 1
+	exit 0
+fi
+
+#Check if all dependencies are installed (seqtk is only used for local databases in FASTA format).
+if ! command -v seqtk /dev/null
+then
+    echo "Program seqtk not installed. Download it from https://anaconda.org/bioconda/seqtk. Exiting."
+    exit 1
+fi
+
 #Isolate the stem of the assemblies file name as a separate variable to avoid any issues with extensions.
 baseassemblies="$(basename "$assemblies" | perl -p -e 's/^(.*?)\..*/$1/g')"
 
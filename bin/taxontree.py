@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+#The MIT License (MIT) Copyright (c) 2024 George Kolyfetis & Panagiotis Adam
+#Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the "Software"), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#Function
+#This module holds the rank-indexed taxonomy tree that pickgenomes.py uses to pick genomes. It is imported by the scripts in this directory and is not meant to be run on its own.
+#The metadata is indexed once: every taxon (of any rank) points to its genomes in metadata order, and keeps a queue of them sorted by score (best first, ties in metadata order).
+#All picking rules (one per resolution, best genomes per resolution, maximizing diversity one rank down) then only look at the taxa they need, instead of rescanning every genome for every taxon.
+
+#NOTE 1: All code was written and tested on Intel or ARM macOS and Ubuntu. Please report any issues.
+#NOTE 2: The picks are identical to the original list-based implementation of pickgenomes.py, including its handling of tied scores.
+
+#Dependencies
+#NONE
+
+#GTDB taxonomy strings always contain these seven ranks, in this order.
+tax_ranks = ['d', 'p', 'c', 'o', 'f', 'g', 's']
+
+class TaxonTree:
+    #acc_taxonomy and acc_score are dictionaries (key = assembly accession) in metadata order. Only genomes within <tax_level> are indexed.
+    def __init__(self, acc_taxonomy, acc_score, tax_level):
+        self.accessions = list() # accessions within <tax_level>, in metadata order
+        self.scores = list() # score of each accession, same order
+        self.lineages = list() # split GTDB taxonomy of each accession, same order
+        self.members = dict() # key = taxon, value = indices of its accessions in metadata order
+        self.queues = dict() # key = taxon, value = indices of its accessions sorted by descending score (built when first needed)
+        for accession, taxonomy in acc_taxonomy.items():
+            y = taxonomy.split(';')
+            if tax_level in y:
+                index = len(self.accessions)
+                self.accessions.append(accession)
+                self.scores.append(acc_score[accession])
+                self.lineages.append(y)
+                for item in y:
+                    taxon_members = self.members.setdefault(item, [])
+                    if not taxon_members or taxon_members[-1] != index:
+                        taxon_members.append(index)
+
+    def __len__(self):
+        return len(self.accessions)
+
+    #All taxa of a given rank (e.g. 'f'), in order of their first genome in the metadata.
+    def taxa(self, rank):
+        found = dict()
+        for y in self.lineages:
+            for item in y:
+                if item[:1] == rank and item not in found:
+                    found[item] = None
+        return list(found)
+
+    #The taxa of the rank at position rank_index (see tax_ranks) found within taxon, in order of their first genome in the metadata.
+    def children(self, taxon, rank_index):
+        found = dict()
+        for index in self.members.get(taxon, []):
+            found.setdefault(self.lineages[index][rank_index], None)
+        return list(found)
+
+    def queue(self, taxon):
+        if taxon not in self.queues:
+            self.queues[taxon] = sorted(self.members.get(taxon, []), key = lambda index: (-self.scores[index], index))
+        return self.queues[taxon]
+
+    def best(self, taxon):
+        return self.queue(taxon)[0]
+
+#The first rank below the resolution that splits it into more than one taxon (down to genus). If there is none, the rank directly below.
+def split_below(tree, taxon, rank_index):
+    for sub_index in range(rank_index + 1, tax_ranks.index('g') + 1):
+        sub_taxa = tree.children(taxon, sub_index)
+        if len(sub_taxa) > 1:
+            return sub_taxa
+    return tree.children(taxon, rank_index + 1)
+
+#Pick the <number> best genomes of a taxon without looking at the ranks below it. Returns the picked indices and whether the taxon reaches <min_genomes>.
+#If there are no more genomes than <number>, all of them are taken in metadata order.
+#Otherwise, each of the <number> best scores is matched to the first genome in metadata order with that score. Tied genomes therefore repeat the same accession, as they always have.
+def pick_best(tree, taxon, number, min_genomes):
+    taxon_members = tree.members[taxon]
+    if len(taxon_members) <= number:
+        return list(taxon_members), len(taxon_members) >= min_genomes
+    first_with_score = dict()
+    for index in taxon_members:
+        first_with_score.setdefault(tree.scores[index], index)
+    return [first_with_score[tree.scores[index]] for index in tree.queue(taxon)[:number]], True
+
+#Pick up to <number> genomes of a taxon, maximizing the taxonomic range of the sub-taxa (see split_below) they come from.
+def pick_diverse(tree, sub_taxa, number, min_genomes):
+    if len(sub_taxa) >= number:
+        #Enough sub-taxa: the best genome(s) of each sub-taxon (all of them if tied), then the <number> best overall.
+        candidates = list()
+        for sub_taxon in sub_taxa:
+            sub_queue = tree.queue(sub_taxon)
+            top_score = tree.scores[sub_queue[0]]
+            for index in sub_queue:
+                if tree.scores[index] != top_score:
+                    break
+                candidates.append(index)
+        candidates.sort(key = lambda index: -tree.scores[index])
+        return candidates[:number], True
+    #Fewer sub-taxa than <number>: round-robin over the sub-taxa, taking the next best genome of each in every round, until <number> are picked or all are used up.
+    picked = list()
+    positions = [0] * len(sub_taxa)
+    while len(picked) < number:
+        progress = False
+        for k, sub_taxon in enumerate(sub_taxa):
+            sub_queue = tree.queue(sub_taxon)
+            if len(picked) < number and positions[k] < len(sub_queue):
+                picked.append(sub_queue[positions[k]])
+                positions[k] += 1
+                progress = True
+        if not progress:
+            break
+    return picked, len(picked) >= min_genomes
+
+#Pick genomes for every taxon of rank <tax_resolution>. Returns the accessions picked and the accessions of taxa below <min_genomes>, in output order.
+def pick_genomes(tree, tax_resolution, number, min_genomes):
+    assemblies = list()
+    belowmin = list()
+    rank_index = tax_ranks.index(tax_resolution)
+    for taxon in tree.taxa(tax_resolution):
+        if number == 1:
+            picked, enough = [tree.best(taxon)], True
+        elif tax_resolution == 'g':
+            picked, enough = pick_best(tree, taxon, number, min_genomes)
+        else:
+            sub_taxa = split_below(tree, taxon, rank_index)
+            if len(sub_taxa) == 1:
+                picked, enough = pick_best(tree, taxon, number, min_genomes)
+            else:
+                picked, enough = pick_diverse(tree, sub_taxa, number, min_genomes)
+        if enough:
+            assemblies.extend(tree.accessions[index] for index in picked)
+        else:
+            belowmin.extend(tree.accessions[index] for index in picked)
+    return assemblies, belowmin